@@ -0,0 +1,187 @@
+import fcntl
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+# Formato binario de la galería:
+#   empleados.gal          cabecera de 32 bytes + matriz float32 (count x dim)
+#   empleados.gal.nombres  una línea JSON por registro: {"id": n, "nombre": "..."}
+# El registro n ocupa la fila n de la matriz. Solo se agrega al final; el
+# contador de la cabecera se actualiza al último, así que un corte a mitad
+# de una escritura deja la galería en el estado anterior. La generación (en
+# el relleno de la cabecera, 0 en archivos viejos) sube con cada escritura:
+# los procesos en marcha la miran para traer solo los registros nuevos.
+# Las escrituras (crear, agregar) toman un flock exclusivo sobre
+# empleados.gal: varios procesos (registro.py, el servicio de altas de cada
+# monitor) pueden agregar a la vez. migrar_json() reemplaza los archivos y
+# es para una sola vez, con todo detenido.
+MAGIC = b'GALE'
+VERSION = 1
+CABECERA = struct.Struct('<4sHHIQ')  # magic, version, reservado, dim, count
+GENERACION = struct.Struct('<Q')  # En el byte 24 de la cabecera
+POS_GENERACION = 24
+TAM_CABECERA = 32
+DIM = 512
+
+
+def ruta_nombres(ruta):
+    return ruta + '.nombres'
+
+
+def leer_cabecera(f):
+    f.seek(0)
+    magic, version, _, dim, count = CABECERA.unpack(f.read(CABECERA.size))
+    if magic != MAGIC:
+        raise ValueError(f"{f.name}: no es una galería binaria")
+    if version != VERSION:
+        raise ValueError(f"{f.name}: versión {version} no soportada")
+    return dim, count
+
+
+def leer_generacion(f):
+    f.seek(POS_GENERACION)
+    return GENERACION.unpack(f.read(GENERACION.size))[0]
+
+
+def escribir_cabecera(f, dim, count, generacion=0):
+    # Una sola escritura: count y generación cambian juntos
+    cabecera = CABECERA.pack(MAGIC, VERSION, 0, dim, count).ljust(POS_GENERACION, b'\0')
+    f.seek(0)
+    f.write((cabecera + GENERACION.pack(generacion)).ljust(TAM_CABECERA, b'\0'))
+
+
+def identidad(ruta):
+    # Cambia si el archivo se reemplaza (migrar_json) en vez de crecer
+    nombres = ruta_nombres(ruta)
+    return os.stat(ruta).st_ino, os.stat(nombres).st_ino if os.path.exists(nombres) else 0
+
+
+def estado(ruta):
+    # (identidad, generación, count): lo único que se lee para saber si hubo cambios
+    with open(ruta, 'rb') as f:
+        _, count = leer_cabecera(f)
+        return identidad(ruta), leer_generacion(f), count
+
+
+def bloquear(ruta):
+    # Abre la galería (vacía si no existía) con flock exclusivo; se suelta al cerrarla
+    f = os.fdopen(os.open(ruta, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    return f
+
+
+def iniciar(f, ruta, dim):
+    # Cabecera de una galería recién creada; con el lock tomado
+    if os.fstat(f.fileno()).st_size == 0:
+        escribir_cabecera(f, dim, 0)
+        open(ruta_nombres(ruta), 'w').close()
+
+
+def crear(ruta, dim=DIM):
+    # Si otro proceso la creó (y quizás ya agregó) en el medio, no se toca
+    with bloquear(ruta) as f:
+        iniciar(f, ruta, dim)
+
+
+def leer_nombres_desde(ruta, desde, count, posicion=0):
+    # Nombres de los registros desde..count-1 leyendo el archivo de nombres a
+    # partir de posicion (bytes); devuelve también dónde seguir la próxima vez.
+    # Se frena en el primer registro que la cabecera todavía no cuenta.
+    nombres = [None] * (count - desde)
+    if not os.path.exists(ruta_nombres(ruta)):
+        return nombres, posicion
+    with open(ruta_nombres(ruta), 'rb') as f:
+        f.seek(posicion)
+        for linea in iter(f.readline, b''):
+            if not linea.endswith(b'\n'):
+                break  # Línea a medio escribir
+            try:
+                reg = json.loads(linea)
+            except ValueError:
+                posicion += len(linea)
+                continue  # Línea incompleta de una escritura interrumpida
+            if reg['id'] >= count:
+                break
+            if reg['id'] >= desde:
+                nombres[reg['id'] - desde] = reg['nombre']  # Id repetido: gana la última
+            posicion += len(linea)
+    return nombres, posicion
+
+
+def leer_desde(ruta, desde=0, posicion=0):
+    # Registros agregados desde el registro 'desde' (posicion: la devuelta por
+    # la lectura anterior). Las filas quedan mapeadas en memoria (solo lectura).
+    with open(ruta, 'rb') as f:
+        dim, count = leer_cabecera(f)
+        generacion = leer_generacion(f)
+    lectura = {'identidad': identidad(ruta), 'generacion': generacion, 'count': count}
+    desde = min(desde, count)
+    lectura['nombres'], lectura['posicion'] = leer_nombres_desde(ruta, desde, count, posicion)
+    if count == desde:
+        lectura['filas'] = np.empty((0, dim), dtype=np.float32)
+    else:
+        lectura['filas'] = np.memmap(ruta, dtype=np.float32, mode='r', offset=TAM_CABECERA + desde * dim * 4,
+                                     shape=(count - desde, dim))
+    return lectura
+
+
+def cargar(ruta):
+    # Devuelve (nombres, matriz) con la matriz mapeada en memoria (solo lectura)
+    lectura = leer_desde(ruta)
+    return lectura['nombres'], lectura['filas']
+
+
+def agregar(ruta, nombre, embedding):
+    # Agrega un registro al final sin reescribir los existentes; devuelve su id.
+    # Contar, escribir la fila, el nombre y la cabecera va todo bajo el lock:
+    # la cabecera se relee adentro, así dos altas simultáneas no usan el mismo id.
+    embedding = np.asarray(embedding, dtype=np.float32).ravel()
+    with bloquear(ruta) as f:
+        iniciar(f, ruta, len(embedding))
+        dim, count = leer_cabecera(f)
+        generacion = leer_generacion(f)
+        if len(embedding) != dim:
+            raise ValueError(f"Embedding de dimensión {len(embedding)}, la galería usa {dim}")
+        f.seek(TAM_CABECERA + count * dim * 4)
+        f.write(embedding.tobytes())
+        f.truncate()
+        f.flush()
+        os.fsync(f.fileno())
+        with open(ruta_nombres(ruta), 'a', encoding='utf-8') as fn:
+            fn.write(json.dumps({'id': count, 'nombre': nombre}, ensure_ascii=False) + '\n')
+            fn.flush()
+            os.fsync(fn.fileno())
+        escribir_cabecera(f, dim, count + 1, generacion + 1)
+        f.flush()
+        os.fsync(f.fileno())
+    return count
+
+
+def migrar_json(ruta_json, ruta):
+    # Migración única desde el antiguo empleados.json
+    with open(ruta_json, 'r') as f:
+        data = json.load(f)
+    dim = len(data[0]['embedding']) if data else DIM
+    tmp = ruta + '.tmp'
+    with open(tmp, 'wb') as f:
+        escribir_cabecera(f, dim, len(data))
+        if data:
+            f.write(np.array([emp['embedding'] for emp in data], dtype=np.float32).tobytes())
+    with open(ruta_nombres(tmp), 'w', encoding='utf-8') as f:
+        for i, emp in enumerate(data):
+            f.write(json.dumps({'id': i, 'nombre': emp['nombre']}, ensure_ascii=False) + '\n')
+    os.replace(ruta_nombres(tmp), ruta_nombres(ruta))
+    os.replace(tmp, ruta)
+    return len(data)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "migrar":
+        n = migrar_json(sys.argv[2], sys.argv[3])
+        print(f"✓ {n} empleados migrados a {sys.argv[3]}")
+    else:
+        print("Uso:")
+        print("  python almacen.py migrar empleados.json empleados.gal")
@@ -0,0 +1,346 @@
+import base64
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+import numpy as np
+
+import almacen
+from registro import EXTENSIONES, Rafaga, caras_de, consistentes, formatear_rechazos, imagenes_de, muestra
+
+# Altas de empleados sin frenar el video. Los pedidos llegan por:
+#   HTTP local  POST /alta?nombre=Ana    cuerpo: una foto, o JSON {"fotos": [base64, ...]}
+#               POST /camara?nombre=Ana  ráfaga con la cámara del monitor
+#               GET  /altas              estado de los últimos pedidos
+#   Carpeta     dejar Ana.jpg o Ana/ con fotos en la carpeta de altas
+#   Tecla r     el nombre se pide en la consola desde otro hilo
+#   CLI         python altas.py enviar|camara|estado (habla con el HTTP)
+# Un único hilo calcula los embeddings, filtra por calidad y consistencia,
+# agrega las muestras al almacén y publica la galería nueva de una vez
+# (GaleriaViva.modificar): el reconocimiento sigue con la anterior mientras tanto.
+PUERTO = 9110
+HOST = '127.0.0.1'  # Solo local, como las métricas
+CADA_CARPETA = 2.0  # Segundos entre revisiones de la carpeta
+ESTABLE = 2.0       # Un archivo de la carpeta se toma si no cambió en este tiempo (copia a medias)
+HISTORIAL = 50      # Pedidos que recuerda GET /altas
+PROCESADAS = 'procesadas'
+RECHAZADAS = 'rechazadas'
+
+
+class ServicioAltas:
+    def __init__(self, app, galeria, ruta_almacen, carpeta=None):
+        # galeria: una GaleriaViva, compartida con los hilos de reconocimiento
+        self.app = app
+        self.galeria = galeria
+        self.ruta_almacen = ruta_almacen
+        self.carpeta = carpeta
+        self.cola = queue.Queue()
+        self.camara = queue.Queue()  # Nombres esperando una ráfaga de la cámara del monitor
+        self.pedidos = deque(maxlen=HISTORIAL)
+        self.siguiente = 1
+        self.lock = threading.Lock()
+        self.en_curso = set()  # Entradas de la carpeta ya encoladas
+        self.preguntando = threading.Event()
+        self.detenido = threading.Event()
+        self.servidor = None
+
+    def nuevo_pedido(self, nombre, origen):
+        with self.lock:
+            pedido = {'id': self.siguiente, 'nombre': nombre, 'origen': origen, 'estado': 'en cola',
+                      'muestras': 0, 'rechazos': {}, 'hora': datetime.now().isoformat(timespec='seconds')}
+            self.siguiente += 1
+            self.pedidos.append(pedido)
+        return pedido
+
+    # Entradas: todas vuelven enseguida, el trabajo lo hace el hilo de altas
+
+    def pedir_fotos(self, nombre, fotos, origen='http', entrada=None):
+        # fotos: imágenes ya decodificadas o rutas de archivo; entrada: lo que se archiva al terminar
+        pedido = self.nuevo_pedido(nombre, origen)
+        pedido['entrada'] = entrada
+        self.cola.put((pedido, fotos, None, None))
+        return pedido
+
+    def pedir_camara(self, nombre, origen='http'):
+        pedido = self.nuevo_pedido(nombre, origen)
+        pedido['estado'] = 'esperando cámara'
+        self.camara.put(pedido)
+        return pedido
+
+    def rafaga_pedida(self):
+        # Desde el hilo de render: (pedido, Rafaga) si hay una ráfaga pendiente, o None
+        try:
+            pedido = self.camara.get_nowait()
+        except queue.Empty:
+            return None
+        pedido['estado'] = 'capturando'
+        return pedido, Rafaga(pedido['nombre'])
+
+    def entregar_rafaga(self, pedido, rafaga):
+        # Desde el hilo de render, con la ráfaga completa o vencida
+        pedido['estado'] = 'en cola'
+        self.cola.put((pedido, None, rafaga.embeddings, rafaga.rechazos))
+
+    def preguntar_nombre(self):
+        # Tecla r: input() en otro hilo; el video sigue
+        if self.preguntando.is_set():
+            return
+        self.preguntando.set()
+
+        def preguntar():
+            try:
+                nombre = input("Nombre: ").strip()
+                if nombre:
+                    self.pedir_camara(nombre, 'teclado')
+                    print(f"Ráfaga pedida para {nombre}: mirar a la cámara")
+            except EOFError:
+                pass
+            finally:
+                self.preguntando.clear()
+        threading.Thread(target=preguntar, daemon=True).start()
+
+    def pedir_por_tecla(self, nombre=None):
+        # Tecla r de la ventana o del canal de control (vista.py): con nombre no se pregunta
+        if nombre:
+            self.pedir_camara(nombre, 'control')
+            print(f"Ráfaga pedida para {nombre}: mirar a la cámara")
+        else:
+            self.preguntar_nombre()
+
+    # Hilo de altas
+
+    def embeddings_de_fotos(self, fotos, rechazos):
+        embeddings = []
+        for foto in fotos:
+            frame = cv2.imread(foto) if isinstance(foto, str) else foto
+            if frame is None:
+                rechazos['ilegible'] += 1
+                continue
+            emb = muestra(frame, caras_de(self.app.get(frame)), rechazos)
+            if emb is not None:
+                embeddings.append(emb)
+        return embeddings
+
+    def confirmar(self, nombre, embeddings):
+        buenas, descartadas = consistentes(embeddings)
+        if buenas:
+            # Primero al disco (solo agrega), después una única publicación en memoria.
+            # almacen.agregar() toma el lock de la galería: puede correr a la vez que
+            # registro.py o el servicio de altas de otro monitor sobre el mismo archivo.
+            for emb in buenas:
+                almacen.agregar(self.ruta_almacen, nombre, emb)
+            if self.galeria.origen is not None:
+                self.galeria.sincronizar()  # Igual que las altas de otros procesos, sin duplicar
+            else:
+                self.galeria.modificar(lambda galeria: [galeria.agregar(nombre, emb) for emb in buenas])
+        return len(buenas), descartadas
+
+    def procesar(self, pedido, fotos, embeddings, rechazos):
+        # fotos para analizar, o los embeddings ya calculados de una ráfaga de la cámara
+        rechazos = Counter(rechazos or {})
+        pedido['estado'] = 'procesando'
+        if fotos is not None:
+            embeddings = self.embeddings_de_fotos(fotos, rechazos)
+        n, descartadas = self.confirmar(pedido['nombre'], embeddings)
+        rechazos['inconsistente'] += descartadas
+        pedido.update(estado='listo' if n else 'rechazado', muestras=n, rechazos=dict(+rechazos))
+        if n:
+            print(f"✓ {pedido['nombre']} registrado! ({n} muestras, por {pedido['origen']})")
+        else:
+            print(f"Alta de {pedido['nombre']} rechazada: sin muestras válidas ({formatear_rechazos(rechazos)})")
+        return n
+
+    def trabajar(self):
+        while not self.detenido.is_set():
+            try:
+                item = self.cola.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            pedido = item[0]
+            try:
+                n = self.procesar(*item)
+            except Exception as e:
+                # Un pedido roto no tira abajo el servicio
+                pedido.update(estado='error', error=str(e))
+                print(f"Error en el alta de {pedido['nombre']}: {e}")
+                n = 0
+            if pedido.get('entrada'):
+                self.archivar(pedido['entrada'], PROCESADAS if n else RECHAZADAS)
+
+    # Carpeta de altas
+
+    def revisar_carpeta(self):
+        ahora = time.time()
+        for entrada in sorted(os.listdir(self.carpeta)):
+            ruta = os.path.join(self.carpeta, entrada)
+            if entrada in (PROCESADAS, RECHAZADAS) or ruta in self.en_curso:
+                continue
+            if os.path.isdir(ruta):
+                fotos = imagenes_de(ruta)
+                cambio = max((os.path.getmtime(f) for f in fotos), default=os.path.getmtime(ruta))
+            elif entrada.lower().endswith(EXTENSIONES):
+                fotos = [ruta]
+                cambio = os.path.getmtime(ruta)
+            else:
+                continue
+            if not fotos or ahora - cambio < ESTABLE:
+                continue  # Vacía o todavía copiándose
+            self.en_curso.add(ruta)
+            nombre = entrada if os.path.isdir(ruta) else os.path.splitext(entrada)[0]
+            self.pedir_fotos(nombre, fotos, 'carpeta', ruta)
+
+    def archivar(self, ruta, destino):
+        carpeta = os.path.join(self.carpeta, destino)
+        os.makedirs(carpeta, exist_ok=True)
+        os.replace(ruta, os.path.join(carpeta, f"{datetime.now():%Y%m%d-%H%M%S}-{os.path.basename(ruta)}"))
+        self.en_curso.discard(ruta)
+
+    def vigilar(self):
+        os.makedirs(self.carpeta, exist_ok=True)
+        while not self.detenido.wait(CADA_CARPETA):
+            try:
+                self.revisar_carpeta()
+            except OSError as e:
+                print(f"Altas: no se pudo revisar {self.carpeta}: {e}")
+
+    # HTTP
+
+    def servir(self, puerto=PUERTO, host=HOST):
+        servicio = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def responder(self, codigo, datos):
+                cuerpo = json.dumps(datos, ensure_ascii=False).encode()
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def do_GET(self):
+                if urlparse(self.path).path != '/altas':
+                    self.send_error(404)
+                    return
+                self.responder(200, list(servicio.pedidos))
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                nombre = parse_qs(url.query).get('nombre', [''])[0].strip()
+                if not nombre:
+                    self.responder(400, {'error': 'falta ?nombre='})
+                    return
+                if url.path == '/camara':
+                    self.responder(202, servicio.pedir_camara(nombre))
+                    return
+                if url.path != '/alta':
+                    self.send_error(404)
+                    return
+                cuerpo = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.headers.get('Content-Type', '').startswith('application/json'):
+                    datos = [base64.b64decode(f) for f in json.loads(cuerpo).get('fotos', [])]
+                else:
+                    datos = [cuerpo]
+                fotos = [cv2.imdecode(np.frombuffer(d, np.uint8), cv2.IMREAD_COLOR) for d in datos]
+                fotos = [f for f in fotos if f is not None]
+                if not fotos:
+                    self.responder(400, {'error': 'ninguna foto se pudo leer'})
+                    return
+                self.responder(202, servicio.pedir_fotos(nombre, fotos))
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self.servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        except OSError as e:
+            print(f"Altas: no se pudo abrir {host}:{puerto} ({e}); quedan la carpeta y la tecla r")
+            return None
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        print(f"Altas en http://{host}:{puerto}/alta?nombre=...")
+        return self.servidor
+
+    def iniciar(self, puerto=PUERTO):
+        # puerto None = sin HTTP; la carpeta solo si se configuró
+        threading.Thread(target=self.trabajar, daemon=True).start()
+        if self.carpeta:
+            threading.Thread(target=self.vigilar, daemon=True).start()
+        if puerto:
+            self.servir(puerto)
+        return self
+
+    def detener(self):
+        self.detenido.set()
+        if self.servidor is not None:
+            self.servidor.shutdown()
+
+
+def atender_rafaga(servicio, en_curso, frame, caras):
+    # Para el hilo de render de los monitores: en_curso es una lista con a lo sumo
+    # un (pedido, Rafaga); caras: las de analizar() o los resultados del monitor.
+    # Con detección espaciada o escena quieta el embedding es el de un frame
+    # anterior ('nuevo' False): ese frame no se ofrece, sería la misma muestra.
+    if not en_curso:
+        pedida = servicio.rafaga_pedida()
+        if pedida is None:
+            return
+        en_curso.append(pedida)
+    pedido, rafaga = en_curso[0]
+    nuevas = all(cara.get('nuevo', True) for cara in caras)
+    if (nuevas and rafaga.ofrecer(frame, caras_de(caras))) or rafaga.vencida():
+        en_curso.pop()
+        servicio.entregar_rafaga(pedido, rafaga)
+
+
+def pedir(url, cuerpo=None, tipo=None):
+    from urllib.request import Request, urlopen
+    pedido = Request(url, data=cuerpo, method='POST' if cuerpo is not None else 'GET')
+    if tipo:
+        pedido.add_header('Content-Type', tipo)
+    with urlopen(pedido, timeout=10) as r:
+        return json.load(r)
+
+
+if __name__ == "__main__":
+    from urllib.parse import urlencode
+    args = sys.argv[1:]
+    puerto = PUERTO
+    if '--puerto' in args:
+        i = args.index('--puerto')
+        puerto = int(args[i + 1])
+        del args[i:i + 2]
+    base = f"http://{HOST}:{puerto}"
+    try:
+        if len(args) >= 3 and args[0] == "enviar":
+            fotos = []
+            for ruta in args[2:]:
+                with open(ruta, 'rb') as f:
+                    fotos.append(base64.b64encode(f.read()).decode())
+            r = pedir(f"{base}/alta?{urlencode({'nombre': args[1]})}", json.dumps({'fotos': fotos}).encode(),
+                      'application/json')
+            print(f"Pedido #{r['id']} en cola: {r['nombre']} ({len(fotos)} fotos)")
+        elif len(args) == 2 and args[0] == "camara":
+            r = pedir(f"{base}/camara?{urlencode({'nombre': args[1]})}", b'')
+            print(f"Pedido #{r['id']}: {r['nombre']} debe mirar a la cámara del monitor")
+        elif len(args) == 1 and args[0] == "estado":
+            for r in pedir(f"{base}/altas"):
+                rechazos = ', '.join(f"{k}: {v}" for k, v in r['rechazos'].items())
+                print(f"#{r['id']:<4d} [{r['hora'][11:]}] {r['nombre']:24s} {r['estado']:16s} "
+                      f"{r['muestras']} muestras ({r['origen']}){' | ' + rechazos if rechazos else ''}")
+        else:
+            print("Uso:")
+            print("  python altas.py enviar 'Nombre' foto1.jpg [foto2.jpg ...] [--puerto P]")
+            print("  python altas.py camara 'Nombre' [--puerto P]")
+            print("  python altas.py estado [--puerto P]")
+            sys.exit(1)
+    except OSError as e:
+        print(f"No hay servicio de altas en {base} ({e})")
+        sys.exit(1)
@@ -1,137 +1,152 @@
 import cv2
-import numpy as np
-import json
 import os
 from datetime import datetime
-from insightface.app import FaceAnalysis
+import almacen
+from basedatos import abrir_base
+from cache import CacheReconocimiento, Recientes
+from cache import formatear_estadisticas as formatear_cache
+from calidad import ControlCalidad
+from calidad import formatear_estadisticas as formatear_calidad
+from galeria import Galeria, GaleriaViva
+from modelo import obtener_modelo, reportar_primer_reconocimiento
+from inferencia import InferenciaPorLotes, analizar
+import metricas
+from registro import capturar_rafaga, formatear_rechazos, registrar_muestras
+from movimiento import CompuertaMovimiento
+from movimiento import formatear_estadisticas as formatear_reposo
+from pipeline import Pipeline, formatear_estadisticas
 
 # Configuración
-DB_FILE = '/data/empleados.json'
-LOGS_FILE = '/data/asistencia_log.json'
+DB_FILE = '/data/empleados.gal'
+DB_JSON = '/data/empleados.json'  # Formato anterior, se migra al arrancar
+DB_ASISTENCIA = '/data/asistencia.db'  # Eventos de asistencia (SQLite, ver basedatos.py)
+LOGS_DIR = '/data/asistencia_log'  # Bitácora .jsonl anterior, se importa una vez
+LOGS_JSON = '/data/asistencia_log.json'  # Formato anterior, se importa una vez
 THRESHOLD = 0.4  # Similitud mínima para reconocer
+WORKERS = 2      # Hilos de inferencia
+MAX_LOTE = 1     # Frames por lote de inferencia (1 = sin lotes, >1 = un worker por frame del lote)
+PERFIL = 'cpu'   # Perfil de inferencia (perfiles.py): 'cpu', 'cpu_int8', 'cpu_compartido'
+REPOSO_POR_MOVIMIENTO = True  # Sin movimiento ni caras no se corre el modelo
+CONTROL_CALIDAD = True  # Caras chicas, de perfil o movidas no van a ArcFace (ver calidad.py)
+METRICAS_PUERTO = 9108  # http://127.0.0.1:9108/metrics (None = sin endpoint)
+METRICAS_JSON = '/data/metricas.json'  # Volcado periódico de las métricas
 
-# Inicializar detector
-print("Cargando modelo...")
-app = FaceAnalysis(providers=['CPUExecutionProvider'])
-app.prepare(ctx_id=-1, det_size=(640, 640))
-print("Modelo cargado!")
+# Detector: se carga al primer uso, no al importar
+app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640), perfil=PERFIL)
 
 def cargar_db():
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, 'r') as f:
-            data = json.load(f)
-            # Convertir listas a numpy arrays
-            for emp in data:
-                emp['embedding'] = np.array(emp['embedding'])
-            return data
-    return []
+    # Migración única desde el formato JSON anterior
+    if not os.path.exists(DB_FILE) and os.path.exists(DB_JSON):
+        almacen.migrar_json(DB_JSON, DB_FILE)
+    if not os.path.exists(DB_FILE):
+        almacen.crear(DB_FILE)
+    return Galeria.desde_almacen(DB_FILE, THRESHOLD)
 
-def guardar_db(empleados):
-    data = []
-    for emp in empleados:
-        data.append({
-            'nombre': emp['nombre'],
-            'embedding': emp['embedding'].tolist()
-        })
-    with open(DB_FILE, 'w') as f:
-        json.dump(data, f)
+def guardar_empleado(galeria, nombre, embedding):
+    # Solo agrega el registro nuevo, no reescribe la galería
+    almacen.agregar(DB_FILE, nombre, embedding)
+    galeria.agregar(nombre, embedding)
+
+bitacora = None
 
 def registrar_log(nombre, tipo):
-    log = {'nombre': nombre, 'tipo': tipo, 'timestamp': datetime.now().isoformat()}
-    logs = []
-    if os.path.exists(LOGS_FILE):
-        with open(LOGS_FILE, 'r') as f:
-            logs = json.load(f)
-    logs.append(log)
-    with open(LOGS_FILE, 'w') as f:
-        json.dump(logs, f, indent=2)
+    global bitacora
+    if bitacora is None:
+        bitacora = abrir_base(DB_ASISTENCIA, LOGS_JSON, LOGS_DIR)
+    log = bitacora.registrar(nombre, tipo)
     print(f"[{log['timestamp']}] {tipo}: {nombre}")
 
-def comparar_embedding(emb1, emb2):
-    return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-
-def reconocer(embedding, empleados):
-    mejor_match = None
-    mejor_score = 0
-    for emp in empleados:
-        score = comparar_embedding(embedding, emp['embedding'])
-        if score > mejor_score:
-            mejor_score = score
-            mejor_match = emp['nombre']
-    if mejor_score > THRESHOLD:
-        return mejor_match, mejor_score
-    return None, mejor_score
-
 def registrar_empleado(nombre):
-    empleados = cargar_db()
+    app.precalentar()  # El modelo carga mientras se abre la cámara
+    galeria = cargar_db()
     cap = cv2.VideoCapture(0)
     print(f"Registrando a {nombre}... Mira a la cámara.")
     
-    ret, frame = cap.read()
-    if ret:
-        faces = app.get(frame)
-        if len(faces) == 1:
-            empleados.append({
-                'nombre': nombre,
-                'embedding': faces[0].embedding
-            })
-            guardar_db(empleados)
-            print(f"✓ {nombre} registrado!")
-        else:
-            print(f"Error: Se detectaron {len(faces)} caras. Debe haber exactamente 1.")
+    # Ráfaga de varias muestras buenas en lugar de un solo frame
+    rafaga = capturar_rafaga(app, cap, nombre)
     cap.release()
+    n, descartadas = registrar_muestras(galeria, nombre, rafaga.embeddings, guardar_empleado)
+    rafaga.rechazos['inconsistente'] += descartadas
+    if n:
+        print(f"✓ {nombre} registrado! ({n} muestras)")
+    else:
+        print(f"Error: no hubo muestras válidas ({formatear_rechazos(rafaga.rechazos)}). "
+              "Debe haber exactamente 1 cara, cerca y nítida.")
 
-def monitorear():
-    empleados = cargar_db()
-    if not empleados:
+def monitorear(fuente=0):
+    galeria = cargar_db()
+    if not galeria:
         print("No hay empleados registrados. Usa: registrar_empleado('Nombre')")
         return
+    galeria = GaleriaViva(galeria).vigilar()  # Altas de otros procesos sin reiniciar
     
-    cap = cv2.VideoCapture(0)
-    print(f"Monitoreando... {len(empleados)} empleados en DB. Ctrl+C para salir.")
+    print(f"Monitoreando... {len(galeria)} empleados en DB. Ctrl+C para salir.")
+    app.precalentar()  # El modelo carga mientras se abre la cámara
+    metricas.iniciar(METRICAS_PUERTO, METRICAS_JSON)
     
-    detectados_recientes = {}  # Evitar duplicados
+    recientes = Recientes()  # Evitar duplicados
+    cache = CacheReconocimiento(galeria)  # Una cara ya identificada no se busca en cada frame
+    control = ControlCalidad() if CONTROL_CALIDAD else None
     
-    try:
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                continue
-            
-            faces = app.get(frame)
-            
-            for face in faces:
-                nombre, score = reconocer(face.embedding, empleados)
-                
-                if nombre:
-                    ahora = datetime.now()
-                    # Evitar registrar la misma persona en menos de 30 seg
-                    if nombre in detectados_recientes:
-                        diff = (ahora - detectados_recientes[nombre]).seconds
-                        if diff < 30:
-                            continue
-                    
-                    detectados_recientes[nombre] = ahora
-                    registrar_log(nombre, "ENTRADA")
-                    print(f"✓ {nombre} detectado (score: {score:.2f})")
+    # Con lotes, cada worker deja su frame y el lote completo va al modelo de una vez
+    modelo, workers = app, WORKERS
+    if MAX_LOTE > 1:
+        modelo, workers = InferenciaPorLotes(app, MAX_LOTE, control=control), MAX_LOTE
     
-    except KeyboardInterrupt:
-        print("\nMonitoreo detenido.")
+    # Corre en los hilos de inferencia
+    def procesar(frame):
+        return analizar(app, frame, control) if modelo is app else modelo.get(frame)
     
-    cap.release()
+    # Corre en el hilo de registro: los tracks siguen el orden de los frames
+    def consumir(seq, frame, faces):
+        if faces:
+            reportar_primer_reconocimiento()
+        resultados = cache.reconocer([face.bbox for face in faces], [face.embedding for face in faces])
+        for nombre, score in resultados:
+            if nombre:
+                # Evitar registrar la misma persona en menos de 30 seg
+                if not recientes.nuevo(nombre, datetime.now()):
+                    continue
+                registrar_log(nombre, "ENTRADA")
+                print(f"✓ {nombre} detectado (score: {score:.2f})")
+        return True
+    
+    compuerta = CompuertaMovimiento() if REPOSO_POR_MOVIMIENTO else None
+    pipeline = Pipeline(fuente, procesar, consumir, workers=workers, tam_cola=workers,
+                        compuerta=compuerta, vacio=[])
+    pipeline.ejecutar()
+    galeria.detener()
+    if modelo is not app:
+        modelo.detener()
+    if bitacora is not None:
+        bitacora.cerrar()  # Escribe lo que quedó en la cola
+    print("\nMonitoreo detenido.")
+    print(formatear_estadisticas(pipeline.estadisticas()))
+    print(formatear_cache(cache.estadisticas()))
+    if control is not None:
+        print(formatear_calidad(control.estadisticas()))
+    if compuerta is not None:
+        print(formatear_reposo(compuerta.estadisticas()))
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "registrar" and len(sys.argv) > 2:
-            registrar_empleado(sys.argv[2])
-        elif sys.argv[1] == "monitorear":
-            monitorear()
+    from perfiles import perfil_de_args
+    args = sys.argv[1:]
+    perfil = perfil_de_args(args, PERFIL)
+    if perfil != PERFIL:
+        app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640), perfil=perfil)
+    if args:
+        if args[0] == "registrar" and len(args) > 1:
+            registrar_empleado(args[1])
+        elif args[0] == "monitorear":
+            # Fuente opcional: índice de cámara, archivo de video o bus:<nombre> (bus.py)
+            fuente = args[1] if len(args) > 1 else '0'
+            monitorear(int(fuente) if fuente.isdigit() else fuente)
         else:
             print("Uso:")
             print("  python asistencia.py registrar 'Nombre'")
-            print("  python asistencia.py monitorear")
+            print("  python asistencia.py monitorear [camara|video|bus:nombre] [--perfil cpu_int8] [--nucleos 0-1]")
     else:
         print("Uso:")
         print("  python asistencia.py registrar 'Nombre'")
-        print("  python asistencia.py monitorear")
+        print("  python asistencia.py monitorear [camara|video|bus:nombre] [--perfil cpu_int8] [--nucleos 0-1]")
@@ -1,103 +1,126 @@
 import cv2
-import numpy as np
-import json
 import os
 from datetime import datetime
-from insightface.app import FaceAnalysis
+import almacen
+from altas import ServicioAltas, atender_rafaga
+from cache import CacheReconocimiento, Recientes
+from cache import formatear_estadisticas as formatear_cache
+from calidad import ControlCalidad
+from calidad import formatear_estadisticas as formatear_calidad
+from galeria import Galeria, GaleriaViva
+from inferencia import analizar
+import metricas
+from modelo import obtener_modelo, reportar_primer_reconocimiento
+from movimiento import CompuertaMovimiento
+from movimiento import formatear_estadisticas as formatear_reposo
+from pipeline import Pipeline, formatear_estadisticas
+from vista import Vista, vista_de_args
 
 # Configuración
-DB_FILE = '/app/empleados.json'
-LOGS_FILE = '/app/asistencia_log.json'
+DB_FILE = '/app/empleados.gal'
+DB_JSON = '/app/empleados.json'  # Formato anterior, se migra al arrancar
 THRESHOLD = 0.4
+FUENTE = 0       # Índice de cámara o ruta de video
+WORKERS = 2      # Hilos de inferencia
+ALTAS_DIR = '/app/altas'  # Dejar Nombre.jpg o Nombre/ con fotos para dar de alta
+ALTAS_PUERTO = 9110  # Altas por HTTP local (None = solo carpeta y tecla r)
+VISTA = 'ventana'  # 'ventana', 'mjpeg' (http://127.0.0.1:9111/video) o 'ninguna' (sin pantalla)
+VISTA_FPS = 10   # Cuadros por segundo de la vista; el reconocimiento no se limita
+CONTROL_PUERTO = 9111  # Teclas por HTTP local: python vista.py tecla r 'Nombre' (None = sin canal)
+REPOSO_POR_MOVIMIENTO = True  # Sin movimiento ni caras no se corre el modelo
+CONTROL_CALIDAD = True  # Caras chicas, de perfil o movidas no van a ArcFace (ver calidad.py)
+METRICAS_PUERTO = 9108  # http://127.0.0.1:9108/metrics (None = sin endpoint)
+METRICAS_JSON = '/app/metricas.json'  # Volcado periódico de las métricas
 
-print("Cargando modelo con GPU...")
-app = FaceAnalysis(providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
-app.prepare(ctx_id=0, det_size=(640, 640))
-print("Modelo cargado!")
+# Detector: se carga al primer uso, no al importar
+app = obtener_modelo(['CUDAExecutionProvider', 'CPUExecutionProvider'], ctx_id=0,
+                     det_size=(640, 640), mensaje="Cargando modelo con GPU...")
 
 def cargar_db():
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, 'r') as f:
-            data = json.load(f)
-            for emp in data:
-                emp['embedding'] = np.array(emp['embedding'])
-            return data
-    return []
+    # Migración única desde el formato JSON anterior
+    if not os.path.exists(DB_FILE) and os.path.exists(DB_JSON):
+        almacen.migrar_json(DB_JSON, DB_FILE)
+    if not os.path.exists(DB_FILE):
+        almacen.crear(DB_FILE)
+    return Galeria.desde_almacen(DB_FILE, THRESHOLD)
 
-def guardar_db(empleados):
-    data = [{'nombre': e['nombre'], 'embedding': e['embedding'].tolist()} for e in empleados]
-    with open(DB_FILE, 'w') as f:
-        json.dump(data, f)
-
-def comparar_embedding(emb1, emb2):
-    return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-
-def reconocer(embedding, empleados):
-    mejor_match, mejor_score = None, 0
-    for emp in empleados:
-        score = comparar_embedding(embedding, emp['embedding'])
-        if score > mejor_score:
-            mejor_score, mejor_match = score, emp['nombre']
-    return (mejor_match, mejor_score) if mejor_score > THRESHOLD else (None, mejor_score)
-
-def main():
-    empleados = cargar_db()
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+def main(fuente=FUENTE, modo_vista=VISTA):
+    app.precalentar()  # El modelo carga mientras se abre la cámara
+    metricas.iniciar(METRICAS_PUERTO, METRICAS_JSON)
+    # Las altas se procesan en otro hilo y se publican sin frenar el video
+    galeria = GaleriaViva(cargar_db()).vigilar()  # Altas de otros procesos sin reiniciar
+    altas = ServicioAltas(app, galeria, DB_FILE, ALTAS_DIR).iniciar(ALTAS_PUERTO)
+    vista = Vista(modo_vista, VISTA_FPS).iniciar(CONTROL_PUERTO)
+    print(f"Empleados: {len(galeria)} | R=Registrar | Q=Salir")
     
-    print(f"Empleados: {len(empleados)} | R=Registrar | Q=Salir")
+    recientes = Recientes()  # Una entrada por persona cada 30 seg
+    cache = CacheReconocimiento(galeria)  # Una cara ya identificada no se busca en cada frame
+    control = ControlCalidad() if CONTROL_CALIDAD else None
+    en_alta = []  # Ráfaga en curso: junta muestras de los próximos frames
     
-    detectados = {}
-    prev_time = datetime.now()
+    # Corre en los hilos de inferencia
+    def procesar(frame):
+        return analizar(app, frame, control)
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            continue
-        
-        faces = app.get(frame)
-        
-        # Calcular FPS
+    # Corre en el hilo de render: los tracks siguen el orden de los frames
+    def consumir(seq, frame, faces):
         now = datetime.now()
-        fps = 1 / max((now - prev_time).total_seconds(), 0.001)
-        prev_time = now
+        if faces:
+            reportar_primer_reconocimiento()
+        resultados = cache.reconocer([face.bbox for face in faces], [face.embedding for face in faces])
         
-        for face in faces:
-            box = face.bbox.astype(int)
-            nombre, score = reconocer(face.embedding, empleados)
-            
-            if nombre:
-                color, label = (0, 255, 0), f"{nombre} ({score:.2f})"
-                if nombre not in detectados or (now - detectados[nombre]).seconds > 30:
-                    detectados[nombre] = now
-                    print(f"✓ ENTRADA: {nombre} - {now.strftime('%H:%M:%S')}")
-            else:
-                color, label = (0, 0, 255), "Desconocido"
-            
-            cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), color, 2)
-            cv2.putText(frame, label, (box[0], box[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        atender_rafaga(altas, en_alta, frame, faces)
         
-        cv2.putText(frame, f"FPS: {fps:.1f} | Empleados: {len(empleados)}", (10, 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        for face, (nombre, score) in zip(faces, resultados):
+            if nombre and recientes.nuevo(nombre, now):
+                print(f"✓ ENTRADA: {nombre} - {now.strftime('%H:%M:%S')}")
         
-        cv2.imshow('Asistencia', frame)
+        # Sin vista (o entre cuadros de la vista) no se dibuja nada
+        if vista.quiere_frame():
+            for face, (nombre, score) in zip(faces, resultados):
+                box = face.bbox.astype(int)
+                if nombre:
+                    color, label = (0, 255, 0), f"{nombre} ({score:.2f})"
+                elif face.calidad:
+                    color, label = (128, 128, 128), f"({face.calidad})"  # Espera un frame mejor
+                else:
+                    color, label = (0, 0, 255), "Desconocido"
+                cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), color, 2)
+                cv2.putText(frame, label, (box[0], box[1]-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            
+            # FPS real del pipeline, no la suma de las etapas
+            fps = pipeline.estadisticas()['render']['fps']
+            cv2.putText(frame, f"FPS: {fps:.1f} | Empleados: {len(galeria)}", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            vista.mostrar(frame)
         
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
-            break
-        elif key == ord('r'):
-            nombre = input("Nombre: ").strip()
-            if nombre:
-                ret, frame = cap.read()
-                faces = app.get(frame)
-                if len(faces) == 1:
-                    empleados.append({'nombre': nombre, 'embedding': faces[0].embedding})
-                    guardar_db(empleados)
-                    print(f"✓ {nombre} registrado!")
+        # Teclas de la ventana o del canal de control (python vista.py tecla ...)
+        for tecla, params in vista.teclas():
+            if tecla == 'q':
+                return False
+            elif tecla == 'r':
+                altas.pedir_por_tecla(params.get('nombre'))  # Sin detener el video
+        return True
     
-    cap.release()
-    cv2.destroyAllWindows()
+    compuerta = CompuertaMovimiento() if REPOSO_POR_MOVIMIENTO else None
+    pipeline = Pipeline(fuente, procesar, consumir, workers=WORKERS, compuerta=compuerta)
+    pipeline.ejecutar()
+    altas.detener()
+    galeria.detener()
+    vista.detener()
+    print(formatear_estadisticas(pipeline.estadisticas()))
+    print(formatear_cache(cache.estadisticas()))
+    if control is not None:
+        print(formatear_calidad(control.estadisticas()))
+    if compuerta is not None:
+        print(formatear_reposo(compuerta.estadisticas()))
 
 if __name__ == "__main__":
-    main()
+    import sys
+    # Uso: python asistencia_gpu.py [camara|video|bus:nombre] [--vista ventana|mjpeg|ninguna]
+    args = sys.argv[1:]
+    modo_vista = vista_de_args(args, VISTA)
+    if args:
+        main(int(args[0]) if args[0].isdigit() else args[0], modo_vista)
+    else:
+        main(modo_vista=modo_vista)
@@ -1,107 +1,108 @@
 import cv2
-import numpy as np
-import json
 import os
 from datetime import datetime
-from insightface.app import FaceAnalysis
+import almacen
+from altas import ServicioAltas, atender_rafaga
+from basedatos import abrir_base
+from bus import abrir_captura, es_bus
+from cache import CacheReconocimiento, Recientes
+from calidad import ControlCalidad
+from calidad import formatear_estadisticas as formatear_calidad
+from galeria import Galeria, GaleriaViva
+from inferencia import analizar
+from modelo import obtener_modelo, reportar_primer_reconocimiento
+from vista import Vista, vista_de_args
 
 # Configuración
-DB_FILE = '/app/empleados.json'
-LOGS_FILE = '/app/asistencia_log.json'
+DB_FILE = '/app/empleados.gal'
+DB_JSON = '/app/empleados.json'  # Formato anterior, se migra al arrancar
+DB_ASISTENCIA = '/app/asistencia.db'  # Eventos de asistencia (SQLite, ver basedatos.py)
+LOGS_DIR = '/app/asistencia_log'  # Bitácora .jsonl anterior, se importa una vez
+LOGS_JSON = '/app/asistencia_log.json'  # Formato anterior, se importa una vez
 THRESHOLD = 0.4
+FUENTE = 0       # Índice de cámara, ruta de video o bus:<nombre> (frames de bus.py)
+ALTAS_DIR = '/app/altas'  # Dejar Nombre.jpg o Nombre/ con fotos para dar de alta
+ALTAS_PUERTO = 9110  # Altas por HTTP local (None = solo carpeta y tecla r)
+VISTA = 'ventana'  # 'ventana', 'mjpeg' (http://127.0.0.1:9111/video) o 'ninguna' (sin pantalla)
+VISTA_FPS = 10   # Cuadros por segundo de la vista; el reconocimiento no se limita
+CONTROL_PUERTO = 9111  # Teclas por HTTP local: python vista.py tecla r 'Nombre' (None = sin canal)
+PERFIL = 'cpu'   # Perfil de inferencia (perfiles.py): 'cpu', 'cpu_int8', 'cpu_compartido'
+CONTROL_CALIDAD = True  # Caras chicas, de perfil o movidas no van a ArcFace (ver calidad.py)
 
-# Inicializar detector
-print("Cargando modelo...")
-app = FaceAnalysis(providers=['CPUExecutionProvider'])
-app.prepare(ctx_id=-1, det_size=(640, 640))
-print("Modelo cargado!")
+# Detector: se carga al primer uso, no al importar
+app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640), perfil=PERFIL)
 
 def cargar_db():
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, 'r') as f:
-            data = json.load(f)
-            for emp in data:
-                emp['embedding'] = np.array(emp['embedding'])
-            return data
-    return []
+    # Migración única desde el formato JSON anterior
+    if not os.path.exists(DB_FILE) and os.path.exists(DB_JSON):
+        almacen.migrar_json(DB_JSON, DB_FILE)
+    if not os.path.exists(DB_FILE):
+        almacen.crear(DB_FILE)
+    return Galeria.desde_almacen(DB_FILE, THRESHOLD)
 
-def guardar_db(empleados):
-    data = []
-    for emp in empleados:
-        data.append({
-            'nombre': emp['nombre'],
-            'embedding': emp['embedding'].tolist()
-        })
-    with open(DB_FILE, 'w') as f:
-        json.dump(data, f)
+bitacora = None
 
 def registrar_log(nombre, tipo):
-    log = {'nombre': nombre, 'tipo': tipo, 'timestamp': datetime.now().isoformat()}
-    logs = []
-    if os.path.exists(LOGS_FILE):
-        with open(LOGS_FILE, 'r') as f:
-            logs = json.load(f)
-    logs.append(log)
-    with open(LOGS_FILE, 'w') as f:
-        json.dump(logs, f, indent=2)
+    global bitacora
+    if bitacora is None:
+        bitacora = abrir_base(DB_ASISTENCIA, LOGS_JSON, LOGS_DIR)
+    log = bitacora.registrar(nombre, tipo)
     return log
 
-def comparar_embedding(emb1, emb2):
-    return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-
-def reconocer(embedding, empleados):
-    mejor_match = None
-    mejor_score = 0
-    for emp in empleados:
-        score = comparar_embedding(embedding, emp['embedding'])
-        if score > mejor_score:
-            mejor_score = score
-            mejor_match = emp['nombre']
-    if mejor_score > THRESHOLD:
-        return mejor_match, mejor_score
-    return None, mejor_score
-
-def main():
-    empleados = cargar_db()
-    print(f"Empleados registrados: {len(empleados)}")
+def main(modo_vista=VISTA, fuente=FUENTE):
+    app.precalentar()  # El modelo carga mientras se abre la cámara
+    # Las altas se procesan en otro hilo y se publican sin frenar el video
+    galeria = GaleriaViva(cargar_db()).vigilar()  # Altas de otros procesos sin reiniciar
+    altas = ServicioAltas(app, galeria, DB_FILE, ALTAS_DIR).iniciar(ALTAS_PUERTO)
+    print(f"Empleados registrados: {len(galeria)}")
     
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    cap = abrir_captura(fuente)
     
     if not cap.isOpened():
         print("Error: No se puede abrir la cámara")
         return
     
+    vista = Vista(modo_vista, VISTA_FPS, 'Sistema de Asistencia').iniciar(CONTROL_PUERTO)
     print("Controles:")
     print("  'r' - Registrar nueva persona")
     print("  'q' - Salir")
     
-    detectados_recientes = {}
+    recientes = Recientes()  # Una entrada por persona cada 30 seg
+    cache = CacheReconocimiento(galeria)  # Una cara ya identificada no se busca en cada frame
+    control = ControlCalidad() if CONTROL_CALIDAD else None
     ultimo_log = ""
+    en_alta = []  # Ráfaga en curso: junta muestras de los próximos frames
     
     while True:
         ret, frame = cap.read()
         if not ret:
-            continue
+            if cap.isOpened() and (isinstance(fuente, int) or es_bus(fuente)):
+                continue
+            break  # Fin del video o bus cerrado
         
-        # Detectar caras
-        faces = app.get(frame)
+        # Detectar caras (solo las que pasan el control de calidad llevan embedding)
+        faces = analizar(app, frame, control)
+        resultados = cache.reconocer([face.bbox for face in faces], [face.embedding for face in faces])
+        if faces:
+            reportar_primer_reconocimiento()
+        atender_rafaga(altas, en_alta, frame, faces)
+        dibujar = vista.quiere_frame()  # Sin vista (o entre cuadros de la vista) no se dibuja
         
-        for face in faces:
+        for face, (nombre, score) in zip(faces, resultados):
+            if nombre:
+                ahora = datetime.now()
+                if recientes.nuevo(nombre, ahora):
+                    registrar_log(nombre, "ENTRADA")
+                    ultimo_log = f"{nombre} - ENTRADA - {ahora.strftime('%H:%M:%S')}"
+            if not dibujar:
+                continue
             box = face.bbox.astype(int)
-            nombre, score = reconocer(face.embedding, empleados)
-            
             if nombre:
                 color = (0, 255, 0)  # Verde
                 label = f"{nombre} ({score:.2f})"
-                
-                ahora = datetime.now()
-                if nombre not in detectados_recientes or \
-                   (ahora - detectados_recientes[nombre]).seconds > 30:
-                    detectados_recientes[nombre] = ahora
-                    log = registrar_log(nombre, "ENTRADA")
-                    ultimo_log = f"{nombre} - ENTRADA - {ahora.strftime('%H:%M:%S')}"
+            elif face.calidad:
+                color = (128, 128, 128)  # Gris: espera un frame mejor
+                label = f"({face.calidad})"
             else:
                 color = (0, 0, 255)  # Rojo
                 label = "Desconocido"
@@ -111,40 +112,38 @@ def main():
             cv2.putText(frame, label, (box[0], box[1]-10), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
         
-        # Info en pantalla
-        cv2.putText(frame, f"Empleados: {len(empleados)}", (10, 30),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-        cv2.putText(frame, f"Ultimo: {ultimo_log}", (10, 60),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
-        cv2.putText(frame, "R=Registrar | Q=Salir", (10, 470),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+        if dibujar:
+            # Info en pantalla
+            cv2.putText(frame, f"Empleados: {len(galeria)}", (10, 30),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            cv2.putText(frame, f"Ultimo: {ultimo_log}", (10, 60),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 0), 1)
+            cv2.putText(frame, "R=Registrar | Q=Salir", (10, 470),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (200, 200, 200), 1)
+            vista.mostrar(frame)
         
-        cv2.imshow('Sistema de Asistencia', frame)
-        
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
+        # Teclas de la ventana o del canal de control (python vista.py tecla ...)
+        teclas = vista.teclas()
+        if any(tecla == 'q' for tecla, _ in teclas):
             break
-        elif key == ord('r'):
-            # Registrar nueva persona
-            print("\n--- REGISTRO ---")
-            nombre = input("Nombre del empleado: ").strip()
-            if nombre:
-                print("Mira a la cámara...")
-                ret, frame = cap.read()
-                if ret:
-                    faces = app.get(frame)
-                    if len(faces) == 1:
-                        empleados.append({
-                            'nombre': nombre,
-                            'embedding': faces[0].embedding
-                        })
-                        guardar_db(empleados)
-                        print(f"✓ {nombre} registrado!")
-                    else:
-                        print(f"Error: {len(faces)} caras detectadas")
+        for tecla, params in teclas:
+            if tecla == 'r':
+                # El nombre se pide en la consola sin detener el video
+                altas.pedir_por_tecla(params.get('nombre'))
     
+    altas.detener()
+    galeria.detener()
+    vista.detener()
     cap.release()
-    cv2.destroyAllWindows()
+    if bitacora is not None:
+        bitacora.cerrar()  # Escribe lo que quedó en la cola
+    if control is not None:
+        print(formatear_calidad(control.estadisticas()))
 
 if __name__ == "__main__":
-    main()
+    import sys
+    # Uso: python asistencia_gui.py [camara|video|bus:nombre] [--vista ventana|mjpeg|ninguna]
+    args = sys.argv[1:]
+    modo_vista = vista_de_args(args, VISTA)
+    fuente = args[0] if args else FUENTE
+    main(modo_vista, int(fuente) if str(fuente).isdigit() else fuente)
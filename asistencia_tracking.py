@@ -1,237 +1,285 @@
 import cv2
-import numpy as np
-import json
 import os
+import threading
 from datetime import datetime
-from insightface.app import FaceAnalysis
+import almacen
+from basedatos import abrir_base
+from altas import ServicioAltas, atender_rafaga
+from galeria import Galeria, GaleriaViva
+import metricas
+from modelo import obtener_modelo, reportar_primer_reconocimiento
+from pipeline import Pipeline, formatear_estadisticas
+from seguimiento import DeteccionEspaciada, Rastreador, deteccion_completa
+from calidad import ControlCalidad
+from calidad import formatear_estadisticas as formatear_calidad
+from deteccion import MARGEN_ROI, DeteccionAdaptativa, rois_puerta, texto_a_roi
+from deteccion import formatear_estadisticas as formatear_detector
+from movimiento import CompuertaMovimiento
+from movimiento import formatear_estadisticas as formatear_reposo
+from vista import Vista, vista_de_args
+import zonas
 
 # Configuración
-DB_FILE = '/app/empleados.json'
-LOGS_FILE = '/app/asistencia_log.json'
+DB_FILE = '/app/empleados.gal'
+DB_JSON = '/app/empleados.json'  # Formato anterior, se migra al arrancar
+DB_ASISTENCIA = '/app/asistencia.db'  # Eventos de asistencia (SQLite, ver basedatos.py)
+LOGS_DIR = '/app/asistencia_log'  # Bitácora .jsonl anterior, se importa una vez
+LOGS_JSON = '/app/asistencia_log.json'  # Formato anterior, se importa una vez
 THRESHOLD = 0.4
+FUENTE = 0       # Índice de cámara o ruta de video
+WORKERS = 2      # Hilos de inferencia
+DETECTAR_CADA = 1  # 1 = detección completa en cada frame; N > 1 = detectar cada N frames y propagar
+DETECCION_ADAPTATIVA = True  # Con DETECTAR_CADA = 1: ROIs, resolución adaptativa y salteo de frames quietos
+ROIS = None      # [(x1, y1, x2, y2), ...] donde buscar caras; None = franja de la puerta (sigue a las líneas)
+ALTAS_DIR = '/app/altas'  # Dejar Nombre.jpg o Nombre/ con fotos para dar de alta
+ALTAS_PUERTO = 9110  # Altas por HTTP local (None = solo carpeta y tecla r)
+VISTA = 'ventana'  # 'ventana', 'mjpeg' (http://127.0.0.1:9111/video) o 'ninguna' (sin pantalla)
+VISTA_FPS = 10   # Cuadros por segundo de la vista; el seguimiento no se limita
+CONTROL_PUERTO = 9111  # Teclas por HTTP local: python vista.py tecla 1 (None = sin canal)
+TECLAS_LINEAS = ('1', '2', '3', '4')  # Mueven las líneas; con zonas por polígonos avisan dónde se editan
+REPOSO_POR_MOVIMIENTO = True  # Sin movimiento ni caras no se corre el modelo
+CONTROL_CALIDAD = True  # Caras chicas, de perfil o movidas no van a ArcFace (ver calidad.py)
+METRICAS_PUERTO = 9108  # http://127.0.0.1:9108/metrics (None = sin endpoint)
+METRICAS_JSON = '/app/metricas.json'  # Volcado periódico de las métricas
 
 # Zonas (ajustar según tu cámara)
-ZONA_IZQUIERDA = 150   # X menor a esto = zona izquierda (oficinas)
-ZONA_DERECHA = 490     # X mayor a esto = zona derecha (oficinas)
+ZONA_IZQUIERDA = zonas.ZONA_IZQUIERDA   # X menor a esto = zona izquierda (oficinas)
+ZONA_DERECHA = zonas.ZONA_DERECHA       # X mayor a esto = zona derecha (oficinas)
 # Entre ZONA_IZQUIERDA y ZONA_DERECHA = zona centro (puerta)
+ZONAS_CONFIG = '/app/zonas.json'  # Polígonos y líneas por cámara (ver zonas.py); las teclas 1-4 se guardan acá
+ZONAS_CAMARA = 'principal'        # Entrada de esta cámara en ZONAS_CONFIG
 
-print("Cargando modelo con GPU...")
-app = FaceAnalysis(providers=['CUDAExecutionProvider', 'CPUExecutionProvider'])
-app.prepare(ctx_id=0, det_size=(640, 640))
-print("Modelo cargado!")
+# Detector: se carga al primer uso, no al importar
+app = obtener_modelo(['CUDAExecutionProvider', 'CPUExecutionProvider'], ctx_id=0,
+                     det_size=(640, 640), mensaje="Cargando modelo con GPU...")
 
-tracks = {}
-next_id = 0
+rastreador = Rastreador()
 
 def cargar_db():
-    if os.path.exists(DB_FILE):
-        with open(DB_FILE, 'r') as f:
-            data = json.load(f)
-            for emp in data:
-                emp['embedding'] = np.array(emp['embedding'])
-            return data
-    return []
+    # Migración única desde el formato JSON anterior
+    if not os.path.exists(DB_FILE) and os.path.exists(DB_JSON):
+        almacen.migrar_json(DB_JSON, DB_FILE)
+    if not os.path.exists(DB_FILE):
+        almacen.crear(DB_FILE)
+    return Galeria.desde_almacen(DB_FILE, THRESHOLD)
 
-def guardar_db(empleados):
-    data = [{'nombre': e['nombre'], 'embedding': e['embedding'].tolist()} for e in empleados]
-    with open(DB_FILE, 'w') as f:
-        json.dump(data, f)
+bitacora = None
 
-def registrar_log(nombre, tipo):
-    log = {'nombre': nombre, 'tipo': tipo, 'timestamp': datetime.now().isoformat()}
-    logs = []
-    if os.path.exists(LOGS_FILE):
-        with open(LOGS_FILE, 'r') as f:
-            logs = json.load(f)
-    logs.append(log)
-    with open(LOGS_FILE, 'w') as f:
-        json.dump(logs, f, indent=2)
-    print(f"[{datetime.now().strftime('%H:%M:%S')}] {tipo}: {nombre}")
+def registrar_log(nombre, tipo, timestamp=None):
+    # timestamp: momento del cruce, si se registra después (track identificado tarde)
+    global bitacora
+    if bitacora is None:
+        bitacora = abrir_base(DB_ASISTENCIA, LOGS_JSON, LOGS_DIR)
+    timestamp = timestamp or datetime.now()
+    bitacora.registrar(nombre, tipo, timestamp)
+    print(f"[{timestamp.strftime('%H:%M:%S')}] {tipo}: {nombre}")
 
-def comparar_embedding(emb1, emb2):
-    return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+# Zonas de ZONAS_CONFIG (main() las carga); sin archivo, las dos líneas de arriba
+motor = zonas.verticales(ZONA_IZQUIERDA, ZONA_DERECHA)
 
-def reconocer(embedding, empleados):
-    mejor_match, mejor_score = None, 0
-    for emp in empleados:
-        score = comparar_embedding(embedding, emp['embedding'])
-        if score > mejor_score:
-            mejor_score, mejor_match = score, emp['nombre']
-    return (mejor_match, mejor_score) if mejor_score > THRESHOLD else (None, mejor_score)
+def cruces(tids, centros, marca=None):
+    # Todos los tracks del frame en una pasada; con histéresis en los bordes.
+    # -> [(track, evento, marca del cruce)] de los tracks con nombre, incluidos
+    # los cruces que esperaban a que el track se identificara
+    tracks = [rastreador.tracks[tid] for tid in tids]
+    return zonas.por_registrar(tracks, motor.cruces(tracks, centros), marca)
 
-def get_zona(x):
-    if x < ZONA_IZQUIERDA:
-        return 'izquierda'
-    elif x > ZONA_DERECHA:
-        return 'derecha'
-    else:
-        return 'centro'
-
-def find_track(nombre):
-    global next_id
-    
-    for tid, track in tracks.items():
-        if track['nombre'] == nombre and not track['cruzado']:
-            return tid
-    
-    tid = next_id
-    next_id += 1
-    tracks[tid] = {
-        'nombre': nombre,
-        'zona_inicial': None,
-        'zona_actual': None,
-        'cruzado': False
-    }
-    return tid
-
-def check_cruce(tid, centro_x):
-    track = tracks[tid]
-    
-    if track['cruzado']:
-        return None
-    
-    zona_actual = get_zona(centro_x)
-    
-    # Primera vez que vemos a esta persona
-    if track['zona_inicial'] is None:
-        track['zona_inicial'] = zona_actual
-        track['zona_actual'] = zona_actual
-        return None
-    
-    track['zona_actual'] = zona_actual
-    
-    # Verificar transición
-    zona_inicial = track['zona_inicial']
-    
-    # ENTRADA: viene del centro (puerta) y va a izquierda o derecha (oficinas)
-    if zona_inicial == 'centro' and zona_actual in ['izquierda', 'derecha']:
-        track['cruzado'] = True
-        return 'ENTRADA'
-    
-    # SALIDA: viene de izquierda o derecha (oficinas) y va al centro (puerta)
-    if zona_inicial in ['izquierda', 'derecha'] and zona_actual == 'centro':
-        track['cruzado'] = True
-        return 'SALIDA'
-    
-    return None
-
-def limpiar_tracks():
-    to_delete = [tid for tid, t in tracks.items() if t['cruzado']]
-    for tid in to_delete:
-        del tracks[tid]
+def rois_zonas():
+    if motor.verticales:
+        return rois_puerta(ZONA_IZQUIERDA, ZONA_DERECHA)
+    return motor.rois(MARGEN_ROI)
 
-def main():
-    global ZONA_IZQUIERDA, ZONA_DERECHA
+def main(fuente=FUENTE, cada=DETECTAR_CADA, adaptativa=DETECCION_ADAPTATIVA, rois=ROIS, modo_vista=VISTA):
+    global motor, ZONA_IZQUIERDA, ZONA_DERECHA
+    app.precalentar()  # El modelo carga mientras se abre la cámara
+    motor = zonas.cargar(ZONAS_CONFIG, ZONAS_CAMARA, ZONA_IZQUIERDA, ZONA_DERECHA)
+    if motor.verticales:
+        ZONA_IZQUIERDA, ZONA_DERECHA = motor.verticales
+    metricas.iniciar(METRICAS_PUERTO, METRICAS_JSON)
+    # Las altas se procesan en otro hilo y se publican sin frenar el video
+    galeria = GaleriaViva(cargar_db()).vigilar()  # Altas de otros procesos sin reiniciar
+    altas = ServicioAltas(app, galeria, DB_FILE, ALTAS_DIR).iniciar(ALTAS_PUERTO)
     
-    empleados = cargar_db()
-    cap = cv2.VideoCapture(0)
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    
-    print(f"Empleados: {len(empleados)}")
+    print(f"Empleados: {len(galeria)}")
+    vista = Vista(modo_vista, VISTA_FPS, 'Sistema de Asistencia').iniciar(CONTROL_PUERTO)
     print("Controles:")
-    print("  R = Registrar")
+    print("  R = Registrar (o python altas.py enviar|camara)")
     print("  Q = Salir")
     print("  1/2 = Mover línea izquierda")
     print("  3/4 = Mover línea derecha")
     
-    prev_time = datetime.now()
-    entradas_hoy = 0
-    salidas_hoy = 0
-    frame_count = 0
+    # Contadores del hilo de render
+    estado = {'entradas': 0, 'salidas': 0, 'frames': 0}
+    en_alta = []  # Ráfaga en curso: junta muestras de los próximos frames
+    
+    workers = WORKERS
+    adaptable = None
+    control = ControlCalidad() if CONTROL_CALIDAD else None
+    if cada > 1:
+        # El detector espaciado guarda estado entre frames: un solo hilo de inferencia
+        espaciada = DeteccionEspaciada(app, galeria, cada, control=control)
+        lock = threading.Lock()
+        workers = 1
+        
+        def procesar(frame):
+            with lock:
+                return espaciada.procesar(frame)
+    elif adaptativa:
+        # También guarda estado entre frames (movimiento, resolución actual)
+        adaptable = DeteccionAdaptativa(app, galeria, rois or rois_zonas(), control=control)
+        lock = threading.Lock()
+        workers = 1
+        
+        def procesar(frame):
+            with lock:
+                return adaptable.procesar(frame)
+    else:
+        def procesar(frame):
+            return deteccion_completa(app, galeria, frame, control)
     
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            continue
+    # Corre en el hilo de render: el seguimiento y los cruces se evalúan en orden
+    def consumir(seq, frame, resultado):
+        global motor, ZONA_IZQUIERDA, ZONA_DERECHA
+        estado['frames'] += 1
+        if resultado:
+            reportar_primer_reconocimiento()
         
-        frame_count += 1
-        faces = app.get(frame)
+        atender_rafaga(altas, en_alta, frame, resultado)  # Solo toma embeddings nuevos
         
-        now = datetime.now()
-        fps = 1 / max((now - prev_time).total_seconds(), 0.001)
-        prev_time = now
+        ids = rastreador.actualizar(resultado)
+        # El cruce se sigue por track aunque la persona aún no esté identificada;
+        # se registra (con la hora del cruce) cuando el track ya tiene nombre
+        centros = [((c['bbox'][0] + c['bbox'][2]) / 2, (c['bbox'][1] + c['bbox'][3]) / 2) for c in resultado]
+        for track, cruce, cuando in cruces(ids, centros, datetime.now()):
+            registrar_log(track['nombre'], cruce, cuando)
+            if cruce == 'ENTRADA':
+                estado['entradas'] += 1
+            else:
+                estado['salidas'] += 1
         
-        for face in faces:
-            box = face.bbox.astype(int)
+        dibujar = vista.quiere_frame()  # Sin vista (o entre cuadros de la vista) no se dibuja
+        for cara, tid in zip(resultado, ids):
+            if not dibujar:
+                break
+            track = rastreador.tracks[tid]
+            nombre, score = track['nombre'], track['score']
+            box = cara['bbox'].astype(int)
             centro_x = (box[0] + box[2]) // 2
             centro_y = (box[1] + box[3]) // 2
             
-            nombre, score = reconocer(face.embedding, empleados)
-            
             if nombre:
                 color = (0, 255, 0)
-                label = f"{nombre} ({score:.2f})"
-                
-                tid = find_track(nombre)
-                cruce = check_cruce(tid, centro_x)
-                
-                if cruce:
-                    registrar_log(nombre, cruce)
-                    if cruce == 'ENTRADA':
-                        entradas_hoy += 1
-                    else:
-                        salidas_hoy += 1
+                label = f"#{tid} {nombre} ({score:.2f})"
             else:
                 color = (0, 0, 255)
-                label = "Desconocido"
+                label = f"#{tid} Desconocido"
             
             cv2.rectangle(frame, (box[0], box[1]), (box[2], box[3]), color, 2)
             cv2.putText(frame, label, (box[0], box[1]-10), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
             cv2.circle(frame, (centro_x, centro_y), 5, color, -1)
         
-        # Dibujar líneas verticales
-        cv2.line(frame, (ZONA_IZQUIERDA, 0), (ZONA_IZQUIERDA, 480), (255, 255, 0), 2)
-        cv2.line(frame, (ZONA_DERECHA, 0), (ZONA_DERECHA, 480), (255, 255, 0), 2)
-        
-        # Etiquetas de zonas
-        cv2.putText(frame, "OFICINAS", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        cv2.putText(frame, "PUERTA", (280, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-        cv2.putText(frame, "OFICINAS", (520, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
-        
-        # Info
-        cv2.putText(frame, f"FPS: {fps:.1f}", (10, 470),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-        cv2.putText(frame, f"Entradas: {entradas_hoy} | Salidas: {salidas_hoy}", (200, 470),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
-        cv2.putText(frame, f"Empleados: {len(empleados)}", (500, 470),
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        
-        cv2.imshow('Sistema de Asistencia', frame)
-        
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
-            break
-        elif key == ord('r'):
-            nombre = input("Nombre: ").strip()
-            if nombre:
-                ret, frame = cap.read()
-                faces = app.get(frame)
-                if len(faces) == 1:
-                    empleados.append({'nombre': nombre, 'embedding': faces[0].embedding})
-                    guardar_db(empleados)
-                    print(f"✓ {nombre} registrado!")
-                else:
-                    print(f"Error: {len(faces)} caras detectadas")
-        elif key == ord('1'):
-            ZONA_IZQUIERDA = max(10, ZONA_IZQUIERDA - 10)
-            print(f"Línea izq: X={ZONA_IZQUIERDA}")
-        elif key == ord('2'):
-            ZONA_IZQUIERDA = min(300, ZONA_IZQUIERDA + 10)
-            print(f"Línea izq: X={ZONA_IZQUIERDA}")
-        elif key == ord('3'):
-            ZONA_DERECHA = max(340, ZONA_DERECHA - 10)
-            print(f"Línea der: X={ZONA_DERECHA}")
-        elif key == ord('4'):
-            ZONA_DERECHA = min(630, ZONA_DERECHA + 10)
-            print(f"Línea der: X={ZONA_DERECHA}")
+        if dibujar:
+            if motor.verticales:
+                # Dibujar líneas verticales
+                cv2.line(frame, (ZONA_IZQUIERDA, 0), (ZONA_IZQUIERDA, 480), (255, 255, 0), 2)
+                cv2.line(frame, (ZONA_DERECHA, 0), (ZONA_DERECHA, 480), (255, 255, 0), 2)
+                
+                # Etiquetas de zonas
+                cv2.putText(frame, "OFICINAS", (20, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+                cv2.putText(frame, "PUERTA", (280, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+                cv2.putText(frame, "OFICINAS", (520, 50), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+            else:
+                motor.dibujar(frame)
+            
+            # Info (FPS real del pipeline, no la suma de las etapas)
+            fps = pipeline.estadisticas()['render']['fps']
+            cv2.putText(frame, f"FPS: {fps:.1f}", (10, 470),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            cv2.putText(frame, f"Entradas: {estado['entradas']} | Salidas: {estado['salidas']}", (200, 470),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+            cv2.putText(frame, f"Empleados: {len(galeria)}", (500, 470),
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+            vista.mostrar(frame)
         
-        if frame_count % 100 == 0:
-            limpiar_tracks()
+        # Teclas de la ventana o del canal de control (python vista.py tecla ...)
+        for key, params in vista.teclas():
+            if key == 'q':
+                return False
+            elif key == 'r':
+                altas.pedir_por_tecla(params.get('nombre'))  # Sin detener el video
+            if key not in TECLAS_LINEAS:
+                continue  # Cualquier otra tecla no hace nada
+            if not motor.verticales:
+                print(f"Zonas por polígonos: se editan en {ZONAS_CONFIG}")
+                continue
+            if key == '1':
+                ZONA_IZQUIERDA = max(10, ZONA_IZQUIERDA - 10)
+                print(f"Línea izq: X={ZONA_IZQUIERDA}")
+            elif key == '2':
+                ZONA_IZQUIERDA = min(300, ZONA_IZQUIERDA + 10)
+                print(f"Línea izq: X={ZONA_IZQUIERDA}")
+            elif key == '3':
+                ZONA_DERECHA = max(340, ZONA_DERECHA - 10)
+                print(f"Línea der: X={ZONA_DERECHA}")
+            elif key == '4':
+                ZONA_DERECHA = min(630, ZONA_DERECHA + 10)
+                print(f"Línea der: X={ZONA_DERECHA}")
+            # Quedan guardadas para el próximo arranque
+            motor = zonas.verticales(ZONA_IZQUIERDA, ZONA_DERECHA, motor.margen, motor.confirmar)
+            zonas.guardar_verticales(ZONAS_CONFIG, ZONAS_CAMARA, ZONA_IZQUIERDA, ZONA_DERECHA)
+            if rois is None and adaptable is not None:
+                adaptable.rois = rois_puerta(ZONA_IZQUIERDA, ZONA_DERECHA)
+            if rois is None and compuerta is not None:
+                compuerta.detector.region = region_puerta()
+        return True
+    
+    # El movimiento se mira donde se buscan las caras
+    def region_puerta():
+        if not (rois or rois_zonas()):
+            return None
+        x1, y1, x2, y2 = zip(*(rois or rois_zonas()))
+        return min(x1), min(y1), max(x2), max(y2)
     
-    cap.release()
-    cv2.destroyAllWindows()
+    compuerta = CompuertaMovimiento(region_puerta()) if REPOSO_POR_MOVIMIENTO else None
+    pipeline = Pipeline(fuente, procesar, consumir, workers=workers, compuerta=compuerta, vacio=[])
+    pipeline.ejecutar()
+    altas.detener()
+    galeria.detener()
+    vista.detener()
+    print(formatear_estadisticas(pipeline.estadisticas()))
+    if compuerta is not None:
+        print(formatear_reposo(compuerta.estadisticas()))
+    if cada > 1:
+        print(f"Detecciones: {espaciada.detecciones}/{estado['frames']} frames | "
+              f"Embeddings: {espaciada.embeddings}")
+    if adaptable is not None:
+        print(formatear_detector(adaptable.estadisticas()))
+    if control is not None:
+        print(formatear_calidad(control.estadisticas()))
+    if bitacora is not None:
+        bitacora.cerrar()  # Escribe lo que quedó en la cola
 
 if __name__ == "__main__":
-    main()
+    import sys
+    # Uso: python asistencia_tracking.py [camara|video|bus:nombre] [--cada N] [--completa] [--roi x1,y1,x2,y2 ...]
+    #        [--vista ventana|mjpeg|ninguna]
+    args = sys.argv[1:]
+    modo_vista = vista_de_args(args, VISTA)
+    cada = DETECTAR_CADA
+    if '--cada' in args:
+        i = args.index('--cada')
+        cada = int(args[i + 1])
+        del args[i:i + 2]
+    adaptativa = DETECCION_ADAPTATIVA
+    if '--completa' in args:
+        # Detección de cuadro completo a 640 px en cada frame (modo original)
+        args.remove('--completa')
+        adaptativa = False
+    rois = ROIS
+    while '--roi' in args:
+        i = args.index('--roi')
+        rois = (rois or []) + [texto_a_roi(args[i + 1])]
+        del args[i:i + 2]
+    fuente = args[0] if args else str(FUENTE)
+    main(int(fuente) if fuente.isdigit() else fuente, cada, adaptativa, rois, modo_vista)
@@ -0,0 +1,362 @@
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from bitacora import leer_eventos
+import metricas
+
+# Base de asistencia en SQLite (un archivo, sin servidor). Los eventos se
+# indexan por persona y por tiempo, y con cada lote se mantienen al día dos
+# tablas derivadas, así las consultas frecuentes no recorren el historial:
+#   presencia: último evento de cada persona y la estadía abierta (entrada sin salida)
+#   jornadas:  por persona y día, primera entrada, última salida y segundos trabajados
+# Las escrituras van a una cola: el hilo de video solo encola y un hilo aparte
+# las agrupa en una transacción cada LOTE eventos o ESPERA segundos.
+#   base = abrir_base('/app/asistencia.db', LOGS_JSON, LOGS_DIR)
+#   base.registrar(nombre, 'ENTRADA')   misma interfaz que Bitacora
+LOTE = 256             # Eventos por transacción como máximo
+ESPERA = 0.5           # Segundos que se espera a juntar más eventos antes de escribir
+MAX_ESTADIA = 16 * 3600  # Una entrada sin salida más vieja que esto ya no cuenta como presente
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS eventos (
+    id INTEGER PRIMARY KEY,
+    nombre TEXT NOT NULL,
+    tipo TEXT NOT NULL,
+    timestamp TEXT NOT NULL,  -- ISO 8601 local, ordena como texto
+    camara TEXT,
+    extra TEXT                -- Resto de los campos del evento, en JSON
+);
+CREATE INDEX IF NOT EXISTS eventos_nombre ON eventos (nombre, timestamp);
+CREATE INDEX IF NOT EXISTS eventos_tiempo ON eventos (timestamp);
+CREATE TABLE IF NOT EXISTS presencia (
+    nombre TEXT PRIMARY KEY,
+    tipo TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    entrada TEXT              -- Inicio de la estadía abierta; NULL = afuera
+);
+CREATE TABLE IF NOT EXISTS jornadas (
+    nombre TEXT NOT NULL,
+    dia TEXT NOT NULL,
+    primera_entrada TEXT,
+    ultima_salida TEXT,
+    segundos REAL NOT NULL DEFAULT 0,  -- Estadías cerradas que empezaron ese día
+    eventos INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (nombre, dia)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS jornadas_dia ON jornadas (dia);
+"""
+CAMPOS = ('nombre', 'tipo', 'timestamp', 'camara')
+
+
+def conectar(ruta):
+    con = sqlite3.connect(ruta, timeout=30)
+    con.execute('PRAGMA journal_mode=WAL')     # Lectores y el escritor no se bloquean
+    con.execute('PRAGMA synchronous=NORMAL')   # Con WAL no corrompe; a lo sumo pierde la última transacción
+    con.executescript(ESQUEMA)
+    return con
+
+
+def segundos_entre(desde, hasta):
+    return (datetime.fromisoformat(hasta) - datetime.fromisoformat(desde)).total_seconds()
+
+
+def nueva_jornada():
+    return {'primera_entrada': None, 'ultima_salida': None, 'segundos': 0.0, 'eventos': 0}
+
+
+def acumular(presencia, jornadas, evento):
+    # Aplica un evento (en orden de tiempo) a los estados derivados, en memoria
+    nombre, tipo, ts = evento['nombre'], evento['tipo'], evento['timestamp']
+    anterior = presencia.get(nombre)
+    entrada = anterior['entrada'] if anterior else None
+    if entrada and segundos_entre(entrada, ts) > MAX_ESTADIA:
+        entrada = None  # Se fue sin marcar la salida: esa estadía no suma horas
+    jornada = jornadas.setdefault((nombre, ts[:10]), nueva_jornada())
+    jornada['eventos'] += 1
+    if tipo == 'ENTRADA':
+        jornada['primera_entrada'] = min(jornada['primera_entrada'] or ts, ts)
+        entrada = entrada or ts  # Una ENTRADA repetida no reinicia la estadía
+    else:
+        jornada['ultima_salida'] = max(jornada['ultima_salida'] or ts, ts)
+        if entrada:
+            # La estadía se cuenta en el día en que empezó (turnos que cruzan la medianoche)
+            jornadas.setdefault((nombre, entrada[:10]), nueva_jornada())['segundos'] += segundos_entre(entrada, ts)
+        entrada = None
+    presencia[nombre] = {'tipo': tipo, 'timestamp': ts, 'entrada': entrada}
+
+
+def leer_estado(con, nombres, desde):
+    # Estados derivados de estas personas, con las jornadas desde el día 'desde'
+    presencia, jornadas = {}, {}
+    for nombre in nombres:
+        fila = con.execute('SELECT tipo, timestamp, entrada FROM presencia WHERE nombre = ?',
+                           (nombre,)).fetchone()
+        if fila:
+            presencia[nombre] = dict(zip(('tipo', 'timestamp', 'entrada'), fila))
+            if fila[2]:
+                desde = min(desde, fila[2][:10])
+        for fila in con.execute('SELECT dia, primera_entrada, ultima_salida, segundos, eventos '
+                                'FROM jornadas WHERE nombre = ? AND dia >= ?', (nombre, desde)):
+            jornadas[(nombre, fila[0])] = dict(zip(('primera_entrada', 'ultima_salida', 'segundos', 'eventos'),
+                                                   fila[1:]))
+    return presencia, jornadas
+
+
+def guardar_estado(con, presencia, jornadas):
+    con.executemany('INSERT OR REPLACE INTO presencia (nombre, tipo, timestamp, entrada) VALUES (?, ?, ?, ?)',
+                    [(n, p['tipo'], p['timestamp'], p['entrada']) for n, p in presencia.items()])
+    con.executemany('INSERT OR REPLACE INTO jornadas (nombre, dia, primera_entrada, ultima_salida, segundos, eventos) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    [(n, d, j['primera_entrada'], j['ultima_salida'], j['segundos'], j['eventos'])
+                     for (n, d), j in jornadas.items()])
+
+
+def insertar(con, eventos):
+    filas = []
+    for evento in eventos:
+        extra = {k: v for k, v in evento.items() if k not in CAMPOS}
+        filas.append((evento['nombre'], evento['tipo'], evento['timestamp'], evento.get('camara'),
+                      json.dumps(extra, ensure_ascii=False) if extra else None))
+    con.executemany('INSERT INTO eventos (nombre, tipo, timestamp, camara, extra) VALUES (?, ?, ?, ?, ?)', filas)
+
+
+def recalcular(con, nombres=None):
+    # Rehace presencia y jornadas desde los eventos (todas las personas si nombres es None)
+    if nombres is None:
+        con.execute('DELETE FROM presencia')
+        con.execute('DELETE FROM jornadas')
+        filas = con.execute('SELECT nombre, tipo, timestamp FROM eventos ORDER BY timestamp, id')
+    else:
+        nombres = list(nombres)
+        marcas = ','.join('?' * len(nombres))
+        con.execute(f'DELETE FROM presencia WHERE nombre IN ({marcas})', nombres)
+        con.execute(f'DELETE FROM jornadas WHERE nombre IN ({marcas})', nombres)
+        filas = con.execute(f'SELECT nombre, tipo, timestamp FROM eventos WHERE nombre IN ({marcas}) '
+                            'ORDER BY timestamp, id', nombres)
+    presencia, jornadas = {}, {}
+    for nombre, tipo, ts in filas.fetchall():
+        acumular(presencia, jornadas, {'nombre': nombre, 'tipo': tipo, 'timestamp': ts})
+    guardar_estado(con, presencia, jornadas)
+
+
+def escribir_lote(con, eventos):
+    # Una transacción: los eventos y la actualización incremental de sus personas
+    eventos = sorted(eventos, key=lambda e: e['timestamp'])
+    with con:
+        insertar(con, eventos)
+        nombres = {e['nombre'] for e in eventos}
+        presencia, jornadas = leer_estado(con, nombres, eventos[0]['timestamp'][:10])
+        atrasadas = set()
+        for evento in eventos:
+            previo = presencia.get(evento['nombre'])
+            if previo and evento['timestamp'] < previo['timestamp']:
+                atrasadas.add(evento['nombre'])  # Llegó fuera de orden: se rehace esa persona
+            if evento['nombre'] not in atrasadas:
+                acumular(presencia, jornadas, evento)
+        guardar_estado(con, {n: p for n, p in presencia.items() if n not in atrasadas},
+                       {k: j for k, j in jornadas.items() if k[0] not in atrasadas})
+        if atrasadas:
+            recalcular(con, atrasadas)
+
+
+class BaseAsistencia:
+    def __init__(self, ruta, lote=LOTE, espera=ESPERA):
+        self.ruta = ruta
+        self.lote = lote
+        self.espera = espera
+        self.cola = queue.Queue()
+        self.errores = 0
+        conectar(ruta).close()  # El esquema existe antes de la primera consulta
+        self.hilo = threading.Thread(target=self.escritor, daemon=True)
+        self.hilo.start()
+        metricas.medidor('cola_base', self.cola.qsize)
+
+    def escritor(self):
+        # Único hilo que escribe: abre su propia conexión (sqlite no comparte entre hilos)
+        con = conectar(self.ruta)
+        fin = False
+        while not fin:
+            eventos = [self.cola.get()]
+            limite = time.monotonic() + self.espera
+            while len(eventos) < self.lote:
+                try:
+                    eventos.append(self.cola.get(timeout=max(0.0, limite - time.monotonic())))
+                except queue.Empty:
+                    break
+            if None in eventos:
+                fin = True
+            validos = [e for e in eventos if e is not None]
+            if validos:
+                t0 = time.perf_counter()
+                try:
+                    escribir_lote(con, validos)
+                except sqlite3.Error as e:
+                    self.errores += len(validos)
+                    print(f"Base de asistencia: no se pudieron guardar {len(validos)} eventos: {e}")
+                metricas.observar('escritura_bitacora', (time.perf_counter() - t0) / len(validos), len(validos))
+            for _ in eventos:
+                self.cola.task_done()
+        con.close()
+
+    def escribir(self, evento):
+        # No bloquea: el evento se guarda en el próximo lote
+        self.cola.put(evento)
+        return evento
+
+    def registrar(self, nombre, tipo, timestamp=None, **extra):
+        timestamp = timestamp or datetime.now()
+        evento = {'nombre': nombre, 'tipo': tipo, 'timestamp': timestamp.isoformat()}
+        evento.update(extra)
+        return self.escribir(evento)
+
+    def sincronizar(self):
+        # Espera a que todo lo encolado esté escrito
+        self.cola.join()
+
+    def cerrar(self):
+        if self.hilo.is_alive():
+            self.cola.put(None)
+            self.hilo.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def migrar(ruta, origen):
+    # origen: el antiguo asistencia_log.json o un directorio de la bitácora .jsonl
+    if os.path.isdir(origen):
+        eventos = list(leer_eventos(origen))
+    else:
+        with open(origen, 'r') as f:
+            eventos = json.load(f)
+    eventos.sort(key=lambda e: e['timestamp'])
+    con = conectar(ruta)
+    with con:
+        insertar(con, eventos)
+        recalcular(con)
+    con.close()
+    return len(eventos)
+
+
+def abrir_base(ruta, ruta_json=None, directorio=None, **kwargs):
+    # La primera vez importa la bitácora .jsonl o, si no hay, el log JSON anterior
+    if not os.path.exists(ruta):
+        for origen in (directorio, ruta_json):
+            if origen and os.path.exists(origen):
+                n = migrar(ruta, origen)
+                print(f"Importados {n} eventos de {origen}")
+                break
+    return BaseAsistencia(ruta, **kwargs)
+
+
+# Consultas: reciben una conexión de conectar(); pueden correr mientras el monitor escribe
+
+def presentes(con, ahora=None):
+    ahora = ahora or datetime.now()
+    limite = (ahora - timedelta(seconds=MAX_ESTADIA)).isoformat()
+    return con.execute('SELECT nombre, entrada FROM presencia WHERE entrada >= ? ORDER BY entrada',
+                       (limite,)).fetchall()
+
+
+def jornadas(con, desde, hasta, nombre=None, ahora=None):
+    # Una fila por persona y día; a la estadía abierta de hoy se le suma lo que va
+    ahora = ahora or datetime.now()
+    consulta = ('SELECT j.nombre, j.dia, j.primera_entrada, j.ultima_salida, j.segundos, p.entrada '
+                'FROM jornadas j LEFT JOIN presencia p ON p.nombre = j.nombre '
+                'WHERE j.dia BETWEEN ? AND ?')
+    parametros = [desde, hasta]
+    if nombre:
+        consulta += ' AND j.nombre = ?'
+        parametros.append(nombre)
+    filas = []
+    limite = (ahora - timedelta(seconds=MAX_ESTADIA)).isoformat()
+    for nombre_j, dia, primera, ultima, segundos, entrada in con.execute(consulta + ' ORDER BY j.dia, j.nombre',
+                                                                          parametros):
+        en_curso = bool(entrada and entrada[:10] == dia and entrada >= limite)
+        if en_curso:
+            segundos += segundos_entre(entrada, ahora.isoformat())
+        filas.append({'nombre': nombre_j, 'dia': dia, 'primera_entrada': primera, 'ultima_salida': ultima,
+                      'segundos': segundos, 'en_curso': en_curso})
+    return filas
+
+
+def horas(con, desde, hasta, nombre=None, ahora=None):
+    # Total por persona en el rango: {nombre: (segundos, días trabajados)}
+    totales = {}
+    for j in jornadas(con, desde, hasta, nombre, ahora):
+        segundos, dias = totales.get(j['nombre'], (0.0, 0))
+        totales[j['nombre']] = (segundos + j['segundos'], dias + (j['segundos'] > 0))
+    return totales
+
+
+def eventos(con, nombre=None, desde=None, hasta=None):
+    condiciones, parametros = [], []
+    if nombre:
+        condiciones.append('nombre = ?')
+        parametros.append(nombre)
+    if desde:
+        condiciones.append('timestamp >= ?')
+        parametros.append(desde)
+    if hasta:
+        condiciones.append('timestamp < ?')
+        parametros.append((date.fromisoformat(hasta) + timedelta(days=1)).isoformat())  # Día inclusivo
+    where = ' WHERE ' + ' AND '.join(condiciones) if condiciones else ''
+    return con.execute(f'SELECT timestamp, tipo, nombre, camara FROM eventos{where} ORDER BY timestamp',
+                       parametros).fetchall()
+
+
+def formatear_horas(segundos):
+    minutos = int(segundos // 60)
+    return f"{minutos // 60}:{minutos % 60:02d}"
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    hoy = date.today().isoformat()
+    if len(args) == 3 and args[0] == "migrar":
+        n = migrar(args[1], args[2])
+        print(f"✓ {n} eventos importados a {args[1]}")
+    elif len(args) == 2 and args[0] == "recalcular":
+        con = conectar(args[1])
+        with con:
+            recalcular(con)
+        print("✓ Presencia y jornadas recalculadas")
+    elif len(args) == 2 and args[0] == "presentes":
+        filas = presentes(conectar(args[1]))
+        for nombre, entrada in filas:
+            print(f"{nombre:30s} desde {entrada[:16].replace('T', ' ')}")
+        print(f"{len(filas)} personas adentro")
+    elif len(args) in (2, 3) and args[0] == "dia":
+        dia = args[2] if len(args) == 3 else hoy
+        for j in jornadas(conectar(args[1]), dia, dia):
+            entrada = (j['primera_entrada'] or '')[11:16] or '--:--'
+            salida = (j['ultima_salida'] or '')[11:16] or '--:--'
+            print(f"{j['nombre']:30s} entrada {entrada} | salida {salida} | "
+                  f"{formatear_horas(j['segundos'])} h{' (en curso)' if j['en_curso'] else ''}")
+    elif 2 <= len(args) <= 5 and args[0] == "horas":
+        # Por defecto, el mes en curso
+        desde = args[2] if len(args) > 2 else hoy[:8] + '01'
+        hasta = args[3] if len(args) > 3 else hoy
+        nombre = args[4] if len(args) > 4 else None
+        for nombre, (segundos, dias) in sorted(horas(conectar(args[1]), desde, hasta, nombre).items()):
+            print(f"{nombre:30s} {formatear_horas(segundos):>7s} h en {dias} días")
+    elif 2 <= len(args) <= 5 and args[0] == "eventos":
+        for ts, tipo, nombre, camara in eventos(conectar(args[1]), *args[2:5]):
+            print(f"[{ts[:19]}] {tipo}: {nombre}{f' ({camara})' if camara else ''}")
+    else:
+        print("Uso:")
+        print("  python basedatos.py migrar asistencia.db asistencia_log.json|asistencia_log/")
+        print("  python basedatos.py presentes asistencia.db")
+        print("  python basedatos.py dia asistencia.db [2026-01-30]")
+        print("  python basedatos.py horas asistencia.db [desde] [hasta] [nombre]")
+        print("  python basedatos.py eventos asistencia.db [nombre] [desde] [hasta]")
+        print("  python basedatos.py recalcular asistencia.db")
@@ -0,0 +1,58 @@
+import os
+import subprocess
+import sys
+
+# Mide el costo de arranque:
+#   - tiempo de importar cada script (sin cargar el modelo)
+#   - tiempo hasta el primer reconocimiento, cargando en frío y con precalentado
+#     en segundo plano mientras se "abre la cámara"
+#   python bench_arranque.py [apertura_camara_seg]
+SCRIPTS = ['asistencia', 'asistencia_gui', 'asistencia_gpu', 'asistencia_tracking']
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+def tiempo_import(modulo):
+    codigo = f"import time; t0 = time.perf_counter(); import {modulo}; print(time.perf_counter() - t0)"
+    salida = subprocess.run([sys.executable, '-c', codigo], cwd=DIRECTORIO,
+                            capture_output=True, text=True)
+    if salida.returncode != 0:
+        return None
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def tiempo_primer_reconocimiento(precalentar, apertura):
+    codigo = f"""
+import time
+t0 = time.perf_counter()
+import numpy as np
+from modelo import obtener_modelo
+app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640))
+if {precalentar}:
+    app.precalentar()
+time.sleep({apertura})  # Simula la apertura de la cámara
+faces = app.get(np.zeros((480, 640, 3), dtype=np.uint8))
+rec = app.models['recognition']
+rec.get_feat([np.zeros((rec.input_size[0],) * 2 + (3,), dtype=np.uint8)])
+print(time.perf_counter() - t0)
+"""
+    salida = subprocess.run([sys.executable, '-c', codigo], cwd=DIRECTORIO,
+                            capture_output=True, text=True)
+    if salida.returncode != 0:
+        return None
+    return float(salida.stdout.strip().splitlines()[-1])
+
+
+def formato(segundos):
+    return "error" if segundos is None else f"{segundos * 1000:8.1f} ms"
+
+
+if __name__ == "__main__":
+    apertura = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+
+    print("Tiempo de import:")
+    for modulo in SCRIPTS:
+        print(f"  {modulo:22s} {formato(tiempo_import(modulo))}")
+
+    print(f"Hasta el primer reconocimiento (cámara tarda {apertura:.1f} s en abrir):")
+    print(f"  en frío                {formato(tiempo_primer_reconocimiento(False, apertura))}")
+    print(f"  con precalentado       {formato(tiempo_primer_reconocimiento(True, apertura))}")
@@ -0,0 +1,98 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Process, Queue
+
+import cv2
+import numpy as np
+
+import bus
+
+# Prueba del bus de frames con un archivo de video, sin cámara: un proceso
+# publica y varios consumidores (reconocimiento simulado, grabación, vista)
+# leen a distinta velocidad. Sin video se genera uno donde cada frame vale
+# su número (mod 256) y se verifica además que ningún frame llegue mezclado.
+#   python bench_bus.py [video.mp4] [--sin-pausa] [--ranuras R]
+# Sale con código 1 si algún consumidor recibió un frame inválido.
+NOMBRE = 'bench'
+FRAMES_SINTETICO = 300
+# (nombre, modo, segundos de trabajo por frame, copia)
+CONSUMIDORES = [('reconocimiento', 'reciente', 0.04, True),
+                ('seguimiento', 'reciente', 0.005, True),
+                ('grabacion', 'orden', 0.0, False),
+                ('vista', 'reciente', 0.1, True)]
+
+
+def video_sintetico(ruta, frames):
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*'FFV1'), 30, (640, 480))
+    for i in range(frames):
+        escritor.write(np.full((480, 640, 3), i % 256, np.uint8))
+    escritor.release()
+
+
+def consumir(nombre, modo, trabajo, copia, verificar, resultados):
+    lector = bus.LectorFrames(NOMBRE, modo)
+    latencias, invalidos = [], 0
+    t0 = time.monotonic()
+    while True:
+        item = lector.leer() if copia else lector.siguiente()
+        if item is None:
+            break
+        seq, t, frame = item
+        latencias.append(time.monotonic() - t)
+        if verificar:
+            valido = (frame == seq % 256).all()
+            # Sin copia la vista puede pisarse mientras se usa: vigente() lo detecta
+            if not valido and (copia or lector.vigente(seq)):
+                invalidos += 1
+        if trabajo:
+            time.sleep(trabajo)
+    segundos = time.monotonic() - t0
+    stats = lector.estadisticas()
+    lector.cerrar()
+    resultados.put({'nombre': nombre, 'modo': modo, 'fps': stats['leidos'] / max(segundos, 1e-6),
+                    'latencia_ms': 1000 * float(np.median(latencias)) if latencias else 0.0,
+                    'invalidos': invalidos, **stats})
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if '-h' in args or '--help' in args:
+        print("Uso:")
+        print("  python bench_bus.py [video.mp4] [--sin-pausa] [--ranuras R]")
+        sys.exit(0)
+    pausa = '--sin-pausa' not in args
+    if not pausa:
+        args.remove('--sin-pausa')
+    ranuras = int(bus.opcion(args, '--ranuras', bus.RANURAS))
+    verificar = not args
+    tmp = tempfile.mkdtemp(prefix='bench_bus_')
+    if verificar:
+        video = os.path.join(tmp, 'sintetico.avi')
+        video_sintetico(video, FRAMES_SINTETICO)
+    else:
+        video = args[0]
+
+    resultados = Queue()
+    publicador = Process(target=bus.publicar, args=(video, NOMBRE, ranuras, pausa))
+    publicador.start()
+    consumidores = [Process(target=consumir, args=(*c, verificar, resultados)) for c in CONSUMIDORES]
+    for p in consumidores:
+        p.start()
+    publicador.join()
+    for p in consumidores:
+        p.join()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    invalidos = 0
+    for _ in consumidores:
+        d = resultados.get()
+        invalidos += d['invalidos']
+        print(f"  {d['nombre']:15s} {d['modo']:8s} {d['fps']:6.1f} fps | latencia {d['latencia_ms']:5.1f} ms | "
+              f"leídos {d['leidos']:5d} | descartados {d['descartados']:5d} | pisados {d['sobrescritos']:4d}"
+              + (f" | inválidos {d['invalidos']}" if verificar else ""))
+    if invalidos:
+        print("ERROR: frames mezclados entregados como válidos")
+        sys.exit(1)
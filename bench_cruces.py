@@ -0,0 +1,84 @@
+import sys
+
+import numpy as np
+
+import zonas
+from calidad import ControlCalidad
+from seguimiento import Rastreador
+
+# Verifica que no se pierdan cruces de tracks que se identifican tarde: una
+# cara camina de la puerta (x=320) a la oficina (x=20) y recién tiene nombre
+# al pasar x<100, varios frames después del cruce. En el caso 'calidad' la
+# cara no pasa el control de calidad (score bajo del detector) hasta x<100:
+# esos frames no calculan embedding y el track sigue sin nombre. Sin modelo
+# ni cámara:
+#   python bench_cruces.py
+# Sale con código 1 si algún caso no registra lo esperado.
+INICIO, FIN, PASO = 320, 20, 10  # Centro x de la cara por frame
+NOMBRADO_DESDE = 100            # x a partir de la cual el reconocimiento da nombre
+LADO = 80                       # Lado de la caja de la cara
+FPS = 10
+
+CASOS = [
+    ('verticales', zonas.verticales(), ['ENTRADA']),
+    ('línea', zonas.MotorZonas(lineas=[{'nombre': 'molinete', 'desde': [200, 0], 'hasta': [200, 480],
+                                        'adentro': [0, 240]}]), ['ENTRADA']),
+    ('calidad', zonas.verticales(), ['ENTRADA']),
+    ('ida y vuelta', zonas.MotorZonas(lineas=[{'nombre': 'molinete', 'desde': [200, 0], 'hasta': [200, 480],
+                                               'adentro': [0, 240]}]), ['ENTRADA', 'SALIDA', 'ENTRADA']),
+]
+
+
+def recorrido(ida_y_vuelta=False):
+    xs = list(range(INICIO, FIN - 1, -PASO))
+    if ida_y_vuelta:
+        xs += xs[::-1] + xs
+    return xs
+
+
+def caminar(motor, xs, nombrado_desde=NOMBRADO_DESDE, control=None):
+    # -> (eventos con la lógica anterior, eventos con por_registrar(), frame del primer nombre)
+    rastreador = Rastreador()
+    anteriores, eventos, nombrado = [], [], None
+    for n, x in enumerate(xs):
+        det = {'bbox': np.array([x - LADO / 2, 200, x + LADO / 2, 200 + LADO], dtype=np.float32)}
+        if control is not None:
+            # Movida (score bajo) hasta x<nombrado_desde: sin embedding, sin nombre
+            det['det_score'] = 0.9 if x < nombrado_desde else 0.4
+            motivo = control.motivo(det['bbox'], None, det['det_score'])
+            control.anotar(1, [motivo] if motivo else [], 0.0)
+            reconocida = motivo is None
+        else:
+            reconocida = x < nombrado_desde
+        if nombrado is not None or reconocida:
+            det['nombre'], det['score'] = 'Ana', 0.8
+            nombrado = n if nombrado is None else nombrado
+        ids = rastreador.actualizar([det], ahora=n / FPS)
+        tracks = [rastreador.tracks[tid] for tid in ids]
+        cruces = motor.cruces(tracks, [(x, 240)])
+        anteriores += [(n, c) for t, c in zip(tracks, cruces) if c and t['nombre']]
+        eventos += [(m, c) for t, c, m in zonas.por_registrar(tracks, cruces, n)]
+    return anteriores, eventos, nombrado
+
+
+if __name__ == "__main__":
+    if '-h' in sys.argv or '--help' in sys.argv:
+        print("Uso:")
+        print("  python bench_cruces.py")
+        sys.exit(0)
+    fallas = 0
+    for caso, motor, esperados in CASOS:
+        control = ControlCalidad() if caso == 'calidad' else None
+        anteriores, eventos, nombrado = caminar(motor, recorrido(caso == 'ida y vuelta'), control=control)
+        tipos = [c for _, c in eventos]
+        ok = tipos == esperados and all(m <= nombrado for m, _ in eventos[:1])
+        fallas += not ok
+        print(f"  {caso:13s} nombre en frame {nombrado:3d} | antes: {len(anteriores)} evento(s) | "
+              f"ahora: {', '.join(f'{c}@{m}' for m, c in eventos) or '-'} | {'OK' if ok else 'ERROR'}")
+    # Un track que nunca se identifica no registra nada
+    _, eventos, _ = caminar(zonas.verticales(), recorrido(), nombrado_desde=-1)
+    if eventos:
+        print(f"ERROR: cruces registrados sin nombre: {eventos}")
+        fallas += 1
+    if fallas:
+        sys.exit(1)
@@ -0,0 +1,59 @@
+import sys
+import time
+
+import numpy as np
+
+from galeria import normalizar
+from indice import IndiceExacto, IndiceIVF
+
+# Recall@1 y latencia del índice IVF frente a la búsqueda exacta, sobre una
+# galería sintética (identidades al azar, consultas = identidad + ruido):
+#   python bench_indice.py [N] [consultas] [nprobe ...]
+DIM = 512
+RUIDO = 0.04  # Desvío del ruido por componente (similitud ~0.75 con su identidad)
+
+
+def galeria_sintetica(n, rng):
+    # Identidades agrupadas alrededor de unos pocos "tipos" de cara, como los embeddings reales
+    tipos = normalizar(rng.normal(size=(max(1, n // 500), DIM)))
+    asignados = tipos[rng.integers(0, len(tipos), n)]
+    return normalizar(asignados + rng.normal(scale=0.06, size=(n, DIM)))
+
+
+def medir(indice, consultas, k=1):
+    t0 = time.perf_counter()
+    scores, idxs = indice.buscar(consultas, k)
+    return idxs[:, 0], 1000 * (time.perf_counter() - t0) / len(consultas)
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    q = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    nprobes = [int(x) for x in sys.argv[3:]] or [1, 4, 8, 16, 32]
+    rng = np.random.default_rng(0)
+
+    matriz = galeria_sintetica(n, rng)
+    objetivos = rng.integers(0, n, q)
+    consultas = normalizar(matriz[objetivos] + rng.normal(scale=RUIDO, size=(q, DIM)))
+
+    exacto = IndiceExacto(DIM)
+    exacto.agregar(matriz)
+    verdad, ms_exacto = medir(exacto, consultas)
+    print(f"Galería: {n} identidades | {q} consultas")
+    print(f"Exacto:  {ms_exacto:7.3f} ms/consulta | acierto de identidad "
+          f"{np.mean(verdad == objetivos):.3f}")
+
+    t0 = time.perf_counter()
+    ivf = IndiceIVF(DIM, min_entrenamiento=0)
+    ivf.agregar(matriz)
+    print(f"IVF: {len(ivf.centroides)} listas, entrenado en {time.perf_counter() - t0:.1f} s")
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        idxs, ms = medir(ivf, consultas)
+        print(f"  nprobe {nprobe:3d}: {ms:7.3f} ms/consulta | recall@1 {np.mean(idxs == verdad):.3f} | "
+              f"{ms_exacto / ms:5.1f}x")
+
+    # Alta incremental: el nuevo vector se encuentra sin reentrenar
+    nuevo = normalizar(rng.normal(size=(1, DIM)))
+    id_nuevo = ivf.agregar(nuevo)[0]
+    print(f"Alta incremental encontrada: {ivf.buscar(nuevo, 1)[1][0, 0] == id_nuevo}")
@@ -0,0 +1,46 @@
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from inferencia import detectar_lote, reconocer_lote, soporta_lote
+from modelo import obtener_modelo
+
+# Caras/seg del modelo de reconocimiento según el tamaño de batch, y
+# frames/seg de detección por lotes si el modelo lo soporta:
+#   python bench_lotes.py [imagen.jpg] [repeticiones]
+TAMANOS = [1, 2, 4, 8, 16, 32]
+
+
+def medir(funcion, repeticiones):
+    funcion()  # Calentamiento
+    t0 = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - t0) / repeticiones
+
+
+if __name__ == "__main__":
+    repeticiones = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640))
+    rec_model = app.models['recognition']
+    tam = rec_model.input_size[0]
+
+    rng = np.random.default_rng(0)
+    if len(sys.argv) > 1:
+        frame = cv2.imread(sys.argv[1])
+    else:
+        frame = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    recorte = rng.integers(0, 255, (tam, tam, 3), dtype=np.uint8)
+
+    print("Reconocimiento (ArcFace):")
+    for n in TAMANOS:
+        segundos = medir(lambda: reconocer_lote(rec_model, [recorte] * n, max_caras=n), repeticiones)
+        print(f"  batch {n:3d}: {n / segundos:8.1f} caras/s ({1000 * segundos / n:.2f} ms/cara)")
+
+    print(f"Detección (SCRFD, batch dinámico: {'sí' if soporta_lote(app.det_model) else 'no'}):")
+    for n in TAMANOS[:4]:
+        segundos = medir(lambda: detectar_lote(app.det_model, [frame] * n), repeticiones)
+        print(f"  batch {n:3d}: {n / segundos:8.1f} frames/s")
@@ -0,0 +1,114 @@
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from galeria import Galeria, normalizar
+from inferencia import caras_y_recortes, reconocer_lote
+from modelo import obtener_modelo
+from perfiles import PERFILES
+from registro import personas_de
+
+# Precisión y velocidad de los perfiles de CPU contra el modelo FP32:
+#   python bench_perfiles.py fotos/ [perfil ...]
+# fotos/ como en 'registro.py carpeta' (una subcarpeta por persona). Con las
+# mismas caras alineadas se comparan los embeddings (similitud coseno con los
+# FP32) y las decisiones contra una galería FP32, como la que ya está
+# registrada; la detección se compara por IoU. Sale con código 1 si algún
+# perfil cambia más decisiones de las que permite ACUERDO_MIN.
+THRESHOLD = 0.4
+ACUERDO_MIN = 0.99   # Fracción de decisiones iguales a las del FP32
+IOU_MIN = 0.5        # Para contar una cara detectada como la misma
+REPETICIONES = 3     # Se reporta la mediana de los tiempos
+
+
+def cargar(perfil):
+    app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640), perfil=perfil)
+    app.calentar()
+    return app
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def mediana_de(funcion):
+    tiempos, salida = [], None
+    for _ in range(REPETICIONES):
+        t0 = time.perf_counter()
+        salida = funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return float(np.median(tiempos)), salida
+
+
+def detectar_todas(app, frames):
+    return [app.det_model.detect(frame, max_num=0, metric='default') for frame in frames]
+
+
+def recuperadas(referencia, detecciones):
+    # Caras FP32 con una detección del perfil que la cubre
+    aciertos = 0
+    for (ref, _), (bboxes, _) in zip(referencia, detecciones):
+        for caja in ref:
+            aciertos += any(iou(caja, otra) >= IOU_MIN for otra in bboxes)
+    return aciertos
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso:")
+        print("  python bench_perfiles.py fotos/ [perfil ...]")
+        print(f"  perfiles: {', '.join(PERFILES)}")
+        sys.exit(1)
+    perfiles = sys.argv[2:] or [p for p in PERFILES if p != 'cpu']
+
+    fotos = [(nombre, ruta) for nombre, rutas in personas_de(sys.argv[1]).items() for ruta in rutas]
+    fotos = [(nombre, cv2.imread(ruta)) for nombre, ruta in fotos]
+    fotos = [(nombre, frame) for nombre, frame in fotos if frame is not None]
+    frames = [frame for _, frame in fotos]
+
+    # Referencia FP32: detecciones, caras alineadas y galería (la cara más grande de cada foto)
+    fp32 = cargar('cpu')
+    rec = fp32.models['recognition']
+    t_det, referencia = mediana_de(lambda: detectar_todas(fp32, frames))
+    recortes, etiquetas = [], []
+    for (nombre, frame), (bboxes, kpss) in zip(fotos, referencia):
+        _, caras = caras_y_recortes(frame, bboxes, kpss, rec.input_size[0])
+        mayor = int(np.argmax((bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1]))) if len(caras) else -1
+        recortes += caras
+        etiquetas += [nombre if i == mayor else None for i in range(len(caras))]
+    t_rec, emb_ref = mediana_de(lambda: reconocer_lote(rec, recortes))
+    emb_ref = normalizar(emb_ref)
+    galeria = Galeria(threshold=THRESHOLD)
+    for nombre, emb in zip(etiquetas, emb_ref):
+        if nombre:
+            galeria.agregar(nombre, emb)
+    decisiones_ref = [n for n, _ in galeria.reconocer(emb_ref)]
+    n_caras = sum(len(b) for b, _ in referencia)
+    print(f"{len(frames)} fotos, {n_caras} caras, {len(galeria)} personas")
+    print(f"{'cpu (FP32)':16s} detección {len(frames) / t_det:6.1f} fotos/s | "
+          f"reconocimiento {len(recortes) / max(t_rec, 1e-9):7.1f} caras/s")
+
+    fallo = False
+    for perfil in perfiles:
+        app = cargar(perfil)
+        t_det_p, detecciones = mediana_de(lambda: detectar_todas(app, frames))
+        t_rec_p, emb = mediana_de(lambda: reconocer_lote(app.models['recognition'], recortes))
+        emb = normalizar(emb)
+        similitud = np.sum(emb * emb_ref, axis=1) if len(emb) else np.ones(1)
+        decisiones = [n for n, _ in galeria.reconocer(emb)]
+        acuerdo = np.mean([a == b for a, b in zip(decisiones, decisiones_ref)]) if decisiones else 1.0
+        print(f"{perfil:16s} detección {len(frames) / t_det_p:6.1f} fotos/s ({t_det / t_det_p:.2f}x) | "
+              f"reconocimiento {len(recortes) / max(t_rec_p, 1e-9):7.1f} caras/s ({t_rec / max(t_rec_p, 1e-9):.2f}x)")
+        print(f"{'':16s} caras recuperadas {recuperadas(referencia, detecciones)}/{n_caras} "
+              f"(detectadas {sum(len(b) for b, _ in detecciones)}) | coseno con FP32 media "
+              f"{similitud.mean():.4f}, mín {similitud.min():.4f} | decisiones iguales {100 * acuerdo:.1f}%")
+        fallo |= acuerdo < ACUERDO_MIN
+    if fallo:
+        print(f"ERROR: algún perfil cambia más del {100 * (1 - ACUERDO_MIN):.0f}% de las decisiones")
+        sys.exit(1)
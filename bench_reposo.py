@@ -0,0 +1,57 @@
+import sys
+
+import cv2
+
+import asistencia_tracking as at
+from bench_seguimiento import comparar, correr
+from movimiento import CompuertaMovimiento, formatear_estadisticas
+from seguimiento import deteccion_completa
+
+# Compara la inferencia en cada frame contra la compuerta de movimiento (reposo
+# con la escena vacía) sobre un clip grabado. Sale con código 1 si la compuerta
+# pierde algún ENTRADA/SALIDA que la referencia sí registró:
+#   python bench_reposo.py clip.mp4
+
+
+def con_compuerta(compuerta, procesar, fps_video):
+    # Misma firma que procesar(frame); el reloj de la compuerta es el del video
+    estado = {'frame': 0}
+
+    def gateado(frame):
+        ahora = estado['frame'] / fps_video
+        estado['frame'] += 1
+        if not compuerta.evaluar(frame, ahora):
+            return []
+        caras = procesar(frame)
+        compuerta.ocupado = bool(caras)
+        return caras
+    return gateado
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso:")
+        print("  python bench_reposo.py clip.mp4")
+        sys.exit(1)
+    video = sys.argv[1]
+    cap = cv2.VideoCapture(video)
+    fps_video = cap.get(cv2.CAP_PROP_FPS) or 25
+    cap.release()
+    galeria = at.cargar_db()
+
+    def procesar(frame):
+        return deteccion_completa(at.app, galeria, frame)
+
+    ref, fps_ref = correr(video, procesar)
+    compuerta = CompuertaMovimiento()
+    ev, fps_rep = correr(video, con_compuerta(compuerta, procesar, fps_video))
+    aciertos = comparar(ref, ev)
+
+    print(f"Siempre activo: {fps_ref:6.1f} fps | {len(ref)} eventos")
+    print(f"Con reposo:     {fps_rep:6.1f} fps | {len(ev)} eventos")
+    print(formatear_estadisticas(compuerta.estadisticas()))
+    print(f"Aceleración: {fps_rep / max(fps_ref, 1e-6):.2f}x")
+    print(f"Eventos recuperados: {aciertos}/{len(ref)} | extra: {len(ev) - aciertos}")
+    if aciertos < len(ref):
+        print("ERROR: la compuerta perdió eventos")
+        sys.exit(1)
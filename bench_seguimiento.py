@@ -0,0 +1,69 @@
+import sys
+import time
+
+import cv2
+
+import asistencia_tracking as at
+from seguimiento import DeteccionEspaciada, Rastreador, deteccion_completa
+
+# Compara la detección en cada frame contra la detección cada N frames con
+# propagación por flujo óptico, sobre un clip grabado:
+#   python bench_seguimiento.py clip.mp4 [N]
+TOLERANCIA = 15  # Frames de diferencia aceptados para considerar el mismo evento
+
+
+def correr(video, procesar):
+    at.rastreador = Rastreador()
+    cap = cv2.VideoCapture(video)
+    fps_video = cap.get(cv2.CAP_PROP_FPS) or 25
+    eventos = []
+    frames = 0
+    t0 = time.perf_counter()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        caras = procesar(frame)
+        # Tiempo del video, no del reloj: el clip se procesa más rápido que en vivo
+        ids = at.rastreador.actualizar(caras, frames / fps_video)
+        centros = [((c['bbox'][0] + c['bbox'][2]) / 2, (c['bbox'][1] + c['bbox'][3]) / 2) for c in caras]
+        for track, cruce, frame_cruce in at.cruces(ids, centros, frames):
+            eventos.append((frame_cruce, track['nombre'], cruce))
+        frames += 1
+    segundos = time.perf_counter() - t0
+    cap.release()
+    return eventos, frames / max(segundos, 1e-6)
+
+
+def comparar(referencia, eventos, tolerancia=TOLERANCIA):
+    # Cuántos eventos de referencia tienen un par (mismo nombre y tipo) cerca en el tiempo
+    libres = list(eventos)
+    aciertos = 0
+    for frame, nombre, tipo in referencia:
+        for ev in libres:
+            if ev[1] == nombre and ev[2] == tipo and abs(ev[0] - frame) <= tolerancia:
+                libres.remove(ev)
+                aciertos += 1
+                break
+    return aciertos
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso:")
+        print("  python bench_seguimiento.py clip.mp4 [N]")
+        sys.exit(1)
+    video = sys.argv[1]
+    cada = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    galeria = at.cargar_db()
+
+    ref, fps_ref = correr(video, lambda frame: deteccion_completa(at.app, galeria, frame))
+    espaciada = DeteccionEspaciada(at.app, galeria, cada)
+    ev, fps_esp = correr(video, espaciada.procesar)
+    aciertos = comparar(ref, ev)
+
+    print(f"Cada frame:     {fps_ref:6.1f} fps | {len(ref)} eventos")
+    print(f"Cada {cada} frames: {fps_esp:6.1f} fps | {len(ev)} eventos | "
+          f"{espaciada.detecciones} detecciones, {espaciada.embeddings} embeddings")
+    print(f"Aceleración: {fps_esp / max(fps_ref, 1e-6):.2f}x")
+    print(f"Eventos recuperados: {aciertos}/{len(ref)} | extra: {len(ev) - aciertos}")
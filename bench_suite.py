@@ -0,0 +1,404 @@
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+import almacen
+from basedatos import BaseAsistencia, conectar, jornadas, migrar
+from bitacora import Bitacora
+from galeria import Galeria, comparar_embedding, normalizar
+from pipeline import BLOQUEAR, Pipeline
+from seguimiento import Rastreador
+import zonas
+from calidad import ControlCalidad
+
+# Benchmarks reproducibles, sin cámara ni red:
+#   python bench_suite.py [--rapido] [--secciones matching,almacen,bitacora,zonas,calidad,e2e]
+#                         [--video clip.mp4] [--modelo simulado|real] [--salida r.json]
+#   python bench_suite.py comparar antes.json despues.json
+# Los resultados van a bench_resultados/<commit>-<fecha>.json: una lista de
+# mediciones {seccion, caso, n, valor, unidad} que se comparan entre commits.
+# Con --modelo simulado (por defecto) el modelo devuelve caras fijas al instante
+# y solo se mide el costo de Python (pipeline, matching, seguimiento, zonas).
+DIRECTORIO = os.path.dirname(os.path.abspath(__file__))
+RESULTADOS = os.path.join(DIRECTORIO, 'bench_resultados')
+SEMILLA = 0
+DIM = 512
+SECCIONES = ('matching', 'almacen', 'bitacora', 'zonas', 'calidad', 'e2e')
+TAMANOS_GALERIA = [100, 1000, 10000, 50000]
+TAMANOS_BITACORA = [0, 10000, 100000]
+TAMANOS_ZONAS = [10, 100, 500]  # Tracks por frame
+CARAS_CALIDAD = 1000      # Caras por medición del control de calidad
+CONSULTAS = 200           # Caras por medición de matching
+FRAMES_E2E = 300          # Frames del video sintético
+CARAS_POR_FRAME = 2       # Caras del modelo simulado
+REPETICIONES = 3          # Se reporta la mediana
+UMBRAL_REGRESION = 1.10   # En 'comparar', peor en más de 10% se marca
+
+# Modo --rapido: lo mismo en tamaños chicos, para correr en cada commit
+RAPIDO = {'TAMANOS_GALERIA': [100, 1000, 5000], 'TAMANOS_BITACORA': [0, 5000], 'TAMANOS_ZONAS': [10, 100],
+          'FRAMES_E2E': 100, 'REPETICIONES': 1}
+
+
+def mediana_de(funcion, repeticiones=None):
+    tiempos = []
+    for _ in range(repeticiones or REPETICIONES):
+        t0 = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - t0)
+    return float(np.median(tiempos))
+
+
+def medicion(seccion, caso, n, valor, unidad):
+    print(f"  {seccion:9s} {caso:34s} n={n:<7d} {valor:12.3f} {unidad}")
+    return {'seccion': seccion, 'caso': caso, 'n': n, 'valor': valor, 'unidad': unidad}
+
+
+def galeria_aleatoria(n, rng):
+    return normalizar(rng.normal(size=(n, DIM)))
+
+
+def bench_matching(rng):
+    resultados = []
+    for n in TAMANOS_GALERIA:
+        matriz = galeria_aleatoria(n, rng)
+        consultas = matriz[rng.integers(0, n, CONSULTAS)] + rng.normal(scale=0.03, size=(CONSULTAS, DIM))
+        nombres = [f"emp{i}" for i in range(n)]
+
+        # Bucle original: comparar_embedding contra cada empleado (limitado a 10 consultas, es O(N) en Python)
+        pocas = consultas[:10]
+
+        def bucle():
+            encontrados = []
+            for emb in pocas:
+                mejor, mejor_score = None, 0
+                for nombre, fila in zip(nombres, matriz):
+                    score = comparar_embedding(emb, fila)
+                    if score > mejor_score:
+                        mejor, mejor_score = nombre, score
+                encontrados.append(mejor)
+            return encontrados
+        segundos = mediana_de(bucle, 1)
+        resultados.append(medicion('matching', 'comparar_embedding (bucle)', n,
+                                   1e6 * segundos / len(pocas), 'us/cara'))
+
+        for indice in ('exacto', 'ivf'):
+            galeria = Galeria.desde_matriz(nombres, matriz, indice=indice)
+            galeria.reconocer(consultas[:1])  # Calentamiento
+            segundos = mediana_de(lambda: galeria.reconocer(consultas))
+            resultados.append(medicion('matching', f'reconocer ({indice})', n,
+                                       1e6 * segundos / CONSULTAS, 'us/cara'))
+            segundos = mediana_de(lambda: [galeria.reconocer(c[None]) for c in consultas[:50]])
+            resultados.append(medicion('matching', f'reconocer 1 cara ({indice})', n,
+                                       1e6 * segundos / 50, 'us/cara'))
+    return resultados
+
+
+def bench_almacen(rng, tmp):
+    resultados = []
+    for n in TAMANOS_GALERIA:
+        matriz = galeria_aleatoria(n, rng)
+        empleados = [{'nombre': f"emp{i}", 'embedding': fila.tolist()} for i, fila in enumerate(matriz)]
+
+        # Formato anterior: un JSON con todos los embeddings, reescrito entero en cada alta
+        ruta_json = os.path.join(tmp, f'empleados_{n}.json')
+
+        def guardar_json():
+            with open(ruta_json, 'w') as f:
+                json.dump(empleados, f)
+
+        def cargar_json():
+            with open(ruta_json) as f:
+                return [{'nombre': e['nombre'], 'embedding': np.array(e['embedding'])} for e in json.load(f)]
+
+        resultados.append(medicion('almacen', 'guardar_db json (anterior)', n,
+                                   1000 * mediana_de(guardar_json), 'ms'))
+        resultados.append(medicion('almacen', 'cargar_db json (anterior)', n,
+                                   1000 * mediana_de(cargar_json), 'ms'))
+
+        ruta = os.path.join(tmp, f'empleados_{n}.gal')
+        resultados.append(medicion('almacen', 'migrar_json', n,
+                                   1000 * mediana_de(lambda: almacen.migrar_json(ruta_json, ruta), 1), 'ms'))
+        resultados.append(medicion('almacen', 'cargar_db (Galeria.desde_almacen)', n,
+                                   1000 * mediana_de(lambda: Galeria.desde_almacen(ruta)), 'ms'))
+        nuevo = matriz[0]
+        resultados.append(medicion('almacen', 'guardar_empleado (almacen.agregar)', n,
+                                   1000 * mediana_de(lambda: almacen.agregar(ruta, 'nuevo', nuevo)), 'ms'))
+    return resultados
+
+
+def bench_bitacora(tmp):
+    resultados = []
+    eventos = 200
+    for n in TAMANOS_BITACORA:
+        directorio = os.path.join(tmp, f'log_{n}')
+        with Bitacora(directorio, fsync_cada=0) as bitacora:
+            evento = {'nombre': 'relleno', 'tipo': 'ENTRADA', 'timestamp': datetime.now().isoformat()}
+            for _ in range(n):
+                bitacora.escribir(evento)
+
+        for caso, kw in (('registrar_log fsync', {}), ('registrar_log sin fsync', {'fsync_cada': 0})):
+            with Bitacora(directorio, **kw) as bitacora:
+                segundos = mediana_de(lambda: [bitacora.registrar('emp1', 'ENTRADA') for _ in range(eventos)])
+            resultados.append(medicion('bitacora', caso, n, 1e6 * segundos / eventos, 'us/evento'))
+
+        # Base SQLite: lo que paga el hilo de video (encolar) y el costo hasta quedar escrito
+        ruta_db = os.path.join(tmp, f'asistencia_{n}.db')
+        migrar(ruta_db, directorio)
+        with BaseAsistencia(ruta_db) as base:
+            segundos = mediana_de(lambda: [base.registrar('emp1', 'ENTRADA') for _ in range(eventos)])
+            resultados.append(medicion('bitacora', 'registrar_log sqlite (encolar)', n,
+                                       1e6 * segundos / eventos, 'us/evento'))
+            base.sincronizar()
+        with BaseAsistencia(ruta_db, espera=0) as base:
+            segundos = mediana_de(lambda: ([base.registrar('emp1', 'ENTRADA') for _ in range(eventos)],
+                                           base.sincronizar()))
+            resultados.append(medicion('bitacora', 'registrar_log sqlite (escrito)', n,
+                                       1e6 * segundos / eventos, 'us/evento'))
+        con = conectar(ruta_db)
+        hoy = datetime.now().date().isoformat()
+        resultados.append(medicion('bitacora', 'jornadas del día (sqlite)', n,
+                                   1000 * mediana_de(lambda: jornadas(con, hoy, hoy)), 'ms'))
+        con.close()
+
+        # Formato anterior: leer y reescribir todo el JSON en cada evento
+        ruta_json = os.path.join(tmp, f'log_{n}.json')
+        with open(ruta_json, 'w') as f:
+            json.dump([evento] * n, f)
+
+        def registrar_json():
+            with open(ruta_json) as f:
+                logs = json.load(f)
+            logs.append({'nombre': 'emp1', 'tipo': 'ENTRADA', 'timestamp': datetime.now().isoformat()})
+            with open(ruta_json, 'w') as f:
+                json.dump(logs, f)
+        resultados.append(medicion('bitacora', 'registrar_log json (anterior)', n,
+                                   1e6 * mediana_de(registrar_json), 'us/evento'))
+    return resultados
+
+
+def bench_zonas(rng):
+    # Cruces de todos los tracks de un frame: una vez por track (anterior) contra el motor vectorizado
+    resultados = []
+    poligonos = zonas.MotorZonas(
+        [{'nombre': 'puerta', 'tipo': zonas.PUERTA, 'poligono': [[200, 0], [440, 0], [470, 480], [170, 480]]},
+         {'nombre': 'oficinas', 'tipo': zonas.OFICINA, 'poligono': zonas.rectangulo(0, 0, 640, 480)}],
+        [{'nombre': 'molinete', 'desde': [320, 100], 'hasta': [320, 400], 'adentro': [500, 250]}])
+    for n in TAMANOS_ZONAS:
+        centros = rng.uniform(0, 640, size=(n, 2))
+        tracks = [{} for _ in range(n)]
+
+        def por_track():
+            for track, (x, _) in zip(tracks, centros):
+                zonas.transicion(track, zonas.get_zona(x))
+        resultados.append(medicion('zonas', 'get_zona + transicion (anterior)', n,
+                                   1e3 * mediana_de(por_track), 'ms/frame'))
+        for caso, motor in (('verticales', zonas.verticales()), ('polígonos + línea', poligonos)):
+            tracks = [{} for _ in range(n)]
+            resultados.append(medicion('zonas', f'MotorZonas.cruces ({caso})', n,
+                                       1e3 * mediana_de(lambda: motor.cruces(tracks, centros)), 'ms/frame'))
+    return resultados
+
+
+def bench_calidad(rng):
+    # Costo por cara del control de calidad, para comparar con el ms/cara de ArcFace
+    # que reporta el monitor: los 5 puntos (sin píxeles) y la nitidez del recorte 112x112
+    control = ControlCalidad()
+    plantilla = np.array([[38.3, 51.7], [73.5, 51.5], [56.0, 71.7], [41.5, 92.4], [70.7, 92.2]], np.float32)
+    kpss = plantilla + rng.normal(scale=4, size=(CARAS_CALIDAD, 5, 2)).astype(np.float32)
+    bbox = np.array([0, 0, 112, 112], np.float32)
+    recortes = rng.integers(0, 255, (8, 112, 112, 3), dtype=np.uint8)
+
+    def puntos():
+        for kps in kpss:
+            control.motivo(bbox, kps, 0.9)
+
+    def recortes_nitidez():
+        for i in range(CARAS_CALIDAD):
+            control.motivo_recorte(recortes[i % len(recortes)])
+    return [medicion('calidad', 'score, tamaño y pose', CARAS_CALIDAD,
+                     1e6 * mediana_de(puntos) / CARAS_CALIDAD, 'us/cara'),
+            medicion('calidad', 'nitidez del recorte alineado', CARAS_CALIDAD,
+                     1e6 * mediana_de(recortes_nitidez) / CARAS_CALIDAD, 'us/cara')]
+
+
+class ModeloSimulado:
+    # Devuelve siempre las mismas caras, al instante: aísla el costo de Python
+    def __init__(self, embeddings, caras=CARAS_POR_FRAME):
+        self.caras = [SimpleNamespace(bbox=np.array([100 + 200 * i, 150, 220 + 200 * i, 300], np.float32),
+                                      det_score=0.9, embedding=embeddings[i])
+                      for i in range(caras)]
+
+    def get(self, frame):
+        return list(self.caras)
+
+
+def video_sintetico(ruta, frames, rng):
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*'MJPG'), 25, (640, 480))
+    fondo = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = fondo.copy()
+        cv2.putText(frame, str(i), (20, 460), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        escritor.write(frame)
+    escritor.release()
+
+
+def bench_e2e(rng, tmp, video=None, modelo='simulado'):
+    matriz = galeria_aleatoria(1000, rng)
+    galeria = Galeria.desde_matriz([f"emp{i}" for i in range(len(matriz))], matriz)
+    if video is None:
+        video = os.path.join(tmp, 'sintetico.avi')
+        video_sintetico(video, FRAMES_E2E, rng)
+
+    if modelo == 'real':
+        from inferencia import analizar
+        from modelo import obtener_modelo
+        app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640))
+        app.calentar()
+        obtener_caras = lambda frame: analizar(app, frame)
+    else:
+        obtener_caras = ModeloSimulado(matriz).get
+
+    resultados = []
+    for workers in (1, 2):
+        rastreador = Rastreador()
+        frames = [0]
+
+        def procesar(frame):
+            faces = obtener_caras(frame)
+            return faces, galeria.reconocer([face.embedding for face in faces])
+
+        # Lo mismo que el hilo de render de asistencia_tracking, sin ventana
+        def consumir(seq, frame, resultado):
+            faces, reconocidos = resultado
+            caras = [{'bbox': f.bbox, 'embedding': f.embedding, 'nombre': n, 'score': s}
+                     for f, (n, s) in zip(faces, reconocidos)]
+            for cara, tid in zip(caras, rastreador.actualizar(caras)):
+                box = cara['bbox'].astype(int)
+                zonas.transicion(rastreador.tracks[tid], zonas.get_zona((box[0] + box[2]) // 2))
+            frames[0] += 1
+            return True
+
+        pipeline = Pipeline(video, procesar, consumir, workers=workers, politica=BLOQUEAR)
+        t0 = time.perf_counter()
+        pipeline.ejecutar()
+        segundos = time.perf_counter() - t0
+        resultados.append(medicion('e2e', f'pipeline {modelo} workers={workers}', frames[0],
+                                   frames[0] / segundos, 'fps'))
+    return resultados
+
+
+def commit_actual():
+    try:
+        salida = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRECTORIO,
+                                capture_output=True, text=True, timeout=10)
+        return salida.stdout.strip() or 'desconocido'
+    except (OSError, subprocess.SubprocessError):
+        return 'desconocido'
+
+
+def entorno():
+    return {
+        'commit': commit_actual(),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def comparar(ruta_a, ruta_b):
+    # Menor es mejor salvo en fps
+    with open(ruta_a) as f:
+        a = json.load(f)
+    with open(ruta_b) as f:
+        b = json.load(f)
+    print(f"{a['entorno']['commit']} -> {b['entorno']['commit']}")
+    antes = {(m['seccion'], m['caso'], m['n']): m for m in a['mediciones']}
+    regresiones = 0
+    for m in b['mediciones']:
+        previo = antes.get((m['seccion'], m['caso'], m['n']))
+        if previo is None or not previo['valor'] or not m['valor']:
+            continue
+        if m['unidad'] == 'fps':
+            factor = previo['valor'] / m['valor']
+        else:
+            factor = m['valor'] / previo['valor']
+        marca = '  REGRESIÓN' if factor > UMBRAL_REGRESION else ''
+        regresiones += bool(marca)
+        print(f"  {m['seccion']:9s} {m['caso']:34s} n={m['n']:<7d} "
+              f"{previo['valor']:10.3f} -> {m['valor']:10.3f} {m['unidad']:10s} x{factor:.2f}{marca}")
+    return regresiones
+
+
+def opcion(args, nombre, defecto=None):
+    if nombre in args:
+        i = args.index(nombre)
+        valor = args[i + 1]
+        del args[i:i + 2]
+        return valor
+    return defecto
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if args and args[0] == 'comparar':
+        if len(args) != 3:
+            print("Uso:")
+            print("  python bench_suite.py comparar antes.json despues.json")
+            sys.exit(1)
+        sys.exit(1 if comparar(args[1], args[2]) else 0)
+    if '-h' in args or '--help' in args:
+        print("Uso:")
+        print("  python bench_suite.py [--rapido] [--secciones matching,almacen,bitacora,zonas,calidad,e2e]")
+        print("                        [--video clip.mp4] [--modelo simulado|real] [--salida r.json]")
+        print("  python bench_suite.py comparar antes.json despues.json")
+        sys.exit(0)
+
+    if '--rapido' in args:
+        args.remove('--rapido')
+        globals().update(RAPIDO)
+    secciones = opcion(args, '--secciones', ','.join(SECCIONES)).split(',')
+    video = opcion(args, '--video')
+    modelo = opcion(args, '--modelo', 'simulado')
+    datos = {'entorno': entorno(), 'parametros': {
+        'secciones': secciones, 'tamanos_galeria': TAMANOS_GALERIA, 'tamanos_bitacora': TAMANOS_BITACORA,
+        'tamanos_zonas': TAMANOS_ZONAS,
+        'consultas': CONSULTAS, 'frames_e2e': FRAMES_E2E, 'repeticiones': REPETICIONES,
+        'video': video, 'modelo': modelo, 'semilla': SEMILLA}, 'mediciones': []}
+    salida = opcion(args, '--salida') or os.path.join(
+        RESULTADOS, f"{datos['entorno']['commit']}-{datetime.now():%Y%m%d-%H%M%S}.json")
+
+    rng = np.random.default_rng(SEMILLA)
+    tmp = tempfile.mkdtemp(prefix='bench_asistencia_')
+    try:
+        if 'matching' in secciones:
+            datos['mediciones'] += bench_matching(rng)
+        if 'almacen' in secciones:
+            datos['mediciones'] += bench_almacen(rng, tmp)
+        if 'bitacora' in secciones:
+            datos['mediciones'] += bench_bitacora(tmp)
+        if 'zonas' in secciones:
+            datos['mediciones'] += bench_zonas(rng)
+        if 'calidad' in secciones:
+            datos['mediciones'] += bench_calidad(rng)
+        if 'e2e' in secciones:
+            datos['mediciones'] += bench_e2e(rng, tmp, video, modelo)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(os.path.abspath(salida)), exist_ok=True)
+    with open(salida, 'w') as f:
+        json.dump(datos, f, indent=2)
+    print(f"Resultados en {salida}")
@@ -0,0 +1,138 @@
+import glob
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import metricas
+
+# Bitácora de asistencia solo-agregar: una línea JSON por evento y un
+# segmento por día (asistencia_log/2026-01-30.jsonl). Escribir un evento
+# cuesta lo mismo sin importar el tamaño del historial, y un corte a mitad
+# de escritura solo puede dañar la última línea del segmento.
+
+
+class Bitacora:
+    # fsync_cada: eventos entre fsync (1 = cada evento, 0 = nunca forzar)
+    # fsync_segundos: además, fsync si pasó este tiempo desde el último
+    def __init__(self, directorio, fsync_cada=1, fsync_segundos=None):
+        self.directorio = directorio
+        self.fsync_cada = fsync_cada
+        self.fsync_segundos = fsync_segundos
+        self.dia = None
+        self.archivo = None
+        self.pendientes = 0
+        self.ultimo_fsync = time.monotonic()
+        os.makedirs(directorio, exist_ok=True)
+
+    def ruta_segmento(self, dia):
+        return os.path.join(self.directorio, f"{dia}.jsonl")
+
+    def rotar(self, dia):
+        self.cerrar()
+        self.dia = dia
+        ruta = self.ruta_segmento(dia)
+        # Si una caída dejó la última línea sin terminar, se cierra para no pegarle el siguiente evento
+        if os.path.exists(ruta) and os.path.getsize(ruta) > 0:
+            with open(ruta, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                cortada = f.read(1) != b'\n'
+        else:
+            cortada = False
+        self.archivo = open(ruta, 'a', encoding='utf-8')
+        if cortada:
+            self.archivo.write('\n')
+
+    def escribir(self, evento):
+        dia = evento['timestamp'][:10]
+        t0 = time.perf_counter()
+        if dia != self.dia:
+            self.rotar(dia)
+        self.archivo.write(json.dumps(evento, ensure_ascii=False) + '\n')
+        self.archivo.flush()
+        self.pendientes += 1
+        if self.fsync_cada and self.pendientes >= self.fsync_cada:
+            self.sincronizar()
+        elif self.fsync_segundos is not None and \
+                time.monotonic() - self.ultimo_fsync >= self.fsync_segundos:
+            self.sincronizar()
+        metricas.observar('escritura_bitacora', time.perf_counter() - t0)
+        return evento
+
+    def registrar(self, nombre, tipo, timestamp=None, **extra):
+        # extra: campos adicionales del evento, p. ej. camara='puerta-norte'
+        timestamp = timestamp or datetime.now()
+        evento = {'nombre': nombre, 'tipo': tipo, 'timestamp': timestamp.isoformat()}
+        evento.update(extra)
+        return self.escribir(evento)
+
+    def sincronizar(self):
+        if self.archivo is not None and self.pendientes:
+            os.fsync(self.archivo.fileno())
+        self.pendientes = 0
+        self.ultimo_fsync = time.monotonic()
+
+    def cerrar(self):
+        if self.archivo is not None:
+            self.sincronizar()
+            self.archivo.close()
+            self.archivo = None
+            self.dia = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+def abrir_bitacora(directorio, ruta_json=None, **kwargs):
+    # La primera vez importa el log JSON anterior, si existe
+    if ruta_json and not os.path.isdir(directorio) and os.path.exists(ruta_json):
+        n = importar_json(ruta_json, directorio)
+        print(f"Importados {n} eventos de {ruta_json}")
+    return Bitacora(directorio, **kwargs)
+
+
+def segmentos(directorio, desde=None, hasta=None):
+    # Segmentos en orden cronológico; desde/hasta son fechas 'YYYY-MM-DD' inclusivas
+    for ruta in sorted(glob.glob(os.path.join(directorio, '*.jsonl'))):
+        dia = os.path.basename(ruta)[:-len('.jsonl')]
+        if (desde and dia < desde) or (hasta and dia > hasta):
+            continue
+        yield ruta
+
+
+def leer_eventos(directorio, desde=None, hasta=None):
+    # Lee los eventos de forma perezosa, segmento por segmento
+    for ruta in segmentos(directorio, desde, hasta):
+        with open(ruta, 'r', encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    continue  # Última línea cortada por una caída
+
+
+def importar_json(ruta_json, directorio):
+    # Importa el antiguo asistencia_log.json (un único arreglo JSON)
+    with open(ruta_json, 'r') as f:
+        logs = json.load(f)
+    with Bitacora(directorio, fsync_cada=0) as bitacora:
+        for log in sorted(logs, key=lambda l: l['timestamp']):
+            bitacora.escribir(log)
+    return len(logs)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "importar":
+        n = importar_json(sys.argv[2], sys.argv[3])
+        print(f"✓ {n} eventos importados a {sys.argv[3]}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == "ver":
+        for log in leer_eventos(sys.argv[2], *sys.argv[3:5]):
+            print(f"[{log['timestamp']}] {log['tipo']}: {log['nombre']}")
+    else:
+        print("Uso:")
+        print("  python bitacora.py importar asistencia_log.json asistencia_log/")
+        print("  python bitacora.py ver asistencia_log/ [desde] [hasta]")
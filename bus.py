@@ -0,0 +1,464 @@
+import os
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+import metricas
+
+# Bus de frames en memoria compartida: un solo proceso abre la cámara (o el
+# video) y publica los frames decodificados en un anillo de RANURAS lugares;
+# los monitores, la grabación y la vista leen del anillo sin volver a abrir la
+# cámara ni a decodificar, con vistas numpy directas sobre la memoria.
+#   python bus.py publicar 0 [--nombre principal] [--ranuras 8]
+#   python bus.py publicar clip.mp4 [--sin-pausa]   (a la velocidad del video)
+#   python asistencia_gpu.py bus:principal          (cualquier monitor: fuente bus:<nombre>)
+#   python asistencia_tracking.py bus:principal
+#   python bus.py grabar salida.avi [--nombre principal]
+#   python bus.py ver [--vista mjpeg]
+#   python bus.py estado
+# Cada frame lleva un número de secuencia. Un lector 'reciente' salta al último
+# (reconocimiento, vista) y uno 'orden' lee todos mientras el anillo no lo pase
+# (grabación); en los dos los saltos se cuentan como descartados. Cada ranura
+# tiene inicio/fin de escritura (seqlock): una lectura que el publicador pisó a
+# mitad de copia se descarta en lugar de entregar un frame mezclado.
+# En Docker los procesos tienen que compartir /dev/shm (--ipc=host o
+# --ipc=container:...); un anillo de 8 frames de 640x480 ocupa ~7 MB.
+NOMBRE = 'principal'
+PREFIJO = 'asistencia_bus_'  # Nombre del segmento en /dev/shm
+RANURAS = 8
+SONDEO = 0.001      # Segundos entre consultas del último frame publicado
+CONECTAR = 10.0     # Segundos que un lector espera a que aparezca el publicador
+LATIDO = 0.5        # Segundos entre latidos del publicador
+SIN_LATIDO = 3.0    # Sin latido en este tiempo el publicador se da por caído
+ESPERA_LECTURA = 1.0  # Segundos que read() espera un frame antes de devolver False
+MAGIA = b'ASFB'
+VERSION = 1
+ALINEACION = 64     # Línea de cache: ranuras y marcas no la comparten
+MODOS = ('reciente', 'orden')
+
+CABECERA = np.dtype({'names': ['magia', 'version', 'alto', 'ancho', 'canales', 'ranuras', 'tam_ranura',
+                               'fps', 'ultimo', 'latido', 'cerrado', 'pid'],
+                     'formats': ['S4', '<u4', '<i8', '<i8', '<i8', '<i8', '<i8',
+                                 '<f8', '<i8', '<f8', '<i8', '<i8'],
+                     'offsets': [0, 4, 8, 16, 24, 32, 40, 48, 56, 64, 72, 80], 'itemsize': 128})
+MARCA = np.dtype({'names': ['inicio', 'fin', 't'], 'formats': ['<i8', '<i8', '<f8'],
+                  'offsets': [0, 8, 16], 'itemsize': ALINEACION})
+
+
+def es_bus(fuente):
+    return isinstance(fuente, str) and fuente.startswith('bus:')
+
+
+def nombre_de(fuente):
+    return fuente[len('bus:'):] or NOMBRE
+
+
+def redondear(n):
+    return (n + ALINEACION - 1) // ALINEACION * ALINEACION
+
+
+def vistas(buf, ranuras, alto, ancho, canales, tam_ranura):
+    # Cabecera, marcas por ranura y frames, todas sobre la misma memoria
+    cab = np.ndarray((), CABECERA, buffer=buf)
+    marcas = np.ndarray((ranuras,), MARCA, buffer=buf, offset=CABECERA.itemsize)
+    frames = np.ndarray((ranuras, alto, ancho, canales), np.uint8, buffer=buf,
+                        offset=CABECERA.itemsize + ranuras * MARCA.itemsize,
+                        strides=(tam_ranura, ancho * canales, canales, 1))
+    return cab, marcas, frames
+
+
+def adjuntar(nombre):
+    # Sin registrar el segmento en el resource_tracker: si no, al salir el
+    # lector lo borraría aunque el publicador siga usándolo
+    try:
+        return shared_memory.SharedMemory(name=PREFIJO + nombre, track=False)
+    except TypeError:  # Python < 3.13
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name=PREFIJO + nombre)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+def latido_vigente(cab, ahora=None):
+    ahora = time.monotonic() if ahora is None else ahora
+    return not cab['cerrado'] and ahora - float(cab['latido']) < SIN_LATIDO
+
+
+# Escribe en el anillo. Un solo publicador por nombre; si quedó el segmento de
+# uno que se cayó, se reemplaza.
+class PublicadorFrames:
+    def __init__(self, nombre, alto, ancho, canales=3, ranuras=RANURAS, fps=0.0):
+        self.nombre = nombre
+        tam_ranura = redondear(alto * ancho * canales)
+        tam = CABECERA.itemsize + ranuras * MARCA.itemsize + ranuras * tam_ranura
+        try:
+            self.shm = shared_memory.SharedMemory(name=PREFIJO + nombre, create=True, size=tam)
+        except FileExistsError:
+            viejo = adjuntar(nombre)
+            cab = np.ndarray((), CABECERA, buffer=viejo.buf)
+            vivo = cab['magia'] == MAGIA and latido_vigente(cab)
+            del cab
+            viejo.close()
+            if vivo:
+                raise RuntimeError(f"Ya hay un publicador en el bus '{nombre}'")
+            viejo = shared_memory.SharedMemory(name=PREFIJO + nombre)  # Registrado: unlink() lo da de baja
+            viejo.close()
+            viejo.unlink()
+            self.shm = shared_memory.SharedMemory(name=PREFIJO + nombre, create=True, size=tam)
+        self.cab, self.marcas, self.frames = vistas(self.shm.buf, ranuras, alto, ancho, canales, tam_ranura)
+        self.marcas['inicio'] = -1
+        self.marcas['fin'] = -1
+        self.cab['alto'], self.cab['ancho'], self.cab['canales'] = alto, ancho, canales
+        self.cab['ranuras'], self.cab['tam_ranura'], self.cab['fps'] = ranuras, tam_ranura, fps
+        self.cab['ultimo'] = -1
+        self.cab['pid'] = os.getpid()
+        self.cab['latido'] = time.monotonic()
+        self.cab['version'] = VERSION
+        self.cab['magia'] = MAGIA  # Al final: recién ahora los lectores lo aceptan
+        self.seq = 0
+        self.detenido = threading.Event()
+        # Late aunque la cámara se trabe en read(): los lectores distinguen
+        # "sin frames" de "publicador caído"
+        self.hilo = threading.Thread(target=self.latir, daemon=True)
+        self.hilo.start()
+
+    def latir(self):
+        while not self.detenido.wait(LATIDO):
+            self.cab['latido'] = time.monotonic()
+
+    def publicar(self, frame, t=None):
+        # Copia el frame a la ranura seq % ranuras; devuelve su número de secuencia
+        seq = self.seq
+        r = seq % len(self.marcas)
+        marca = self.marcas[r:r + 1]
+        marca['inicio'] = seq  # Desde acá la ranura vieja deja de ser válida
+        self.frames[r] = frame
+        marca['t'] = time.monotonic() if t is None else t
+        marca['fin'] = seq
+        self.cab['ultimo'] = seq
+        self.seq += 1
+        return seq
+
+    def cerrar(self):
+        # Los lectores ven 'cerrado' y terminan; el segmento sigue mapeado en ellos
+        self.detenido.set()
+        self.hilo.join()
+        self.cab['cerrado'] = 1
+        del self.cab, self.marcas, self.frames
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Lee del anillo. 'reciente' salta al último frame publicado; 'orden' entrega
+# todos mientras el publicador no dé la vuelta al anillo. descartados cuenta los
+# frames que este lector no vio y sobrescritos las copias pisadas a mitad.
+class LectorFrames:
+    def __init__(self, nombre=NOMBRE, modo='reciente', conectar=CONECTAR):
+        if modo not in MODOS:
+            raise ValueError(f"Modo desconocido: {modo} (hay {', '.join(MODOS)})")
+        self.nombre = nombre
+        self.modo = modo
+        limite = time.monotonic() + conectar
+        while True:
+            try:
+                self.shm = adjuntar(nombre)
+                cab = np.ndarray((), CABECERA, buffer=self.shm.buf)
+                if cab['magia'] == MAGIA:
+                    break
+                del cab
+                self.shm.close()  # Recién creado: el publicador aún no escribió la cabecera
+            except (FileNotFoundError, ValueError, TypeError):
+                pass  # No existe o el publicador todavía le está dando tamaño
+            if time.monotonic() >= limite:
+                raise FileNotFoundError(f"No hay publicador en el bus '{nombre}' (python bus.py publicar ...)")
+            time.sleep(0.1)
+        if cab['version'] != VERSION:
+            raise RuntimeError(f"Bus '{nombre}' con versión {cab['version']}, se esperaba {VERSION}")
+        self.cab, self.marcas, self.frames = vistas(
+            self.shm.buf, int(cab['ranuras']), int(cab['alto']), int(cab['ancho']),
+            int(cab['canales']), int(cab['tam_ranura']))
+        del cab
+        self.ranuras = len(self.marcas)
+        # Un lector nuevo empieza por el frame más reciente, no por el anillo entero
+        self.proximo = max(int(self.cab['ultimo']), 0)
+        self.terminado = False
+        self.leidos = 0
+        self.descartados = 0
+        self.sobrescritos = 0
+
+    @property
+    def forma(self):
+        return self.frames.shape[1:]
+
+    @property
+    def fps(self):
+        return float(self.cab['fps'])
+
+    def esperar(self, timeout):
+        # Último seq publicado >= proximo, o None (sin frames o bus terminado)
+        limite = None if timeout is None else time.monotonic() + timeout
+        control = time.monotonic() + LATIDO
+        while True:
+            ultimo = int(self.cab['ultimo'])
+            if ultimo >= self.proximo:
+                return ultimo
+            ahora = time.monotonic()
+            if ahora >= control:
+                control = ahora + LATIDO
+                if not latido_vigente(self.cab, ahora):
+                    self.terminado = True
+                    return None
+            if limite is not None and ahora >= limite:
+                return None
+            time.sleep(SONDEO)
+
+    def siguiente(self, timeout=None):
+        # (seq, t, frame) sin copiar: frame es una vista de la ranura y vale
+        # mientras vigente(seq). None si no llegó nada en timeout o si terminó.
+        while not self.terminado:
+            ultimo = self.esperar(timeout)
+            if ultimo is None:
+                return None
+            if self.modo == 'reciente':
+                seq = ultimo
+            else:
+                # Se deja una ranura de margen: la siguiente a escribir es la más vieja
+                seq = max(self.proximo, ultimo - self.ranuras + 2)
+            r = seq % self.ranuras
+            if int(self.marcas[r]['fin']) != seq:
+                self.sobrescritos += 1  # El anillo ya dio la vuelta: buscar uno más nuevo
+                self.proximo = seq + 1
+                continue
+            self.descartados += seq - self.proximo
+            self.proximo = seq + 1
+            self.leidos += 1
+            return seq, float(self.marcas[r]['t']), self.frames[r]
+        return None
+
+    def vigente(self, seq):
+        # False si el publicador ya empezó a escribir encima de ese frame
+        return int(self.marcas[seq % self.ranuras]['inicio']) == seq
+
+    def leer(self, timeout=None):
+        # Como siguiente(), pero con una copia propia del frame que se puede
+        # dibujar o encolar (los monitores la necesitan)
+        while True:
+            item = self.siguiente(timeout)
+            if item is None:
+                return None
+            seq, t, vista = item
+            frame = vista.copy()
+            if self.vigente(seq):
+                return seq, t, frame
+            self.sobrescritos += 1
+            self.leidos -= 1
+
+    def estadisticas(self):
+        ultimo = int(self.cab['ultimo'])
+        return {'leidos': self.leidos, 'descartados': self.descartados,
+                'sobrescritos': self.sobrescritos, 'ultimo': ultimo,
+                'atraso': max(ultimo - self.proximo + 1, 0)}
+
+    def cerrar(self):
+        del self.cab, self.marcas, self.frames
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # Quedan vistas de frames en uso; se libera al salir del proceso
+
+
+# Misma interfaz que cv2.VideoCapture (isOpened, read, get, release), para que
+# Pipeline y los monitores lean del bus con fuente 'bus:<nombre>'.
+class CapturaBus:
+    def __init__(self, nombre=NOMBRE, modo='reciente'):
+        try:
+            self.lector = LectorFrames(nombre, modo)
+        except (FileNotFoundError, RuntimeError) as e:
+            print(f"Bus: {e}")
+            self.lector = None
+            return
+        lector = self.lector
+        metricas.medidor('frames_descartados', lambda: lector.descartados + lector.sobrescritos,
+                         'counter', cola='bus')
+
+    def isOpened(self):
+        return self.lector is not None and not self.lector.terminado
+
+    def read(self):
+        # (False, None) sin frame en ESPERA_LECTURA o con el bus cerrado (ver isOpened)
+        item = self.lector.leer(ESPERA_LECTURA) if self.isOpened() else None
+        return (False, None) if item is None else (True, item[2])
+
+    def get(self, prop):
+        if self.lector is None:
+            return 0.0
+        alto, ancho, _ = self.lector.forma
+        return {cv2.CAP_PROP_FPS: self.lector.fps, cv2.CAP_PROP_FRAME_WIDTH: float(ancho),
+                cv2.CAP_PROP_FRAME_HEIGHT: float(alto)}.get(prop, 0.0)
+
+    def set(self, prop, valor):
+        return False  # La resolución la decide el publicador
+
+    def release(self):
+        if self.lector is not None:
+            self.lector.cerrar()
+            self.lector = None
+
+
+def abrir_captura(fuente, ancho=640, alto=480):
+    # cv2.VideoCapture o el bus, según la fuente: índice de cámara, ruta, URL o bus:<nombre>
+    if es_bus(fuente):
+        return CapturaBus(nombre_de(fuente))
+    cap = cv2.VideoCapture(fuente)
+    if isinstance(fuente, int):
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, ancho)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, alto)
+    return cap
+
+
+def publicar(fuente, nombre=NOMBRE, ranuras=RANURAS, pausa=True, ancho=640, alto=480):
+    # Bucle del proceso de captura. Un video se publica a su propia velocidad
+    # (como una cámara) salvo con pausa=False.
+    cap = abrir_captura(fuente, ancho, alto)
+    if not cap.isOpened():
+        print(f"Error: No se puede abrir la fuente {fuente}")
+        return None
+    es_camara = isinstance(fuente, int)
+    ret, frame = cap.read()
+    if not ret:
+        print(f"Error: No se pudo leer de {fuente}")
+        cap.release()
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+    try:
+        publicador = PublicadorFrames(nombre, *frame.shape, ranuras=ranuras, fps=fps)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        cap.release()
+        return None
+    print(f"Publicando {fuente} en bus:{nombre} ({frame.shape[1]}x{frame.shape[0]}, "
+          f"{fps:.0f} fps, {ranuras} ranuras). Ctrl+C para salir.")
+    intervalo = 1.0 / fps if pausa and fps and not es_camara else 0.0
+    proximo = time.monotonic()
+    try:
+        while True:
+            publicador.publicar(frame)
+            if intervalo:
+                proximo += intervalo
+                espera = proximo - time.monotonic()
+                if espera > 0:
+                    time.sleep(espera)
+            ret, frame = cap.read()
+            while not ret and es_camara:
+                ret, frame = cap.read()
+            if not ret:
+                break  # Fin del video
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cap.release()
+        publicador.cerrar()
+    print(f"Bus {nombre}: {publicador.seq} frames publicados")
+    return publicador.seq
+
+
+def grabar(ruta, nombre=NOMBRE, fourcc='MJPG'):
+    # Consumidor en orden: todos los frames que el disco alcance a escribir
+    lector = LectorFrames(nombre, 'orden')
+    alto, ancho, _ = lector.forma
+    escritor = cv2.VideoWriter(ruta, cv2.VideoWriter_fourcc(*fourcc), lector.fps or 25, (ancho, alto))
+    try:
+        while True:
+            item = lector.siguiente()
+            if item is None:
+                break
+            seq, _, vista = item
+            escritor.write(vista)  # Directo desde la ranura, sin copia intermedia
+            if not lector.vigente(seq):
+                lector.sobrescritos += 1  # Se grabó un frame pisado a mitad
+    except KeyboardInterrupt:
+        pass
+    finally:
+        escritor.release()
+        stats = lector.estadisticas()
+        lector.cerrar()
+    print(formatear_estadisticas(stats, f"Grabación {ruta}"))
+    return stats
+
+
+def ver(nombre=NOMBRE, modo_vista='ventana'):
+    from vista import Vista
+    lector = LectorFrames(nombre, 'reciente')
+    vista = Vista(modo_vista, titulo=f"bus:{nombre}").iniciar(None)
+    try:
+        while True:
+            item = lector.leer()
+            if item is None:
+                break
+            if vista.quiere_frame():
+                vista.mostrar(item[2])
+            if any(tecla == 'q' for tecla, _ in vista.teclas()):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        vista.detener()
+        stats = lector.estadisticas()
+        lector.cerrar()
+    print(formatear_estadisticas(stats, "Vista"))
+
+
+def formatear_estadisticas(stats, titulo="Bus"):
+    return (f"{titulo}: {stats['leidos']} frames leídos | descartados {stats['descartados']} | "
+            f"pisados {stats['sobrescritos']}")
+
+
+def opcion(args, nombre, defecto):
+    if nombre in args:
+        i = args.index(nombre)
+        valor = args[i + 1]
+        del args[i:i + 2]
+        return valor
+    return defecto
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    nombre = opcion(args, '--nombre', NOMBRE)
+    ranuras = int(opcion(args, '--ranuras', RANURAS))
+    modo_vista = opcion(args, '--vista', 'ventana')
+    pausa = '--sin-pausa' not in args
+    if not pausa:
+        args.remove('--sin-pausa')
+    if len(args) == 2 and args[0] == "publicar":
+        fuente = int(args[1]) if args[1].isdigit() else args[1]
+        sys.exit(0 if publicar(fuente, nombre, ranuras, pausa) is not None else 1)
+    elif len(args) == 2 and args[0] == "grabar":
+        grabar(args[1], nombre)
+    elif len(args) == 1 and args[0] == "ver":
+        ver(nombre, modo_vista)
+    elif len(args) == 1 and args[0] == "estado":
+        try:
+            lector = LectorFrames(nombre, conectar=0)
+        except (FileNotFoundError, RuntimeError) as e:
+            print(e)
+            sys.exit(1)
+        alto, ancho, _ = lector.forma
+        cab = lector.cab
+        print(f"bus:{nombre} | {ancho}x{alto} | {lector.ranuras} ranuras | {lector.fps:.0f} fps | "
+              f"último frame {int(cab['ultimo'])} | pid {int(cab['pid'])} | "
+              f"{'activo' if latido_vigente(cab) else 'caído'}")
+        del cab
+        lector.cerrar()
+    else:
+        print("Uso:")
+        print("  python bus.py publicar <camara|video> [--nombre N] [--ranuras R] [--sin-pausa]")
+        print("  python bus.py grabar salida.avi [--nombre N]")
+        print("  python bus.py ver [--nombre N] [--vista ventana|mjpeg]")
+        print("  python bus.py estado [--nombre N]")
+        print("  (los monitores leen del bus con la fuente bus:<nombre>, p.ej. bus:principal)")
+        sys.exit(1)
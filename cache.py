@@ -0,0 +1,120 @@
+import time
+from collections import OrderedDict
+
+from galeria import normalizar
+from seguimiento import Rastreador
+
+VENTANA = 30        # Segundos en los que no se repite el evento de una persona
+MAX_RECIENTES = 4096  # Cota de memoria del antirrebote: salen los más viejos
+REVERIFICAR = 3.0   # Segundos antes de volver a comparar un track ya identificado
+SIM_CACHE = 0.8     # Similitud mínima con el embedding verificado para usar el cache
+CONFIANZA = 0.5     # Score desde el que la identidad de un track se guarda
+
+
+# Antirrebote de eventos: una clave (nombre, o (nombre, tipo)) cuenta una vez
+# por ventana. Las entradas vencidas se descartan al consultar y nunca hay más
+# de max_claves, así que no crece con cada persona vista en el día.
+class Recientes:
+    def __init__(self, ventana=VENTANA, max_claves=MAX_RECIENTES):
+        self.ventana = ventana
+        self.max_claves = max_claves
+        self.vistos = OrderedDict()  # clave -> instante, del más viejo al más nuevo
+
+    def __len__(self):
+        return len(self.vistos)
+
+    def expirar(self, ahora):
+        while self.vistos and (ahora - next(iter(self.vistos.values()))).total_seconds() >= self.ventana:
+            self.vistos.popitem(last=False)
+        while len(self.vistos) > self.max_claves:
+            self.vistos.popitem(last=False)
+
+    def nuevo(self, clave, ahora):
+        # True (y queda anotada) si la clave no se vio en la ventana
+        self.expirar(ahora)
+        if clave in self.vistos:
+            return False
+        self.vistos[clave] = ahora
+        self.expirar(ahora)
+        return True
+
+
+# Reconocimiento con cache por track: las caras de cada frame se asocian a
+# tracks (Rastreador) y un track ya identificado con confianza reusa su
+# nombre y score sin buscar en la galería. Se vuelve a comparar cada
+# REVERIFICAR segundos, si el embedding se aleja del verificado (otra cara
+# tomó el track) o si cambió la galería. El cache vive en los tracks, así que
+# vence con ellos (TTL del rastreador) y tiene su misma cota (MAX_TRACKS).
+# Guarda estado entre frames: llamar desde un solo hilo, en orden.
+class CacheReconocimiento:
+    def __init__(self, galeria, rastreador=None, reverificar=REVERIFICAR,
+                 sim_min=SIM_CACHE, confianza=CONFIANZA):
+        self.galeria = galeria
+        self.rastreador = rastreador or Rastreador()
+        self.reverificar = reverificar
+        self.sim_min = sim_min
+        self.confianza = confianza
+        self.consultas = 0
+        self.aciertos = 0
+        self.sin_calidad = 0  # Caras sin embedding (control de calidad)
+
+    def publicada(self):
+        # Con una GaleriaViva, la galería publicada ahora (cambia con cada alta)
+        return getattr(self.galeria, 'actual', self.galeria)
+
+    def vigente(self, cache, emb, ahora):
+        return (cache is not None
+                and ahora - cache['verificado'] < self.reverificar
+                and cache['galeria'] is self.publicada()
+                and float(emb @ cache['embedding']) >= self.sim_min)
+
+    def reconocer(self, bboxes, embeddings, ahora=None):
+        # Mismo contrato que Galeria.reconocer(): (nombre, score) por cara.
+        # Un embedding None (cara que no pasó el control de calidad) solo se
+        # asocia por IoU: conserva la identidad verificada del track, si hay,
+        # y si no queda sin identificar hasta un frame bueno.
+        ahora = time.monotonic() if ahora is None else ahora
+        if len(embeddings) == 0:
+            self.rastreador.actualizar([], ahora)
+            return []
+        validas = [j for j, emb in enumerate(embeddings) if emb is not None]
+        embs = [None] * len(embeddings)
+        if validas:
+            for j, emb in zip(validas, normalizar([embeddings[j] for j in validas])):
+                embs[j] = emb
+        ids = self.rastreador.actualizar([{'bbox': b, 'embedding': e} for b, e in zip(bboxes, embs)], ahora)
+        tracks = [self.rastreador.tracks[tid] for tid in ids]
+        resultados = [(None, 0.0)] * len(tracks)
+        pendientes = []
+        for j, (track, emb) in enumerate(zip(tracks, embs)):
+            cache = track.get('cache')
+            if emb is None:
+                self.sin_calidad += 1
+                if cache is not None and cache['galeria'] is self.publicada():
+                    resultados[j] = (cache['nombre'], cache['score'])
+            elif self.vigente(cache, emb, ahora):
+                resultados[j] = (cache['nombre'], cache['score'])
+            else:
+                pendientes.append(j)
+        self.consultas += len(validas)
+        self.aciertos += len(validas) - len(pendientes)
+        if pendientes:
+            galeria = self.publicada()
+            for j, r in zip(pendientes, galeria.reconocer([embs[j] for j in pendientes])):
+                resultados[j] = r
+                nombre, score = r
+                tracks[j]['cache'] = None
+                if nombre and score >= self.confianza:
+                    tracks[j]['cache'] = {'nombre': nombre, 'score': score, 'embedding': embs[j],
+                                          'verificado': ahora, 'galeria': galeria}
+        return resultados
+
+    def estadisticas(self):
+        return {'consultas': self.consultas, 'aciertos': self.aciertos,
+                'tasa': self.aciertos / self.consultas if self.consultas else 0.0,
+                'tracks': len(self.rastreador.tracks), 'sin_calidad': self.sin_calidad}
+
+
+def formatear_estadisticas(stats):
+    return (f"Cache de reconocimiento: {100 * stats['tasa']:.0f}% de las caras sin buscar en la galería "
+            f"({stats['aciertos']}/{stats['consultas']})")
@@ -0,0 +1,127 @@
+import threading
+from collections import Counter
+
+import cv2
+import numpy as np
+
+import metricas
+
+# Control de calidad antes del reconocimiento: las caras chicas, de perfil,
+# movidas o dudosas para el detector dan embeddings pobres (scores bajos y
+# nombres que saltan a Desconocido), así que no se mandan a ArcFace. Primero
+# lo que no mira píxeles (score, tamaño, pose con los 5 puntos) y recién
+# después, sobre el recorte alineado 112x112 que igual se arma para ArcFace,
+# la nitidez. Más permisivo que el de registro.py: acá la cara vuelve a pasar
+# en los frames siguientes y el track se reconoce con el primero bueno.
+DET_SCORE_MIN = 0.55  # Confianza mínima del detector
+TAM_MIN = 40          # Lado menor mínimo de la caja en píxeles
+GUINADA_MAX = 0.45    # Giro lateral: nariz respecto de los ojos (0 = de frente, 1 = sobre un ojo)
+CABECEO_MAX = 0.3     # Cabeceo: nariz entre la línea de los ojos y la boca (0 = centrada)
+NITIDEZ_MIN = 30.0    # Varianza del laplaciano del recorte alineado (menos = movida o desenfocada)
+CENTRO_NARIZ = 0.5    # Posición de la nariz entre ojos y boca en una cara de frente (plantilla ArcFace)
+
+
+def pose(kps):
+    # (guiñada, cabeceo) aproximados con los 5 puntos de SCRFD:
+    # ojo izq, ojo der, nariz, boca izq, boca der. Con floats de Python:
+    # para 5 puntos es varias veces más rápido que con numpy.
+    (oix, oiy), (odx, ody), (nx, ny), (bix, biy), (bdx, bdy) = np.asarray(kps)[:5].tolist()
+    ex, ey = odx - oix, ody - oiy
+    largo = ex * ex + ey * ey
+    if largo < 1e-6:
+        return 1.0, 1.0
+    guinada = 2 * ((nx - oix) * ex + (ny - oiy) * ey) / largo - 1
+    mx, my = (oix + odx) / 2, (oiy + ody) / 2
+    ax, ay = (bix + bdx) / 2 - mx, (biy + bdy) / 2 - my
+    alto = ax * ax + ay * ay
+    if alto < 1e-6:
+        return guinada, 1.0
+    cabeceo = ((nx - mx) * ax + (ny - my) * ay) / alto - CENTRO_NARIZ
+    return guinada, cabeceo
+
+
+def nitidez(recorte):
+    # Varianza del laplaciano; en int16 alcanza (|valor| <= 4 * 255) y es más rápido
+    gris = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY) if recorte.ndim == 3 else recorte
+    return float(cv2.meanStdDev(cv2.Laplacian(gris, cv2.CV_16S))[1][0, 0] ** 2)
+
+
+def reconocer_validas(galeria, embeddings):
+    # galeria.reconocer() solo de las caras con embedding; las que no pasaron
+    # el control quedan sin identificar (None, 0.0) hasta un frame bueno
+    validas = [i for i, emb in enumerate(embeddings) if emb is not None]
+    resultados = [(None, 0.0)] * len(embeddings)
+    if validas:
+        for i, r in zip(validas, galeria.reconocer([embeddings[i] for i in validas])):
+            resultados[i] = r
+    return resultados
+
+
+# Cuenta lo que deja pasar y lo que no, con el ahorro estimado: cada cara
+# omitida cuesta lo que promedió un embedding real. Lo pueden compartir
+# varios hilos de inferencia.
+class ControlCalidad:
+    def __init__(self, det_score_min=DET_SCORE_MIN, tam_min=TAM_MIN, guinada_max=GUINADA_MAX,
+                 cabeceo_max=CABECEO_MAX, nitidez_min=NITIDEZ_MIN):
+        self.det_score_min = det_score_min
+        self.tam_min = tam_min
+        self.guinada_max = guinada_max
+        self.cabeceo_max = cabeceo_max
+        self.nitidez_min = nitidez_min
+        self.lock = threading.Lock()
+        self.caras = 0
+        self.rechazos = Counter()
+        self.embeddings = 0
+        self.segundos_embedding = 0.0
+        self.segundos_control = 0.0
+
+    def motivo(self, bbox, kps, det_score):
+        # Motivo de rechazo sin mirar la imagen, o None
+        if det_score < self.det_score_min:
+            return 'confianza'
+        if min(bbox[2] - bbox[0], bbox[3] - bbox[1]) < self.tam_min:
+            return 'pequeña'
+        if kps is not None:
+            guinada, cabeceo = pose(kps)
+            if abs(guinada) > self.guinada_max:
+                return 'perfil'
+            if abs(cabeceo) > self.cabeceo_max:
+                return 'cabeceo'
+        return None
+
+    def motivo_recorte(self, recorte):
+        return 'borrosa' if nitidez(recorte) < self.nitidez_min else None
+
+    def anotar(self, caras, rechazos, segundos):
+        # rechazos: motivos de las caras que no van a ArcFace
+        with self.lock:
+            self.caras += caras
+            self.rechazos.update(rechazos)
+            self.segundos_control += segundos
+        for motivo, n in Counter(rechazos).items():
+            metricas.contar('caras_sin_reconocer', n, motivo=motivo)
+        metricas.observar('calidad', segundos)
+
+    def anotar_embeddings(self, n, segundos):
+        with self.lock:
+            self.embeddings += n
+            self.segundos_embedding += segundos
+
+    def estadisticas(self):
+        with self.lock:
+            omitidas = sum(self.rechazos.values())
+            por_cara = self.segundos_embedding / self.embeddings if self.embeddings else 0.0
+            return {'caras': self.caras, 'omitidas': omitidas,
+                    'tasa': omitidas / self.caras if self.caras else 0.0,
+                    'rechazos': dict(self.rechazos), 'embeddings': self.embeddings,
+                    'ms_por_embedding': 1000 * por_cara,
+                    'ahorro_segundos': omitidas * por_cara,
+                    'control_segundos': self.segundos_control}
+
+
+def formatear_estadisticas(stats):
+    motivos = ", ".join(f"{m}: {n}" for m, n in sorted(stats['rechazos'].items(), key=lambda x: -x[1]))
+    return (f"Calidad: {100 * stats['tasa']:.0f}% de las caras sin reconocer "
+            f"({stats['omitidas']}/{stats['caras']}{'; ' + motivos if motivos else ''}), "
+            f"~{stats['ahorro_segundos']:.2f} s de ArcFace ahorrados "
+            f"({stats['ms_por_embedding']:.1f} ms/cara, control {stats['control_segundos']:.2f} s)")
@@ -0,0 +1,151 @@
+import time
+from collections import Counter
+
+import numpy as np
+
+from calidad import reconocer_validas
+from inferencia import asignar_embeddings, caras_y_recortes, reconocer_lote
+import metricas
+from movimiento import DetectorMovimiento
+import zonas
+
+# Detección recortada y de resolución adaptativa para los monitores de puerta:
+#   - ROIs: el detector corre solo sobre el rectángulo que cubre las regiones
+#     configuradas y se descartan las caras con el centro fuera de ellas. Por
+#     defecto, la franja de la puerta más un margen hacia cada oficina.
+#   - Resolución adaptativa: con la escena vacía el detector trabaja a 320 px;
+#     sube con caras chicas o muchas caras, y baja tras varios frames vacíos.
+#   - Movimiento: si la región no cambió y no hay nadie, no se corre el modelo.
+# Guarda estado entre frames: usar con un solo hilo de inferencia.
+TAMANOS_DET = (320, 480, 640)  # Tamaños de entrada del detector, de menor a mayor
+MARGEN_ROI = 100           # Píxeles a cada lado de las líneas de la puerta
+CARA_CHICA = 0.12          # Cara más angosta que esta fracción de la región -> más resolución
+MUCHAS_CARAS = 4           # Desde esta cantidad de caras -> resolución máxima
+VACIOS_PARA_BAJAR = 15     # Frames analizados sin caras antes de bajar un escalón
+MAX_SALTEOS = 30           # Frames quietos seguidos sin analizar antes de un control
+
+
+def rois_puerta(izquierda=zonas.ZONA_IZQUIERDA, derecha=zonas.ZONA_DERECHA, margen=MARGEN_ROI, alto=480):
+    # La puerta (entre las líneas) y lo justo de cada oficina para ver el cruce
+    return [(max(0, izquierda - margen), 0, derecha + margen, alto)]
+
+
+def texto_a_roi(texto):
+    x1, y1, x2, y2 = (int(v) for v in texto.split(','))
+    return (x1, y1, x2, y2)
+
+
+class DeteccionAdaptativa:
+    def __init__(self, app, galeria, rois=None, tamanos=TAMANOS_DET, adaptativa=True, movimiento=True,
+                 control=None):
+        self.app = app
+        self.galeria = galeria
+        self.control = control
+        self.rois = rois
+        self.tamanos = tuple(tamanos)
+        self.adaptativa = adaptativa
+        self.movimiento = movimiento
+        self.nivel = len(self.tamanos) - 1  # Arranca a resolución máxima
+        self.vacios = 0
+        self.salteos = 0
+        self.detector_movimiento = DetectorMovimiento()
+        self.ultimas = []
+        self.frames = 0
+        self.analizados = 0
+        self.por_tamano = Counter()
+
+    def region(self, frame):
+        # Rectángulo que cubre todas las ROIs, recortado al frame
+        alto, ancho = frame.shape[:2]
+        if not self.rois:
+            return 0, 0, ancho, alto
+        rois = np.asarray(self.rois)
+        x1, y1 = np.maximum(rois[:, :2].min(axis=0), 0)
+        x2, y2 = np.minimum(rois[:, 2:].max(axis=0), [ancho, alto])
+        return int(x1), int(y1), int(x2), int(y2)
+
+    def adaptar(self, bboxes, ancho_region):
+        if not self.adaptativa:
+            return
+        if len(bboxes) == 0:
+            self.vacios += 1
+            if self.vacios >= VACIOS_PARA_BAJAR and self.nivel > 0:
+                self.nivel -= 1
+                self.vacios = 0
+            return
+        self.vacios = 0
+        anchos = bboxes[:, 2] - bboxes[:, 0]
+        if len(bboxes) >= MUCHAS_CARAS:
+            self.nivel = len(self.tamanos) - 1
+        elif anchos.min() < CARA_CHICA * ancho_region and self.nivel < len(self.tamanos) - 1:
+            self.nivel += 1
+
+    def detectar(self, frame, region):
+        x1, y1, x2, y2 = region
+        tam = self.tamanos[self.nivel]
+        self.por_tamano[tam] += 1
+        with metricas.medir('deteccion'):
+            bboxes, kpss = self.app.det_model.detect(frame[y1:y2, x1:x2], input_size=(tam, tam),
+                                                     max_num=0, metric='default')
+        # De coordenadas del recorte a coordenadas del frame
+        bboxes[:, [0, 2]] += x1
+        bboxes[:, [1, 3]] += y1
+        if kpss is not None:
+            kpss[..., 0] += x1
+            kpss[..., 1] += y1
+        if self.rois:
+            cx = (bboxes[:, 0] + bboxes[:, 2]) / 2
+            cy = (bboxes[:, 1] + bboxes[:, 3]) / 2
+            dentro = np.zeros(len(bboxes), dtype=bool)
+            for rx1, ry1, rx2, ry2 in self.rois:
+                dentro |= (cx >= rx1) & (cx < rx2) & (cy >= ry1) & (cy < ry2)
+            bboxes = bboxes[dentro]
+            kpss = kpss[dentro] if kpss is not None else None
+        self.adaptar(bboxes, x2 - x1)
+        metricas.caras(len(bboxes))
+        return bboxes, kpss
+
+    def procesar(self, frame):
+        # Misma salida que deteccion_completa()
+        self.frames += 1
+        region = self.region(frame)
+        if self.movimiento and not self.detector_movimiento.hay_movimiento(frame, region) \
+                and self.salteos < MAX_SALTEOS:
+            # Escena quieta: las caras (si hay) siguen donde estaban
+            self.salteos += 1
+            metricas.contar('frames_salteados', motivo='sin_movimiento')
+            return [dict(cara, nuevo=False) for cara in self.ultimas]  # Embeddings repetidos
+        self.salteos = 0
+        self.analizados += 1
+
+        bboxes, kpss = self.detectar(frame, region)
+        rec_model = self.app.models['recognition']
+        t0 = time.perf_counter()
+        faces, recortes = caras_y_recortes(frame, bboxes, kpss, rec_model.input_size[0], self.control)
+        t1 = time.perf_counter()
+        embeddings = iter(reconocer_lote(rec_model, recortes))
+        t2 = time.perf_counter()
+        metricas.observar('reconocimiento', t2 - t0)
+        if self.control is not None and recortes:
+            self.control.anotar_embeddings(len(recortes), t2 - t1)
+        asignar_embeddings(faces, embeddings)
+        resultados = reconocer_validas(self.galeria, [face.embedding for face in faces])
+        self.ultimas = [{'id': None, 'bbox': face.bbox, 'nombre': nombre, 'score': score,
+                         'embedding': face.embedding, 'det_score': face.det_score, 'nuevo': True}
+                        for face, (nombre, score) in zip(faces, resultados)]
+        return [dict(cara) for cara in self.ultimas]
+
+    def estadisticas(self):
+        return {
+            'frames': self.frames,
+            'analizados': self.analizados,
+            'salteados': self.frames - self.analizados,
+            'tamano_actual': self.tamanos[self.nivel],
+            'por_tamano': dict(self.por_tamano),
+        }
+
+
+def formatear_estadisticas(datos):
+    tamanos = ', '.join(f"{t}px: {n}" for t, n in sorted(datos['por_tamano'].items()))
+    return (f"Detector: {datos['analizados']}/{datos['frames']} frames analizados "
+            f"({datos['salteados']} quietos salteados) | por tamaño: {tamanos or '-'}")
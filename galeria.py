@@ -0,0 +1,230 @@
+import copy
+import threading
+import time
+
+import numpy as np
+
+import almacen
+import metricas
+from indice import crear_indice
+
+THRESHOLD = 0.4  # Similitud mínima para reconocer
+INDICE = 'exacto'  # 'exacto' o 'ivf' (galerías de decenas de miles de personas)
+MAX_PLANTILLAS = 10  # Muestras que se conservan por persona
+RECARGA = 2.0  # Segundos entre revisiones del archivo de la galería (altas de otros procesos)
+
+
+def comparar_embedding(emb1, emb2):
+    return np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
+
+
+def normalizar(embeddings):
+    # Normaliza filas a norma L2 = 1 (float32 contiguo)
+    m = np.ascontiguousarray(np.atleast_2d(embeddings), dtype=np.float32)
+    normas = np.linalg.norm(m, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return m / normas
+
+
+def centroide(plantillas):
+    return normalizar(np.mean(plantillas, axis=0))[0]
+
+
+# Una fila del índice por persona, no por muestra: el centroide normalizado de
+# sus plantillas (hasta max_plantillas muestras normalizadas). Registrar otra vez
+# el mismo nombre suma una plantilla y actualiza el centroide; la galería crece
+# con la cantidad de personas. Todas las caras de un frame se buscan en una
+# sola llamada: 'exacto' compara contra todas las filas, 'ivf' solo contra las
+# listas más cercanas.
+class Galeria:
+    def __init__(self, empleados=(), threshold=THRESHOLD, dim=512, indice=INDICE,
+                 max_plantillas=MAX_PLANTILLAS):
+        self.threshold = threshold
+        self.max_plantillas = max_plantillas
+        self.nombres = []     # Nombre de cada fila del índice
+        self.ids = {}         # nombre -> fila
+        self.plantillas = []  # Por fila, matriz (muestras, dim) normalizada
+        self.tipo_indice = indice
+        self.indice = crear_indice(indice, dim)
+        self.origen = None    # Almacén del que se cargó y hasta dónde (ver almacen.leer_desde)
+        for emp in empleados:
+            self.agregar(emp['nombre'], emp['embedding'])
+
+    @classmethod
+    def desde_almacen(cls, ruta, threshold=THRESHOLD, indice=INDICE, max_plantillas=MAX_PLANTILLAS):
+        # El almacén guarda todas las muestras; se agrupan por nombre en desde_matriz()
+        lectura = almacen.leer_desde(ruta)
+        galeria = cls.desde_matriz(lectura.pop('nombres'), lectura.pop('filas'), threshold, indice, max_plantillas)
+        galeria.origen = dict(lectura, ruta=ruta)
+        return galeria
+
+    @classmethod
+    def desde_matriz(cls, nombres, matriz, threshold=THRESHOLD, indice=INDICE,
+                     max_plantillas=MAX_PLANTILLAS):
+        galeria = cls(threshold=threshold, dim=matriz.shape[1], indice=indice,
+                      max_plantillas=max_plantillas)
+        if len(matriz):
+            for nombre, emb in zip(nombres, normalizar(matriz)):
+                if nombre is None:
+                    continue  # Registro sin nombre (escritura interrumpida)
+                i = galeria.ids.get(nombre)
+                if i is None:
+                    galeria.ids[nombre] = len(galeria.nombres)
+                    galeria.nombres.append(nombre)
+                    galeria.plantillas.append(emb[None])
+                else:
+                    galeria.plantillas[i] = galeria.sumar_plantilla(galeria.plantillas[i], emb)
+        if galeria.nombres:
+            # Un solo alta al índice: el IVF entrena una vez
+            galeria.indice.agregar(np.stack([centroide(p) for p in galeria.plantillas]))
+        return galeria
+
+    def __len__(self):
+        return len(self.nombres)
+
+    @property
+    def matriz(self):
+        return self.indice.matriz
+
+    @property
+    def muestras(self):
+        return sum(len(p) for p in self.plantillas)
+
+    def sumar_plantilla(self, plantillas, embedding):
+        # Con el cupo lleno sale la plantilla más redundante (la más parecida a las demás)
+        plantillas = np.vstack([plantillas, embedding])
+        if len(plantillas) > self.max_plantillas:
+            redundancia = (plantillas @ plantillas.T).sum(axis=1)
+            plantillas = np.delete(plantillas, np.argmax(redundancia), axis=0)
+        return plantillas
+
+    def agregar(self, nombre, embedding):
+        emb = normalizar(embedding)
+        i = self.ids.get(nombre)
+        if i is None:
+            # Identidad nueva: el nombre va antes para que una fila visible siempre tenga nombre
+            self.ids[nombre] = len(self.nombres)
+            self.plantillas.append(emb)
+            self.nombres.append(nombre)
+            self.indice.agregar(emb)
+        else:
+            self.plantillas[i] = self.sumar_plantilla(self.plantillas[i], emb[0])
+            self.indice.actualizar(i, centroide(self.plantillas[i]))
+
+    def buscar(self, embeddings, k=1):
+        # Por cada cara, hasta k pares (nombre, score) sobre el umbral
+        if len(embeddings) == 0:
+            return []
+        if not self.nombres:
+            return [[] for _ in embeddings]
+        scores, idxs = self.indice.buscar(normalizar(embeddings), k)
+        resultados = []
+        for fila_s, fila_i in zip(scores, idxs):
+            resultados.append([(self.nombres[i], float(s))
+                               for s, i in zip(fila_s, fila_i) if i >= 0 and s > self.threshold])
+        return resultados
+
+    def reconocer(self, embeddings):
+        # Mismo contrato que el antiguo reconocer(), para todas las caras a la vez:
+        # lista de (nombre, score) con nombre None si no supera el umbral
+        if len(embeddings) == 0:
+            return []
+        if not self.nombres:
+            return [(None, 0) for _ in embeddings]
+        t0 = time.perf_counter()
+        scores, idxs = self.indice.buscar(normalizar(embeddings), 1)
+        metricas.observar('matching', time.perf_counter() - t0)
+        resultados = []
+        for s, i in zip(scores[:, 0], idxs[:, 0]):
+            score = float(s)
+            if i >= 0 and score > self.threshold:
+                resultados.append((self.nombres[i], score))
+            else:
+                resultados.append((None, max(score, 0)))
+        return resultados
+
+
+# Galería compartida con un monitor en marcha. Los cambios se hacen sobre una
+# copia y se publican con una sola asignación: los hilos de reconocimiento
+# siguen con la galería anterior mientras tanto, nunca ven una a medio
+# modificar y no esperan ningún lock. Se usa igual que una Galeria.
+# Si la galería vino de un almacén, vigilar() la mantiene al día con las altas
+# de otros procesos: cada RECARGA segundos se leen los 32 bytes de la
+# cabecera y, si cambió la generación, solo los registros nuevos.
+class GaleriaViva:
+    def __init__(self, galeria):
+        self.actual = galeria
+        self.lock = threading.RLock()  # Solo entre los que modifican
+        self.version = 0
+        self.detenido = threading.Event()
+
+    def __len__(self):
+        return len(self.actual)
+
+    def __getattr__(self, nombre):
+        # reconocer, buscar, nombres, matriz... de la galería publicada
+        if nombre.startswith('__'):
+            raise AttributeError(nombre)
+        return getattr(self.actual, nombre)
+
+    def modificar(self, funcion):
+        # funcion(galeria) cambia la copia; varias altas juntas = una sola copia
+        with self.lock:
+            nueva = copy.deepcopy(self.actual)
+            funcion(nueva)
+            self.actual = nueva
+            self.version += 1
+        return nueva
+
+    def agregar(self, nombre, embedding):
+        self.modificar(lambda galeria: galeria.agregar(nombre, embedding))
+
+    def reemplazar(self, galeria):
+        with self.lock:
+            self.actual = galeria
+            self.version += 1
+
+    def sincronizar(self):
+        # Trae los registros que se agregaron al almacén desde la última lectura
+        # (de este proceso o de otro); devuelve cuántos se aplicaron
+        with self.lock:
+            origen = self.actual.origen
+            if origen is None:
+                return 0
+            ruta = origen['ruta']
+            identidad, generacion, count = almacen.estado(ruta)
+            if identidad == origen['identidad'] and generacion == origen['generacion']:
+                return 0
+            if identidad != origen['identidad'] or count < origen['count']:
+                # Archivo reemplazado: se vuelve a cargar entero
+                actual = self.actual
+                self.reemplazar(Galeria.desde_almacen(ruta, actual.threshold, actual.tipo_indice,
+                                                      actual.max_plantillas))
+                return self.actual.origen['count']
+            lectura = almacen.leer_desde(ruta, origen['count'], origen['posicion'])
+            nuevos = [(n, emb) for n, emb in zip(lectura.pop('nombres'), lectura.pop('filas')) if n is not None]
+
+            def aplicar(galeria):
+                for nombre, emb in nuevos:
+                    galeria.agregar(nombre, emb)
+                galeria.origen = dict(lectura, ruta=ruta)
+            self.modificar(aplicar)
+            return len(nuevos)
+
+    def recargar(self, cada):
+        while not self.detenido.wait(cada):
+            try:
+                n = self.sincronizar()
+            except (OSError, ValueError) as e:
+                print(f"Galería: no se pudo releer ({e})")
+                continue
+            if n:
+                print(f"Galería: {n} registros nuevos del almacén ({len(self)} personas)")
+
+    def vigilar(self, cada=RECARGA):
+        if cada and self.actual.origen is not None:
+            threading.Thread(target=self.recargar, args=(cada,), daemon=True).start()
+        return self
+
+    def detener(self):
+        self.detenido.set()
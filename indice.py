@@ -0,0 +1,179 @@
+import numpy as np
+
+# Índices de búsqueda para la galería. Reciben embeddings ya normalizados
+# (float32, norma 1) y devuelven similitud coseno.
+#   IndiceExacto: producto contra todas las filas (O(N) por cara)
+#   IndiceIVF:    k-means en listas invertidas; solo se revisan nprobe listas
+# buscar(consultas, k) -> (scores, idxs) de forma (caras, k); idx -1 = sin candidato.
+NPROBE = 8              # Listas revisadas por consulta
+MIN_ENTRENAMIENTO = 4096  # Por debajo de esto el IVF busca como el exacto
+ITERACIONES_KMEANS = 10
+MUESTRA_POR_LISTA = 64  # Puntos de entrenamiento por centroide
+
+
+class IndiceExacto:
+    def __init__(self, dim=512, capacidad=1024):
+        self.datos = np.empty((capacidad, dim), dtype=np.float32)
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def matriz(self):
+        return self.datos[:self.n]
+
+    def agregar(self, vectores):
+        # Inserción incremental con capacidad que crece al doble (sin copiar todo en cada alta)
+        vectores = np.atleast_2d(vectores)
+        nuevo_n = self.n + len(vectores)
+        if nuevo_n > len(self.datos):
+            capacidad = max(nuevo_n, 2 * len(self.datos))
+            datos = np.empty((capacidad, self.datos.shape[1]), dtype=np.float32)
+            datos[:self.n] = self.datos[:self.n]
+            self.datos = datos
+        self.datos[self.n:nuevo_n] = vectores
+        ids = np.arange(self.n, nuevo_n)
+        # Se publica n al final: un hilo que busca en paralelo nunca ve filas a medio escribir
+        self.n = nuevo_n
+        return ids
+
+    def actualizar(self, i, vector):
+        # Reemplaza la fila i (p. ej. el centroide de una identidad que sumó una muestra)
+        self.datos[i] = vector
+
+    def mejores(self, scores, k):
+        # Top-k por fila; en empate gana el índice menor, como el bucle original
+        if k == 1:
+            idxs = np.argmax(scores, axis=1)[:, None]
+        elif k < scores.shape[1] // 4:
+            parte = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            orden = np.lexsort((parte, -np.take_along_axis(scores, parte, axis=1)), axis=1)
+            idxs = np.take_along_axis(parte, orden, axis=1)
+        else:
+            idxs = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(scores, idxs, axis=1), idxs
+
+    def buscar(self, consultas, k=1):
+        matriz = self.matriz
+        k = min(k, len(matriz))
+        if k == 0:
+            return (np.zeros((len(consultas), 0), dtype=np.float32),
+                    np.zeros((len(consultas), 0), dtype=int))
+        return self.mejores(consultas @ matriz.T, k)
+
+
+class IndiceIVF(IndiceExacto):
+    # Tras entrenar, las filas se reordenan por lista para que cada lista sea un
+    # rango contiguo (ordenada[cortes[c]:cortes[c + 1]]). Las altas posteriores van a
+    # un búfer chico que se busca exacto y se reparte en las listas cada tanto.
+    def __init__(self, dim=512, capacidad=1024, nlist=None, nprobe=NPROBE,
+                 min_entrenamiento=MIN_ENTRENAMIENTO, semilla=0):
+        super().__init__(dim, capacidad)
+        self.nlist_fijo = nlist
+        self.nprobe = nprobe
+        self.min_entrenamiento = min_entrenamiento
+        self.rng = np.random.default_rng(semilla)
+        self.centroides = None
+        self.n_entrenado = 0
+        self.n_repartido = 0
+
+    def entrenar(self):
+        # k-means esférico sobre una muestra
+        matriz = self.matriz
+        nlist = self.nlist_fijo or max(1, int(np.sqrt(len(matriz))))
+        muestra = matriz
+        if len(matriz) > nlist * MUESTRA_POR_LISTA:
+            muestra = matriz[self.rng.choice(len(matriz), nlist * MUESTRA_POR_LISTA, replace=False)]
+        centroides = muestra[self.rng.choice(len(muestra), nlist, replace=False)].copy()
+        for _ in range(ITERACIONES_KMEANS):
+            asignacion = np.argmax(muestra @ centroides.T, axis=1)
+            sumas = np.zeros_like(centroides)
+            np.add.at(sumas, asignacion, muestra)
+            normas = np.linalg.norm(sumas, axis=1, keepdims=True)
+            vacios = normas[:, 0] == 0
+            # Un centroide sin puntos se reubica en un punto al azar
+            sumas[vacios] = muestra[self.rng.choice(len(muestra), vacios.sum())]
+            normas[vacios] = 1.0
+            centroides = sumas / normas
+        self.centroides = centroides.astype(np.float32)
+        self.n_entrenado = len(matriz)
+        self.repartir()
+
+    def repartir(self):
+        # Reconstruye las listas contiguas con todas las filas actuales
+        n = self.n
+        asignacion = self.asignar(self.datos[:n])
+        orden = np.argsort(asignacion, kind='stable')
+        self.cortes = np.searchsorted(asignacion[orden], np.arange(len(self.centroides) + 1))
+        self.ids_ordenados = orden
+        self.ordenada = self.datos[orden]
+        self.n_repartido = n
+
+    def asignar(self, vectores, bloque=65536):
+        return np.concatenate([np.argmax(vectores[i:i + bloque] @ self.centroides.T, axis=1)
+                               for i in range(0, len(vectores), bloque)])
+
+    def actualizar(self, i, vector):
+        # La fila queda en su lista actual aunque ahora esté más cerca de otra; el
+        # próximo reparto la reubica. Las altas son raras: la búsqueda lineal alcanza.
+        super().actualizar(i, vector)
+        if self.centroides is not None and i < self.n_repartido:
+            self.ordenada[np.flatnonzero(self.ids_ordenados == i)[0]] = vector
+
+    def agregar(self, vectores):
+        ids = super().agregar(vectores)
+        if self.centroides is None:
+            if self.n >= self.min_entrenamiento:
+                self.entrenar()
+        elif self.n > 4 * self.n_entrenado:
+            # La galería creció mucho desde el entrenamiento: los centroides ya no la representan
+            self.entrenar()
+        elif self.n - self.n_repartido > max(1024, self.n_repartido // 10):
+            self.repartir()
+        return ids
+
+    def fusionar(self, scores, idxs, filas, nuevos_s, nuevos_i, k):
+        # Mezcla el top-k acumulado de las filas dadas con candidatos nuevos
+        comb_s = np.concatenate([scores[filas], nuevos_s], axis=1)
+        comb_i = np.concatenate([idxs[filas], nuevos_i], axis=1)
+        top_s, pos = self.mejores(comb_s, min(k, comb_s.shape[1]))
+        scores[filas, :top_s.shape[1]] = top_s
+        idxs[filas, :top_s.shape[1]] = np.take_along_axis(comb_i, pos, axis=1)
+
+    def buscar(self, consultas, k=1):
+        if self.centroides is None:
+            return super().buscar(consultas, k)
+        nq = len(consultas)
+        scores = np.full((nq, k), -np.inf, dtype=np.float32)
+        idxs = np.full((nq, k), -1, dtype=int)
+        nprobe = min(self.nprobe, len(self.centroides))
+        cercanas = np.argpartition(-(consultas @ self.centroides.T), nprobe - 1, axis=1)[:, :nprobe]
+
+        # Se recorre cada lista una vez, con todas las consultas que la visitan
+        plano = cercanas.ravel()
+        orden = np.argsort(plano, kind='stable')
+        listas, inicios = np.unique(plano[orden], return_index=True)
+        for c, grupo in zip(listas, np.split(orden // nprobe, inicios[1:])):
+            a, b = self.cortes[c], self.cortes[c + 1]
+            if a == b:
+                continue
+            s = consultas[grupo] @ self.ordenada[a:b].T
+            self.fusionar(scores, idxs, grupo, s,
+                          np.broadcast_to(self.ids_ordenados[a:b], s.shape), k)
+
+        # Altas todavía no repartidas: búsqueda exacta
+        n = self.n
+        if n > self.n_repartido:
+            s = consultas @ self.datos[self.n_repartido:n].T
+            todas = np.arange(nq)
+            self.fusionar(scores, idxs, todas, s,
+                          np.broadcast_to(np.arange(self.n_repartido, n), s.shape), k)
+        return scores, idxs
+
+
+INDICES = {'exacto': IndiceExacto, 'ivf': IndiceIVF}
+
+
+def crear_indice(tipo='exacto', dim=512, **kwargs):
+    return INDICES[tipo](dim=dim, **kwargs)
@@ -0,0 +1,240 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+import metricas
+
+# Inferencia por lotes: junta caras de varios frames (o cámaras) y las manda
+# al modelo ArcFace en un solo batch ONNX. La detección también va por lotes
+# cuando el modelo SCRFD tiene el batch dinámico; si no, se hace frame a frame.
+MAX_LOTE = 8       # Frames por lote
+ESPERA_MAX = 0.01  # Segundos que se espera a completar un lote
+MAX_CARAS = 32     # Caras por batch de reconocimiento
+
+
+def soporta_lote(det_model):
+    forma = det_model.session.get_inputs()[0].shape
+    return det_model.batched and not isinstance(forma[0], int)
+
+
+def preparar_deteccion(det_model, img):
+    # Mismo redimensionado que SCRFD.detect: conserva el aspecto y rellena con negro
+    ancho, alto = det_model.input_size
+    if float(img.shape[0]) / img.shape[1] > float(alto) / ancho:
+        nuevo_alto = alto
+        nuevo_ancho = int(nuevo_alto / (float(img.shape[0]) / img.shape[1]))
+    else:
+        nuevo_ancho = ancho
+        nuevo_alto = int(nuevo_ancho * float(img.shape[0]) / img.shape[1])
+    escala = float(nuevo_alto) / img.shape[0]
+    det_img = np.zeros((alto, ancho, 3), dtype=np.uint8)
+    det_img[:nuevo_alto, :nuevo_ancho, :] = cv2.resize(img, (nuevo_ancho, nuevo_alto))
+    return det_img, escala
+
+
+def centros_anclas(det_model, alto, ancho, stride):
+    clave = (alto, ancho, stride)
+    if clave not in det_model.center_cache:
+        centros = np.stack(np.mgrid[:alto, :ancho][::-1], axis=-1).astype(np.float32)
+        centros = (centros * stride).reshape((-1, 2))
+        if det_model._num_anchors > 1:
+            centros = np.stack([centros] * det_model._num_anchors, axis=1).reshape((-1, 2))
+        if len(det_model.center_cache) < 100:
+            det_model.center_cache[clave] = centros
+        return centros
+    return det_model.center_cache[clave]
+
+
+def decodificar(det_model, net_outs, b, alto_in, ancho_in, escala):
+    # Decodifica la salida de la imagen b del batch (como SCRFD.forward + detect)
+    from insightface.model_zoo.scrfd import distance2bbox, distance2kps
+    fmc = det_model.fmc
+    scores_l, bboxes_l, kpss_l = [], [], []
+    for idx, stride in enumerate(det_model._feat_stride_fpn):
+        scores = net_outs[idx][b]
+        bbox_preds = net_outs[idx + fmc][b] * stride
+        centros = centros_anclas(det_model, alto_in // stride, ancho_in // stride, stride)
+        pos = np.where(scores >= det_model.det_thresh)[0]
+        scores_l.append(scores[pos])
+        bboxes_l.append(distance2bbox(centros, bbox_preds)[pos])
+        if det_model.use_kps:
+            kps_preds = net_outs[idx + fmc * 2][b] * stride
+            kpss = distance2kps(centros, kps_preds)
+            kpss_l.append(kpss.reshape((kpss.shape[0], -1, 2))[pos])
+    scores = np.vstack(scores_l)
+    orden = scores.ravel().argsort()[::-1]
+    pre_det = np.hstack((np.vstack(bboxes_l) / escala, scores)).astype(np.float32, copy=False)
+    pre_det = pre_det[orden, :]
+    keep = det_model.nms(pre_det)
+    det = pre_det[keep, :]
+    kpss = None
+    if det_model.use_kps:
+        kpss = (np.vstack(kpss_l) / escala)[orden][keep]
+    return det, kpss
+
+
+def detectar_lote(det_model, frames):
+    # Devuelve [(bboxes, kpss)] por frame
+    if len(frames) <= 1 or not soporta_lote(det_model):
+        return [det_model.detect(frame, max_num=0, metric='default') for frame in frames]
+    preparados = [preparar_deteccion(det_model, frame) for frame in frames]
+    blob = cv2.dnn.blobFromImages([img for img, _ in preparados], 1.0 / det_model.input_std,
+                                  det_model.input_size, (det_model.input_mean,) * 3, swapRB=True)
+    net_outs = det_model.session.run(det_model.output_names, {det_model.input_name: blob})
+    return [decodificar(det_model, net_outs, b, blob.shape[2], blob.shape[3], escala)
+            for b, (_, escala) in enumerate(preparados)]
+
+
+def reconocer_lote(rec_model, recortes, max_caras=MAX_CARAS):
+    # Embeddings de caras ya alineadas, en batches de hasta max_caras
+    if not recortes:
+        return np.empty((0, 512), dtype=np.float32)
+    salidas = [rec_model.get_feat(recortes[i:i + max_caras])
+               for i in range(0, len(recortes), max_caras)]
+    return np.concatenate(salidas)
+
+
+def caras_y_recortes(frame, bboxes, kpss, tam, control=None):
+    # Face (sin embedding) y recorte alineado para ArcFace de cada detección.
+    # Con un ControlCalidad, solo hay recorte de las caras que lo pasan; las
+    # demás llevan el motivo en face.calidad y se quedan sin embedding.
+    from insightface.app.common import Face
+    from insightface.utils import face_align
+    faces, recortes, rechazos = [], [], []
+    segundos = 0.0
+    for i in range(bboxes.shape[0]):
+        kps = kpss[i] if kpss is not None else None
+        face = Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4])
+        faces.append(face)
+        if control is None:
+            recortes.append(face_align.norm_crop(frame, landmark=kps, image_size=tam))
+            continue
+        t0 = time.perf_counter()
+        motivo = control.motivo(face.bbox, kps, face.det_score)
+        segundos += time.perf_counter() - t0
+        if motivo is None:
+            # La nitidez se mide en el recorte alineado, que igual hace falta para ArcFace
+            recorte = face_align.norm_crop(frame, landmark=kps, image_size=tam)
+            t0 = time.perf_counter()
+            motivo = control.motivo_recorte(recorte)
+            segundos += time.perf_counter() - t0
+        if motivo:
+            face.calidad = motivo
+            rechazos.append(motivo)
+        else:
+            recortes.append(recorte)
+    if control is not None:
+        control.anotar(len(faces), rechazos, segundos)
+    return faces, recortes
+
+
+def asignar_embeddings(faces, embeddings):
+    # embeddings: iterador en el orden de los recortes de caras_y_recortes()
+    for face in faces:
+        if not face.calidad:
+            face.embedding = next(embeddings)
+
+
+def analizar_lote(app, frames, max_caras=MAX_CARAS, control=None):
+    # Equivalente a [app.get(frame) for frame in frames] con detección y
+    # reconocimiento por lotes (solo detección + ArcFace). Con control, las
+    # caras que no lo pasan quedan con embedding None (ver calidad.py).
+    rec_model = app.models['recognition']
+    tam = rec_model.input_size[0]
+    por_frame, recortes = [], []
+    t0 = time.perf_counter()
+    detecciones = detectar_lote(app.det_model, frames)
+    t1 = time.perf_counter()
+    for frame, (bboxes, kpss) in zip(frames, detecciones):
+        faces, recortes_frame = caras_y_recortes(frame, bboxes, kpss, tam, control)
+        por_frame.append(faces)
+        recortes += recortes_frame
+    t2 = time.perf_counter()
+    embeddings = iter(reconocer_lote(rec_model, recortes, max_caras))
+    t3 = time.perf_counter()
+    if control is not None and recortes:
+        control.anotar_embeddings(len(recortes), t3 - t2)
+    # En un lote cada frame cuenta con su parte del tiempo del lote
+    n = len(frames)
+    metricas.observar('deteccion', (t1 - t0) / n, n)
+    metricas.observar('reconocimiento', (t3 - t1) / n, n)
+    for faces in por_frame:
+        metricas.caras(len(faces))
+    for faces in por_frame:
+        asignar_embeddings(faces, embeddings)
+    return por_frame
+
+
+def analizar(app, frame, control=None):
+    # Equivalente instrumentado de app.get(frame)
+    return analizar_lote(app, [frame], control=control)[0]
+
+
+# Agrupa pedidos de varios hilos (workers del pipeline, cámaras) en lotes:
+# se despacha cuando hay max_lote frames o pasó espera_max desde el primero.
+class InferenciaPorLotes:
+    def __init__(self, app, max_lote=MAX_LOTE, espera_max=ESPERA_MAX, max_caras=MAX_CARAS, control=None):
+        self.app = app
+        self.control = control
+        self.max_lote = max_lote
+        self.espera_max = espera_max
+        self.max_caras = max_caras
+        self.pendientes = []
+        self.cond = threading.Condition()
+        self.detenido = False
+        self.lotes = 0
+        self.frames = 0
+        self.hilo = threading.Thread(target=self.despachar, daemon=True)
+        self.hilo.start()
+
+    def enviar(self, frame):
+        futuro = Future()
+        with self.cond:
+            self.pendientes.append((frame, futuro))
+            self.cond.notify_all()
+        return futuro
+
+    def get(self, frame):
+        # Misma firma que FaceAnalysis.get, pero bloquea hasta que se procese el lote
+        return self.enviar(frame).result()
+
+    def tomar_lote(self):
+        with self.cond:
+            while not self.pendientes and not self.detenido:
+                self.cond.wait(0.1)
+            if self.detenido and not self.pendientes:
+                return None
+            limite = time.monotonic() + self.espera_max
+            while len(self.pendientes) < self.max_lote and not self.detenido:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                self.cond.wait(restante)
+            lote = self.pendientes[:self.max_lote]
+            del self.pendientes[:self.max_lote]
+            return lote
+
+    def despachar(self):
+        while True:
+            lote = self.tomar_lote()
+            if lote is None:
+                return
+            try:
+                salidas = analizar_lote(self.app, [frame for frame, _ in lote], self.max_caras, self.control)
+            except Exception as e:
+                for _, futuro in lote:
+                    futuro.set_exception(e)
+                continue
+            self.lotes += 1
+            self.frames += len(lote)
+            for (_, futuro), faces in zip(lote, salidas):
+                futuro.set_result(faces)
+
+    def detener(self):
+        with self.cond:
+            self.detenido = True
+            self.cond.notify_all()
+        self.hilo.join()
@@ -0,0 +1,212 @@
+import multiprocessing as mp
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import cv2
+
+import almacen
+from basedatos import abrir_base
+from galeria import Galeria
+from modelo import obtener_modelo
+from seguimiento import Rastreador, deteccion_completa
+import zonas
+
+# Asistencia desde videos grabados, tan rápido como dé el hardware:
+#   python lote.py video1.mp4 [video2.mp4 ...] [--cada N] [--procesos P]
+#                  [--inicio 2026-01-30T08:00:00] [--registrar]
+# Cada archivo se procesa en un proceso del pool; dentro, otro proceso
+# decodifica y le pasa los frames por una cola acotada. Los eventos
+# ENTRADA/SALIDA salen de las mismas zonas que en vivo (ZONAS_CAMARA en
+# ZONAS_CONFIG, con la misma histéresis), con la hora del video (inicio +
+# posición en el archivo).
+
+# Configuración
+DB_FILE = '/app/empleados.gal'
+DB_JSON = '/app/empleados.json'  # Formato anterior, se migra al arrancar
+DB_ASISTENCIA = '/app/asistencia.db'  # Eventos de asistencia (SQLite, ver basedatos.py)
+LOGS_DIR = '/app/asistencia_log'  # Bitácora .jsonl anterior, se importa una vez
+LOGS_JSON = '/app/asistencia_log.json'  # Formato anterior, se importa una vez
+THRESHOLD = 0.4
+PROVIDERS = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+CTX_ID = 0
+DET_SIZE = (640, 640)
+CADA = 1             # Analizar 1 de cada N frames del video
+PROCESOS = 2         # Archivos en paralelo
+COLA_FRAMES = 16     # Frames decodificados en espera por archivo
+ANCHO, ALTO = 640, 480  # Se escala a la resolución de la cámara en vivo (las zonas están en esos píxeles)
+FPS_POR_DEFECTO = 30.0  # Si el contenedor no informa los fps
+ZONAS_CONFIG = '/app/zonas.json'  # Zonas por cámara (ver zonas.py); sin archivo, las dos líneas de zonas.py
+ZONAS_CAMARA = 'principal'        # Cámara que grabó los videos
+
+# Estado de cada proceso del pool (se carga una vez por proceso, no por archivo)
+_worker = {}
+
+
+def cargar_db():
+    # Migración única desde el formato JSON anterior
+    if not os.path.exists(DB_FILE) and os.path.exists(DB_JSON):
+        almacen.migrar_json(DB_JSON, DB_FILE)
+    if not os.path.exists(DB_FILE):
+        almacen.crear(DB_FILE)
+    return Galeria.desde_almacen(DB_FILE, THRESHOLD)
+
+
+def decodificar(ruta, cola, cada, ancho, alto):
+    # Proceso decodificador: manda fps, luego (n, segundo, frame) y al final ('fin', frames leídos)
+    cap = cv2.VideoCapture(ruta)
+    n = 0
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or FPS_POR_DEFECTO
+        cola.put(fps)
+        while cap.isOpened():
+            if n % cada:
+                # Los frames salteados se leen del contenedor pero no se convierten
+                if not cap.grab():
+                    break
+                n += 1
+                continue
+            ret, frame = cap.read()
+            if not ret:
+                break
+            segundo = cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if segundo <= 0 and n > 0:
+                segundo = n / fps
+            if ancho and (frame.shape[1], frame.shape[0]) != (ancho, alto):
+                frame = cv2.resize(frame, (ancho, alto))
+            cola.put((n, segundo, frame))
+            n += 1
+    finally:
+        cap.release()
+        cola.put(('fin', n))
+
+
+def iniciar_worker(db_file, threshold, providers, ctx_id, det_size):
+    # Modelo y galería una sola vez por proceso; se calienta para no cargar el primer archivo
+    app = obtener_modelo(providers, ctx_id=ctx_id, det_size=det_size)
+    app.calentar()
+    _worker['app'] = app
+    _worker['galeria'] = Galeria.desde_almacen(db_file, threshold)
+
+
+def inicio_por_defecto(ruta, duracion):
+    # Sin --inicio se asume que la grabación terminó al modificarse el archivo
+    return datetime.fromtimestamp(os.path.getmtime(ruta)) - timedelta(seconds=duracion)
+
+
+def procesar_video(ruta, cada=CADA, inicio=None, zona_izquierda=zonas.ZONA_IZQUIERDA,
+                   zona_derecha=zonas.ZONA_DERECHA, ancho=ANCHO, alto=ALTO, camara=ZONAS_CAMARA):
+    app, galeria = _worker['app'], _worker['galeria']
+    ctx = mp.get_context('spawn')
+    cola = ctx.Queue(COLA_FRAMES)
+    decodificador = ctx.Process(target=decodificar, args=(ruta, cola, cada, ancho, alto), daemon=True)
+    t0 = time.perf_counter()
+    decodificador.start()
+
+    fps = cola.get()
+    rastreador = Rastreador()
+    motor = zonas.cargar(ZONAS_CONFIG, camara, zona_izquierda, zona_derecha)
+    eventos = []
+    analizados = 0
+    while True:
+        item = cola.get()
+        if item[0] == 'fin':
+            frames = item[1]
+            break
+        n, segundo, frame = item
+        analizados += 1
+        resultado = deteccion_completa(app, galeria, frame)
+        # El tiempo del video maneja la expiración de tracks, no el reloj de pared
+        ids = rastreador.actualizar(resultado, ahora=segundo)
+        tracks = [rastreador.tracks[tid] for tid in ids]
+        centros = [((c['bbox'][0] + c['bbox'][2]) / 2, (c['bbox'][1] + c['bbox'][3]) / 2) for c in resultado]
+        # Un cruce anterior a la identificación sale con el segundo y frame en que ocurrió
+        for track, cruce, (m, cuando) in zonas.por_registrar(tracks, motor.cruces(tracks, centros), (n, segundo)):
+            eventos.append({'nombre': track['nombre'], 'tipo': cruce,
+                            'segundo': round(cuando, 3), 'frame': m})
+    decodificador.join()
+    segundos = time.perf_counter() - t0
+    if not frames:
+        raise IOError(f"No se puede leer {ruta}")
+
+    duracion = frames / fps
+    inicio = inicio or inicio_por_defecto(ruta, duracion)
+    for evento in eventos:
+        evento['timestamp'] = (inicio + timedelta(seconds=evento['segundo'])).isoformat()
+    return {
+        'archivo': ruta,
+        'eventos': eventos,
+        'frames': frames,
+        'analizados': analizados,
+        'duracion': duracion,
+        'segundos': segundos,
+        'fps': frames / segundos,
+        'tiempo_real': duracion / segundos,  # >1 = más rápido que el video
+    }
+
+
+def procesar_lote(rutas, cada=CADA, procesos=PROCESOS, inicio=None, bitacora=None):
+    t0 = time.perf_counter()
+    resumenes = []
+    # spawn: los procesos no heredan hilos ni sesiones CUDA del proceso padre
+    with ProcessPoolExecutor(max_workers=min(procesos, len(rutas)), mp_context=mp.get_context('spawn'),
+                             initializer=iniciar_worker,
+                             initargs=(DB_FILE, THRESHOLD, PROVIDERS, CTX_ID, DET_SIZE)) as pool:
+        futuros = {pool.submit(procesar_video, ruta, cada, inicio): ruta for ruta in rutas}
+        for futuro in as_completed(futuros):
+            try:
+                r = futuro.result()
+            except Exception as e:
+                print(f"Error en {futuros[futuro]}: {e}")
+                continue
+            resumenes.append(r)
+            print(f"{r['archivo']}: {r['frames']} frames ({r['analizados']} analizados) | "
+                  f"{r['fps']:.1f} fps | {r['tiempo_real']:.1f}x tiempo real | "
+                  f"{len(r['eventos'])} eventos")
+            for evento in r['eventos']:
+                print(f"  [{evento['timestamp'][11:19]}] {evento['tipo']}: {evento['nombre']}")
+    segundos = time.perf_counter() - t0
+
+    # Una sola escritura ordenada a la base, desde este proceso
+    eventos = sorted(({**e, 'camara': os.path.basename(r['archivo'])}
+                      for r in resumenes for e in r['eventos']), key=lambda e: e['timestamp'])
+    if bitacora is not None:
+        for evento in eventos:
+            bitacora.escribir(evento)
+        bitacora.sincronizar()
+
+    frames = sum(r['frames'] for r in resumenes)
+    duracion = sum(r['duracion'] for r in resumenes)
+    print(f"Total: {len(resumenes)}/{len(rutas)} archivos | {frames} frames en {segundos:.1f} s | "
+          f"{frames / segundos:.1f} fps | {duracion / segundos:.1f}x tiempo real | "
+          f"{len(eventos)} eventos")
+    return eventos
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    opciones = {'--cada': CADA, '--procesos': PROCESOS, '--inicio': None}
+    for opcion in list(opciones):
+        if opcion in args:
+            i = args.index(opcion)
+            opciones[opcion] = args[i + 1]
+            del args[i:i + 2]
+    registrar = '--registrar' in args
+    if registrar:
+        args.remove('--registrar')
+    if not args:
+        print("Uso:")
+        print("  python lote.py video1.mp4 [video2.mp4 ...] [--cada N] [--procesos P]")
+        print("                 [--inicio 2026-01-30T08:00:00] [--registrar]")
+        print("  --inicio   hora de comienzo de la grabación (por defecto, fecha del archivo - duración)")
+        print("  --registrar escribe los eventos en la base de asistencia")
+        sys.exit(1)
+
+    inicio = datetime.fromisoformat(opciones['--inicio']) if opciones['--inicio'] else None
+    print(f"Empleados: {len(cargar_db())} | Archivos: {len(args)}")
+    bitacora = abrir_base(DB_ASISTENCIA, LOGS_JSON, LOGS_DIR) if registrar else None
+    procesar_lote(args, int(opciones['--cada']), int(opciones['--procesos']), inicio, bitacora)
+    if bitacora is not None:
+        bitacora.cerrar()
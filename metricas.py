@@ -0,0 +1,283 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Métricas de los monitores en vivo, pensadas para quedar siempre activas:
+# observar una latencia es un bisect y una suma bajo un lock (~1 µs).
+#   metricas.observar('deteccion', segundos)      histograma por etapa
+#   with metricas.medir('seguimiento'): ...
+#   metricas.caras(n)                             caras por frame
+#   metricas.medidor('frames_descartados', f)     se lee recién al exportar
+#   metricas.iniciar(puerto, ruta_json)           http://127.0.0.1:9108/metrics (+ /metrics.json)
+# Etapas: captura, deteccion, calidad, reconocimiento, matching, seguimiento,
+# render, escritura_bitacora. Tiempos en segundos (Prometheus); el JSON los da en ms.
+PREFIJO = 'asistencia'
+HOST = '127.0.0.1'  # Solo local; exponer hacia afuera con un proxy si hace falta
+PUERTO = 9108
+CADA_JSON = 60.0    # Segundos entre volcados del JSON
+LIMITES_SEGUNDOS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+LIMITES_CARAS = (0, 1, 2, 3, 5, 8, 13, 21)
+
+
+class Histograma:
+    def __init__(self, limites):
+        self.limites = tuple(limites)
+        self.cubetas = [0] * (len(self.limites) + 1)  # La última es +Inf
+        self.suma = 0.0
+        self.cuenta = 0
+        self.lock = threading.Lock()
+
+    def observar(self, valor, n=1):
+        # n > 1: un lote de n frames que costó 'valor' cada uno
+        i = bisect_left(self.limites, valor)
+        with self.lock:
+            self.cubetas[i] += n
+            self.suma += valor * n
+            self.cuenta += n
+
+    def copia(self):
+        with self.lock:
+            return list(self.cubetas), self.suma, self.cuenta
+
+    def cuantil(self, q, cubetas=None, cuenta=None):
+        # Estimado por interpolación lineal dentro de la cubeta, como histogram_quantile()
+        if cubetas is None:
+            cubetas, _, cuenta = self.copia()
+        if not cuenta:
+            return 0.0
+        objetivo = q * cuenta
+        acumulado = 0
+        for i, c in enumerate(cubetas):
+            if acumulado + c >= objetivo and c:
+                if i == len(self.limites):
+                    return self.limites[-1]
+                inferior = self.limites[i - 1] if i else 0.0
+                return inferior + (self.limites[i] - inferior) * (objetivo - acumulado) / c
+            acumulado += c
+        return self.limites[-1]
+
+    def resumen(self, escala=1.0):
+        cubetas, suma, cuenta = self.copia()
+        return {
+            'cuenta': cuenta,
+            'media': escala * suma / cuenta if cuenta else 0.0,
+            'p50': escala * self.cuantil(0.50, cubetas, cuenta),
+            'p95': escala * self.cuantil(0.95, cubetas, cuenta),
+            'p99': escala * self.cuantil(0.99, cubetas, cuenta),
+        }
+
+
+def etiquetas_texto(etiquetas, extra=()):
+    pares = list(etiquetas) + list(extra)
+    if not pares:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pares) + '}'
+
+
+def numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Metricas:
+    def __init__(self, prefijo=PREFIJO):
+        self.prefijo = prefijo
+        self.lock = threading.Lock()
+        self.histogramas = {}  # (familia, etiquetas) -> Histograma
+        self.contadores = {}   # (familia, etiquetas) -> valor
+        self.medidores = {}    # (familia, etiquetas) -> (tipo, función)
+        self.ayudas = {}
+        self.inicio = time.time()
+
+    def histograma(self, familia, limites=LIMITES_SEGUNDOS, ayuda='', **etiquetas):
+        clave = (familia, tuple(sorted(etiquetas.items())))
+        h = self.histogramas.get(clave)
+        if h is None:
+            with self.lock:
+                h = self.histogramas.setdefault(clave, Histograma(limites))
+                self.ayudas.setdefault(familia, ayuda)
+        return h
+
+    def observar(self, etapa, segundos, n=1):
+        self.histograma('etapa_segundos', ayuda='Tiempo por frame de cada etapa',
+                        etapa=etapa).observar(segundos, n)
+
+    @contextmanager
+    def medir(self, etapa):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(etapa, time.perf_counter() - t0)
+
+    def caras(self, n):
+        self.histograma('caras_por_frame', LIMITES_CARAS, 'Caras detectadas por frame').observar(n)
+
+    def contar(self, familia, n=1, **etiquetas):
+        clave = (familia, tuple(sorted(etiquetas.items())))
+        with self.lock:
+            self.contadores[clave] = self.contadores.get(clave, 0) + n
+
+    def medidor(self, familia, funcion, tipo='gauge', **etiquetas):
+        # funcion() se llama solo al exportar: cero costo en el camino de cada frame
+        with self.lock:
+            self.medidores[(familia, tuple(sorted(etiquetas.items())))] = (tipo, funcion)
+
+    def leer_medidores(self):
+        with self.lock:
+            medidores = list(self.medidores.items())
+        valores = []
+        for (familia, etiquetas), (tipo, funcion) in medidores:
+            try:
+                valores.append((familia, etiquetas, tipo, funcion()))
+            except Exception:
+                continue  # Un medidor roto no tapa al resto
+        return valores
+
+    def texto(self):
+        # Formato de exposición de Prometheus (text/plain 0.0.4)
+        lineas = []
+        vistas = set()
+
+        def cabecera(familia, tipo):
+            if familia not in vistas:
+                vistas.add(familia)
+                if self.ayudas.get(familia):
+                    lineas.append(f"# HELP {self.prefijo}_{familia} {self.ayudas[familia]}")
+                lineas.append(f"# TYPE {self.prefijo}_{familia} {tipo}")
+
+        with self.lock:
+            histogramas = sorted(self.histogramas.items())
+            contadores = sorted(self.contadores.items())
+        for (familia, etiquetas), h in histogramas:
+            cabecera(familia, 'histogram')
+            cubetas, suma, cuenta = h.copia()
+            nombre = f"{self.prefijo}_{familia}"
+            acumulado = 0
+            for limite, c in zip(h.limites + ('+Inf',), cubetas):
+                acumulado += c
+                le = limite if limite == '+Inf' else numero(limite)
+                lineas.append(f"{nombre}_bucket{etiquetas_texto(etiquetas, [('le', le)])} {acumulado}")
+            lineas.append(f"{nombre}_sum{etiquetas_texto(etiquetas)} {numero(suma)}")
+            lineas.append(f"{nombre}_count{etiquetas_texto(etiquetas)} {cuenta}")
+        for (familia, etiquetas), valor in contadores:
+            cabecera(familia, 'counter')
+            lineas.append(f"{self.prefijo}_{familia}{etiquetas_texto(etiquetas)} {numero(valor)}")
+        for familia, etiquetas, tipo, valor in sorted(self.leer_medidores(), key=lambda m: m[:2]):
+            cabecera(familia, tipo)
+            lineas.append(f"{self.prefijo}_{familia}{etiquetas_texto(etiquetas)} {numero(valor)}")
+        return '\n'.join(lineas) + '\n'
+
+    def datos(self):
+        with self.lock:
+            histogramas = list(self.histogramas.items())
+            contadores = list(self.contadores.items())
+        salida = {'timestamp': time.time(), 'activo_s': time.time() - self.inicio,
+                  'etapas_ms': {}, 'histogramas': {}, 'contadores': {}}
+        for (familia, etiquetas), h in histogramas:
+            if familia == 'etapa_segundos':
+                salida['etapas_ms'][dict(etiquetas)['etapa']] = h.resumen(1000.0)
+            else:
+                salida['histogramas'][familia + etiquetas_texto(etiquetas)] = h.resumen()
+        for (familia, etiquetas), valor in contadores:
+            salida['contadores'][familia + etiquetas_texto(etiquetas)] = valor
+        for familia, etiquetas, _, valor in self.leer_medidores():
+            salida['contadores'][familia + etiquetas_texto(etiquetas)] = valor
+        return salida
+
+    def volcar(self, ruta):
+        # Escritura atómica: quien lea el archivo nunca ve un JSON a medias
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w') as f:
+            json.dump(self.datos(), f, indent=2)
+        os.replace(temporal, ruta)
+
+    def volcar_periodicamente(self, ruta, cada=CADA_JSON):
+        def bucle():
+            while True:
+                time.sleep(cada)
+                try:
+                    self.volcar(ruta)
+                except OSError as e:
+                    print(f"Métricas: no se pudo escribir {ruta}: {e}")
+        hilo = threading.Thread(target=bucle, daemon=True)
+        hilo.start()
+        return hilo
+
+    def servir(self, puerto=PUERTO, host=HOST):
+        metricas = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    cuerpo = json.dumps(metricas.datos(), indent=2).encode()
+                    tipo = 'application/json'
+                elif self.path.startswith('/metrics'):
+                    cuerpo = metricas.texto().encode()
+                    tipo = 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', tipo)
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass  # Sin una línea por cada scrape
+
+        try:
+            servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        except OSError as e:
+            # Sin métricas antes que sin monitor
+            print(f"Métricas: no se pudo abrir {host}:{puerto} ({e})")
+            return None
+        servidor.daemon_threads = True
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        print(f"Métricas en http://{host}:{puerto}/metrics")
+        return servidor
+
+
+# Instancia del proceso: las funciones de módulo escriben acá
+_metricas = Metricas()
+observar = _metricas.observar
+medir = _metricas.medir
+caras = _metricas.caras
+contar = _metricas.contar
+medidor = _metricas.medidor
+texto = _metricas.texto
+datos = _metricas.datos
+volcar = _metricas.volcar
+
+
+def iniciar(puerto=PUERTO, ruta_json=None, cada=CADA_JSON):
+    # puerto None = sin endpoint; ruta_json None = sin volcado periódico
+    servidor = _metricas.servir(puerto) if puerto else None
+    if ruta_json:
+        _metricas.volcar_periodicamente(ruta_json, cada)
+    return servidor
+
+
+if __name__ == "__main__":
+    # Lectura de un endpoint en marcha: python metricas.py [puerto]
+    from urllib.request import urlopen
+    puerto = int(sys.argv[1]) if len(sys.argv) > 1 else PUERTO
+    try:
+        d = json.load(urlopen(f"http://{HOST}:{puerto}/metrics.json", timeout=2))
+    except OSError as e:
+        print(f"No hay métricas en {HOST}:{puerto} ({e})")
+        print("Uso:")
+        print("  python metricas.py [puerto]")
+        sys.exit(1)
+    for etapa, r in sorted(d['etapas_ms'].items()):
+        print(f"{etapa:20s} {r['cuenta']:8d} frames | media {r['media']:7.2f} ms | "
+              f"p50 {r['p50']:7.2f} | p95 {r['p95']:7.2f} | p99 {r['p99']:7.2f}")
+    for nombre, r in sorted(d['histogramas'].items()):
+        print(f"{nombre:20s} media {r['media']:.2f} | p95 {r['p95']:.2f}")
+    for nombre, valor in sorted(d['contadores'].items()):
+        print(f"{nombre:20s} {valor}")
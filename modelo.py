@@ -0,0 +1,95 @@
+import threading
+import time
+
+import numpy as np
+
+# Manejador perezoso del modelo: FaceAnalysis se construye la primera vez
+# que se usa (no al importar), una sola vez por configuración, y solo con
+# los sub-modelos ONNX que hacen falta. Importar un script para usar
+# cargar_db() o ver el uso ya no carga nada. 'perfil' elige opciones de
+# sesión y modelos INT8 para CPU (ver perfiles.py).
+INICIO = time.perf_counter()  # Referencia para medir el arranque
+MODULOS = ('detection', 'recognition')  # Los scripts solo usan bbox y embedding
+
+_modelos = {}
+_lock = threading.Lock()
+
+
+class ModeloPerezoso:
+    def __init__(self, providers, ctx_id, det_size=(640, 640), modulos=MODULOS, mensaje=None, perfil=None):
+        self.providers = list(providers)
+        self.ctx_id = ctx_id
+        self.det_size = det_size
+        self.modulos = list(modulos)
+        self.mensaje = mensaje or "Cargando modelo..."
+        self.perfil = perfil
+        self.app = None
+        self.lock = threading.Lock()
+        self.hilo_calentamiento = None
+        self.t_carga = None
+        self.t_calentamiento = None
+
+    def cargar(self):
+        if self.app is None:
+            with self.lock:
+                if self.app is None:
+                    from insightface.app import FaceAnalysis
+                    print(self.mensaje)
+                    t0 = time.perf_counter()
+                    app = FaceAnalysis(providers=self.providers, allowed_modules=self.modulos)
+                    if self.perfil is not None:
+                        from perfiles import aplicar
+                        aplicar(app, self.perfil, self.providers)
+                    app.prepare(ctx_id=self.ctx_id, det_size=self.det_size)
+                    self.t_carga = time.perf_counter() - t0
+                    perfil = f", perfil {self.perfil}" if isinstance(self.perfil, str) else ""
+                    print(f"Modelo cargado! ({self.t_carga:.1f} s{perfil})")
+                    self.app = app
+        return self.app
+
+    def calentar(self):
+        # La primera corrida de cada sesión ONNX Runtime es lenta: se hace con datos falsos
+        app = self.cargar()
+        t0 = time.perf_counter()
+        app.get(np.zeros((480, 640, 3), dtype=np.uint8))
+        if 'recognition' in app.models:
+            rec = app.models['recognition']
+            tam = rec.input_size[0]
+            rec.get_feat([np.zeros((tam, tam, 3), dtype=np.uint8)])
+        self.t_calentamiento = time.perf_counter() - t0
+
+    def precalentar(self):
+        # Carga y calienta en segundo plano (p. ej. mientras se abre la cámara)
+        if self.hilo_calentamiento is None:
+            self.hilo_calentamiento = threading.Thread(target=self.calentar, daemon=True)
+            self.hilo_calentamiento.start()
+        return self.hilo_calentamiento
+
+    def __getattr__(self, nombre):
+        # app.get, app.det_model, app.models... cargan el modelo al primer uso
+        if nombre.startswith('__'):
+            raise AttributeError(nombre)
+        return getattr(self.cargar(), nombre)
+
+
+def obtener_modelo(providers, ctx_id, det_size=(640, 640), modulos=MODULOS, mensaje=None, perfil=None):
+    # Un único manejador por configuración en todo el proceso
+    clave = (tuple(providers), ctx_id, tuple(det_size), tuple(modulos), repr(perfil))
+    with _lock:
+        if clave not in _modelos:
+            _modelos[clave] = ModeloPerezoso(providers, ctx_id, det_size, modulos, mensaje, perfil)
+        return _modelos[clave]
+
+
+def desde_inicio():
+    return time.perf_counter() - INICIO
+
+
+_primer_reconocimiento = threading.Event()
+
+
+def reportar_primer_reconocimiento():
+    # Tiempo desde el arranque hasta el primer frame con caras reconocidas (una vez por proceso)
+    if not _primer_reconocimiento.is_set():
+        _primer_reconocimiento.set()
+        print(f"Primer reconocimiento a {desde_inicio():.2f} s del arranque")
@@ -0,0 +1,128 @@
+import time
+
+import cv2
+import numpy as np
+
+import metricas
+
+# Compuerta de movimiento delante del modelo. Con el pasillo vacío y quieto el
+# monitor entra en reposo: no corre la inferencia y solo mira si hay
+# movimiento, 1 de cada CADA_REPOSO frames. Al primer movimiento vuelve a
+# inferir en ese mismo frame. Cada REFRESCO_REPOSO segundos igual corre el
+# modelo, por si alguien entró demasiado despacio para el detector de movimiento.
+#   compuerta = CompuertaMovimiento(region)
+#   if compuerta.evaluar(frame): resultado = procesar(frame); compuerta.ocupado = bool(resultado)
+ACTIVO = 'activo'
+REPOSO = 'reposo'
+UMBRAL_MOVIMIENTO = 15     # Diferencia de gris (0-255) con el fondo que cuenta como píxel cambiado
+FRACCION_MOVIMIENTO = 0.003  # Fracción de píxeles cambiados para decir que hay movimiento
+ANCHO_MOVIMIENTO = 160     # Se compara sobre la región reducida a este ancho
+APRENDIZAJE = 0.05         # Peso de cada frame en el fondo (promedio móvil)
+ESPERA_REPOSO = 3.0        # Segundos sin movimiento ni caras antes de pasar a reposo
+CADA_REPOSO = 2            # En reposo se mira el movimiento 1 de cada N frames
+REFRESCO_REPOSO = 10.0     # En reposo igual se corre el modelo cada tantos segundos
+
+
+# Resta de fondo barata: promedio móvil de la región en gris reducida
+class DetectorMovimiento:
+    def __init__(self, region=None, umbral=UMBRAL_MOVIMIENTO, fraccion=FRACCION_MOVIMIENTO,
+                 ancho=ANCHO_MOVIMIENTO, aprendizaje=APRENDIZAJE):
+        self.region = region  # (x1, y1, x2, y2) o None = frame completo
+        self.umbral = umbral
+        self.fraccion = fraccion
+        self.ancho = ancho
+        self.aprendizaje = aprendizaje
+        self.fondo = None
+
+    def reducir(self, frame, region):
+        alto_f, ancho_f = frame.shape[:2]
+        x1, y1, x2, y2 = region or (0, 0, ancho_f, alto_f)
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(ancho_f, x2), min(alto_f, y2)
+        alto = max(1, int((y2 - y1) * self.ancho / max(x2 - x1, 1)))
+        gris = cv2.cvtColor(cv2.resize(frame[y1:y2, x1:x2], (self.ancho, alto),
+                                       interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gris, (5, 5), 0).astype(np.float32)  # Que el ruido del sensor no cuente
+
+    def hay_movimiento(self, frame, region=None):
+        gris = self.reducir(frame, region or self.region)
+        if self.fondo is None or self.fondo.shape != gris.shape:
+            self.fondo = gris
+            return True
+        cambiados = np.count_nonzero(cv2.absdiff(gris, self.fondo) > self.umbral)
+        cv2.accumulateWeighted(gris, self.fondo, self.aprendizaje)
+        return cambiados > self.fraccion * gris.size
+
+
+class CompuertaMovimiento:
+    # evaluar() corre en un solo hilo (el de captura); ocupado lo escribe quien ve
+    # el resultado de la inferencia: True si había caras
+    def __init__(self, region=None, espera_reposo=ESPERA_REPOSO, cada_reposo=CADA_REPOSO,
+                 refresco=REFRESCO_REPOSO):
+        self.detector = DetectorMovimiento(region)
+        self.espera_reposo = espera_reposo
+        self.cada_reposo = cada_reposo
+        self.refresco = refresco
+        self.estado = ACTIVO
+        self.ocupado = False
+        self.ultimo_movimiento = None
+        self.ultima_inferencia = None
+        self.frames = 0
+        self.inferidos = 0
+        self.reposos = 0      # Veces que entró en reposo
+        self.despertares = 0  # Veces que salió del reposo
+
+    def despertar(self, ahora):
+        self.estado = ACTIVO
+        self.despertares += 1
+        self.ultimo_movimiento = ahora
+
+    def evaluar(self, frame, ahora=None):
+        # True si hay que correr el modelo sobre este frame
+        ahora = time.monotonic() if ahora is None else ahora
+        self.frames += 1
+        if self.ultimo_movimiento is None:
+            self.ultimo_movimiento = self.ultima_inferencia = ahora
+        if self.estado == REPOSO and self.ocupado:
+            self.despertar(ahora)  # El refresco encontró caras
+
+        if self.estado == REPOSO:
+            refrescar = ahora - self.ultima_inferencia >= self.refresco
+            if not refrescar and self.frames % self.cada_reposo:
+                return self.saltear()
+            if self.detector.hay_movimiento(frame):
+                self.despertar(ahora)
+            elif not refrescar:
+                return self.saltear()
+        elif self.detector.hay_movimiento(frame) or self.ocupado:
+            self.ultimo_movimiento = ahora
+        elif ahora - self.ultimo_movimiento >= self.espera_reposo:
+            self.estado = REPOSO
+            self.reposos += 1
+            return self.saltear()
+
+        self.inferidos += 1
+        self.ultima_inferencia = ahora
+        return True
+
+    def saltear(self):
+        metricas.contar('frames_salteados', motivo='reposo')
+        return False
+
+    def estadisticas(self):
+        salteados = self.frames - self.inferidos
+        return {
+            'frames': self.frames,
+            'inferidos': self.inferidos,
+            'salteados': salteados,
+            'fraccion_salteada': salteados / self.frames if self.frames else 0.0,
+            'reposos': self.reposos,
+            'despertares': self.despertares,
+            'estado': self.estado,
+        }
+
+
+def formatear_estadisticas(datos):
+    return (f"Reposo: {datos['salteados']}/{datos['frames']} frames sin inferencia "
+            f"({100 * datos['fraccion_salteada']:.1f}%) | entró {datos['reposos']} veces, "
+            f"despertó {datos['despertares']}")
@@ -0,0 +1,269 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import almacen
+from basedatos import abrir_base
+from bus import abrir_captura, es_bus
+from cache import Recientes
+from calidad import ControlCalidad, reconocer_validas
+from calidad import formatear_estadisticas as formatear_calidad
+from galeria import Galeria, GaleriaViva
+import metricas
+from inferencia import analizar_lote
+from modelo import obtener_modelo
+from movimiento import CompuertaMovimiento
+from pipeline import ColaAcotada, ColaCerrada, EstadisticaEtapa, politica_para
+from seguimiento import Rastreador
+import zonas
+
+# Servicio de varias cámaras con un único modelo compartido:
+#   python multicamara.py 0 rtsp://camara2/stream pasillo.mp4
+#   python multicamara.py --config camaras.json
+#   python multicamara.py bus:principal    (la cámara la abre otro proceso, ver bus.py)
+# camaras.json es una lista de objetos:
+#   [{"nombre": "puerta-norte", "fuente": 0, "zona_izquierda": 150, "zona_derecha": 490}]
+# Una cámara con entrada en ZONAS_CONFIG usa esas zonas en vez de las dos líneas.
+
+# Configuración
+DB_FILE = '/app/empleados.gal'
+DB_JSON = '/app/empleados.json'  # Formato anterior, se migra al arrancar
+DB_ASISTENCIA = '/app/asistencia.db'  # Eventos de asistencia (SQLite, ver basedatos.py)
+LOGS_DIR = '/app/asistencia_log'  # Bitácora .jsonl anterior, se importa una vez
+LOGS_JSON = '/app/asistencia_log.json'  # Formato anterior, se importa una vez
+THRESHOLD = 0.4
+MAX_LOTE = 4          # Frames por lote de inferencia
+ESPERA_MAX = 0.02     # Segundos que se espera a completar un lote
+ZONAS_CONFIG = '/app/zonas.json'  # Polígonos y líneas por nombre de cámara (ver zonas.py)
+DEDUP_SEGUNDOS = 30   # Un mismo evento por persona y cámara en esta ventana
+REPOSO_POR_MOVIMIENTO = True  # Cámara quieta y sin caras: sus frames no van al modelo
+CONTROL_CALIDAD = True  # Caras chicas, de perfil o movidas no van a ArcFace (ver calidad.py)
+METRICAS_PUERTO = 9108  # http://127.0.0.1:9108/metrics (None = sin endpoint)
+METRICAS_JSON = '/app/metricas.json'  # Volcado periódico de las métricas
+
+
+def cargar_db():
+    # Migración única desde el formato JSON anterior
+    if not os.path.exists(DB_FILE) and os.path.exists(DB_JSON):
+        almacen.migrar_json(DB_JSON, DB_FILE)
+    if not os.path.exists(DB_FILE):
+        almacen.crear(DB_FILE)
+    return Galeria.desde_almacen(DB_FILE, THRESHOLD)
+
+
+def fuente_desde_texto(texto):
+    return int(texto) if str(texto).isdigit() else texto
+
+
+class Camara:
+    def __init__(self, nombre, fuente, zona_izquierda=zonas.ZONA_IZQUIERDA,
+                 zona_derecha=zonas.ZONA_DERECHA, ancho=640, alto=480, reposo=REPOSO_POR_MOVIMIENTO):
+        self.nombre = nombre
+        self.fuente = fuente_desde_texto(fuente)
+        # Zonas de esta cámara en ZONAS_CONFIG (por nombre); si no está, las dos líneas
+        self.motor = zonas.cargar(ZONAS_CONFIG, nombre, zona_izquierda, zona_derecha)
+        self.ancho, self.alto = ancho, alto
+        self.cola = ColaAcotada(2, politica_para(self.fuente))
+        self.rastreador = Rastreador()
+        # Solo el hilo de captura llama a evaluar(); en reposo la cámara no ocupa lugar en los lotes
+        self.compuerta = CompuertaMovimiento() if reposo else None
+        self.recientes = Recientes(DEDUP_SEGUNDOS)  # (nombre, tipo), para deduplicar
+        self.stats = {'captura': EstadisticaEtapa(), 'procesado': EstadisticaEtapa()}
+        self.latencia = 0.0
+        self.eventos = 0
+        metricas.medidor('frames_descartados', lambda: self.cola.descartados, 'counter', camara=nombre)
+
+    def capturar(self, detenido):
+        cap = abrir_captura(self.fuente, self.ancho, self.alto)
+        if not cap.isOpened():
+            print(f"Error: No se puede abrir {self.nombre} ({self.fuente})")
+        try:
+            while cap.isOpened() and not detenido.is_set():
+                t0 = time.monotonic()
+                ret, frame = cap.read()
+                if not ret:
+                    if isinstance(self.fuente, int) or es_bus(self.fuente):
+                        continue  # El bus cerrado lo corta isOpened()
+                    break  # Fin del video o stream cortado
+                dt = time.monotonic() - t0
+                self.stats['captura'].registrar(dt)
+                metricas.observar('captura', dt)
+                if self.compuerta is not None and not self.compuerta.evaluar(frame):
+                    continue
+                self.cola.put((time.monotonic(), frame))
+        finally:
+            cap.release()
+            self.cola.cerrar()
+
+    def manejar(self, caras, t_captura):
+        # Seguimiento, zonas y deduplicación propios de esta cámara
+        eventos = []
+        ahora = datetime.now()
+        if self.compuerta is not None:
+            self.compuerta.ocupado = bool(caras)
+        ids = self.rastreador.actualizar(caras)
+        tracks = [self.rastreador.tracks[tid] for tid in ids]
+        centros = [((c['bbox'][0] + c['bbox'][2]) / 2, (c['bbox'][1] + c['bbox'][3]) / 2) for c in caras]
+        # Los cruces de tracks sin nombre esperan en el track hasta que se identifica
+        for track, cruce, cuando in zonas.por_registrar(tracks, self.motor.cruces(tracks, centros), ahora):
+            if not self.recientes.nuevo((track['nombre'], cruce), ahora):
+                continue
+            eventos.append((track['nombre'], cruce, cuando))
+        latencia = time.monotonic() - t_captura
+        self.stats['procesado'].registrar(latencia)
+        self.latencia = latencia
+        self.eventos += len(eventos)
+        return eventos
+
+    def estadisticas(self):
+        captura = self.stats['captura'].resumen()
+        procesado = self.stats['procesado'].resumen()
+        return {
+            'fps_captura': captura['fps'],
+            'fps': procesado['fps'],
+            'frames': procesado['frames'],
+            'latencia_ms': procesado['ms_por_frame'],
+            'latencia_ultima_ms': 1000 * self.latencia,
+            'descartados': self.cola.descartados,
+            'salteados': self.compuerta.estadisticas()['salteados'] if self.compuerta else 0,
+            'eventos': self.eventos,
+        }
+
+
+class ServicioMulticamara:
+    def __init__(self, app, galeria, camaras, bitacora=None, max_lote=MAX_LOTE,
+                 espera_max=ESPERA_MAX, control=None):
+        self.app = app
+        self.control = control
+        self.galeria = galeria
+        self.camaras = camaras
+        self.bitacora = bitacora
+        self.max_lote = max_lote
+        self.espera_max = espera_max
+        self.detenido = threading.Event()
+        self.lotes = EstadisticaEtapa()
+        self.siguiente = 0  # Cámara por la que empieza el próximo lote (round-robin)
+
+    def recolectar(self):
+        # Junta hasta max_lote frames recorriendo las cámaras en round-robin; una vez
+        # que hay algo, espera como mucho espera_max a completar el lote
+        lote = []
+        limite = None
+        n = len(self.camaras)
+        while len(lote) < self.max_lote:
+            activas = 0
+            for k in range(n):
+                if len(lote) >= self.max_lote:
+                    break
+                camara = self.camaras[(self.siguiente + k) % n]
+                try:
+                    item = camara.cola.get(timeout=0)
+                except ColaCerrada:
+                    continue
+                activas += 1
+                if item is not None:
+                    lote.append((camara, item[0], item[1]))
+            self.siguiente = (self.siguiente + 1) % n
+            if not activas:
+                break  # Todas las fuentes terminaron
+            if lote:
+                limite = limite or time.monotonic() + self.espera_max
+                if time.monotonic() >= limite:
+                    break
+            if len(lote) < self.max_lote:
+                time.sleep(0.001)
+        return lote
+
+    def inferir_lote(self, frames):
+        # Detección y ArcFace por lotes, y un único matmul contra la galería para todo el lote
+        por_frame = analizar_lote(self.app, frames, control=self.control)
+        todas = [face for faces in por_frame for face in faces]
+        resultados = iter(reconocer_validas(self.galeria, [face.embedding for face in todas]))
+        salida = []
+        for faces in por_frame:
+            caras = []
+            for face in faces:
+                nombre, score = next(resultados)
+                caras.append({'bbox': face.bbox, 'nombre': nombre, 'score': score,
+                              'embedding': face.embedding})
+            salida.append(caras)
+        return salida
+
+    def registrar(self, camara, nombre, tipo, timestamp=None):
+        # timestamp: momento del cruce (puede ser anterior si el track se identificó después)
+        timestamp = timestamp or datetime.now()
+        if self.bitacora is not None:
+            self.bitacora.registrar(nombre, tipo, timestamp, camara=camara.nombre)
+        print(f"[{timestamp.strftime('%H:%M:%S')}] {camara.nombre} {tipo}: {nombre}")
+
+    def ejecutar(self):
+        hilos = [threading.Thread(target=c.capturar, args=(self.detenido,), daemon=True)
+                 for c in self.camaras]
+        for hilo in hilos:
+            hilo.start()
+        try:
+            while not self.detenido.is_set():
+                lote = self.recolectar()
+                if not lote:
+                    break  # Todas las fuentes terminaron
+                t0 = time.monotonic()
+                salidas = self.inferir_lote([frame for _, _, frame in lote])
+                self.lotes.registrar(time.monotonic() - t0)
+                for (camara, t_captura, _), caras in zip(lote, salidas):
+                    for nombre, tipo, cuando in camara.manejar(caras, t_captura):
+                        self.registrar(camara, nombre, tipo, cuando)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.detenido.set()
+            for camara in self.camaras:
+                camara.cola.cerrar()
+            for hilo in hilos:
+                hilo.join()
+
+    def estadisticas(self):
+        return {camara.nombre: camara.estadisticas() for camara in self.camaras}
+
+
+def cargar_camaras(ruta):
+    with open(ruta, 'r') as f:
+        return [Camara(**conf) for conf in json.load(f)]
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args:
+        print("Uso:")
+        print("  python multicamara.py fuente1 [fuente2 ...]")
+        print("  python multicamara.py --config camaras.json")
+        sys.exit(1)
+    if args[0] == '--config':
+        camaras = cargar_camaras(args[1])
+    else:
+        camaras = [Camara(f"cam{i}", fuente) for i, fuente in enumerate(args)]
+
+    # Un único modelo para todas las cámaras; se calienta mientras se abren las fuentes
+    app = obtener_modelo(['CUDAExecutionProvider', 'CPUExecutionProvider'], ctx_id=0,
+                         det_size=(640, 640))
+    app.precalentar()
+    metricas.iniciar(METRICAS_PUERTO, METRICAS_JSON)
+
+    galeria = GaleriaViva(cargar_db()).vigilar()  # Altas de otros procesos sin reiniciar
+    print(f"Empleados: {len(galeria)} | Cámaras: {len(camaras)}")
+    servicio = ServicioMulticamara(app, galeria, camaras, abrir_base(DB_ASISTENCIA, LOGS_JSON, LOGS_DIR),
+                                   control=ControlCalidad() if CONTROL_CALIDAD else None)
+    servicio.ejecutar()
+    galeria.detener()
+    servicio.bitacora.cerrar()
+
+    for nombre, d in servicio.estadisticas().items():
+        print(f"{nombre}: {d['fps']:.1f} fps (captura {d['fps_captura']:.1f}) | "
+              f"latencia {d['latencia_ms']:.1f} ms | descartados {d['descartados']} | "
+              f"en reposo {d['salteados']} | eventos {d['eventos']}")
+    print(f"Lotes: {servicio.lotes.resumen()['frames']} | "
+          f"{servicio.lotes.resumen()['ms_por_frame']:.1f} ms por lote")
+    if servicio.control is not None:
+        print(formatear_calidad(servicio.control.estadisticas()))
@@ -0,0 +1,190 @@
+import os
+import sys
+
+import cv2
+
+# Perfiles de inferencia para equipos sin GPU. Un perfil fija las opciones de
+# las sesiones de ONNX Runtime y puede usar los modelos cuantizados a INT8
+# (se generan una vez con 'python perfiles.py cuantizar'):
+#   int8           usa los modelos cuantizados (si no existen, sigue con FP32 y avisa)
+#   hilos          hilos por operador (intra-op); None = uno por núcleo del presupuesto, o lo que elija ORT
+#   hilos_inter    hilos entre operadores; > 1 activa la ejecución en paralelo del grafo
+#   optimizacion   'ninguna', 'basica', 'extendida' o 'todas'
+#   nucleos        presupuesto de núcleos ([0, 1] o '0-1'): fija la afinidad del proceso
+#   espera_activa  False = los hilos ociosos no giran (conviene al compartir el equipo)
+# Varias cámaras en un equipo: un proceso por cámara, cada uno con sus núcleos:
+#   python asistencia.py monitorear 0 --perfil cpu_compartido --nucleos 0-1
+#   python asistencia.py monitorear 1 --perfil cpu_compartido --nucleos 2-3
+PAQUETE = 'buffalo_l'
+DIRECTORIO_MODELOS = os.path.expanduser('~/.insightface/models')
+# Fuera de models/: FaceAnalysis carga todos los .onnx de la carpeta del paquete
+DIRECTORIO_CUANTIZADOS = os.path.expanduser('~/.insightface/cuantizados')
+MAX_CALIBRACION = 200  # Imágenes (y caras) usadas para calibrar la cuantización estática
+
+PERFILES = {
+    'cpu': {},  # FP32 con las opciones por defecto de ONNX Runtime
+    'cpu_int8': {'int8': True, 'optimizacion': 'todas', 'hilos_inter': 1},
+    'cpu_compartido': {'int8': True, 'optimizacion': 'todas', 'hilos': 2, 'hilos_inter': 1,
+                       'espera_activa': False},
+}
+NIVELES = {'ninguna': 'ORT_DISABLE_ALL', 'basica': 'ORT_ENABLE_BASIC',
+           'extendida': 'ORT_ENABLE_EXTENDED', 'todas': 'ORT_ENABLE_ALL'}
+
+
+def texto_a_nucleos(texto):
+    # '0-3,6' -> [0, 1, 2, 3, 6]
+    nucleos = []
+    for parte in texto.split(','):
+        desde, _, hasta = parte.partition('-')
+        nucleos += range(int(desde), int(hasta or desde) + 1)
+    return nucleos
+
+
+def resolver(perfil):
+    # Nombre de PERFILES, dict de opciones o None (= sin tocar las sesiones)
+    if perfil is None:
+        return {}
+    if isinstance(perfil, str):
+        if perfil not in PERFILES:
+            raise ValueError(f"Perfil desconocido: {perfil} (hay {', '.join(PERFILES)})")
+        perfil = PERFILES[perfil]
+    opciones = dict(perfil)
+    if isinstance(opciones.get('nucleos'), str):
+        opciones['nucleos'] = texto_a_nucleos(opciones['nucleos'])
+    return opciones
+
+
+def perfil_de_args(args, defecto):
+    # Saca --perfil NOMBRE y --nucleos 0-1 de args; sin ninguno devuelve defecto
+    perfil = defecto
+    if '--perfil' in args:
+        i = args.index('--perfil')
+        perfil = args[i + 1]
+        del args[i:i + 2]
+    if '--nucleos' in args:
+        i = args.index('--nucleos')
+        perfil = dict(resolver(perfil), nucleos=args[i + 1])
+        del args[i:i + 2]
+    return perfil
+
+
+def opciones_sesion(opciones):
+    import onnxruntime as ort
+    so = ort.SessionOptions()
+    nucleos = opciones.get('nucleos')
+    hilos = opciones.get('hilos') or (len(nucleos) if nucleos else None)
+    if hilos:
+        so.intra_op_num_threads = hilos
+    if opciones.get('hilos_inter'):
+        so.inter_op_num_threads = opciones['hilos_inter']
+        if opciones['hilos_inter'] > 1:
+            so.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+    if opciones.get('optimizacion'):
+        so.graph_optimization_level = getattr(ort.GraphOptimizationLevel, NIVELES[opciones['optimizacion']])
+    if opciones.get('espera_activa') is False:
+        so.add_session_config_entry('session.intra_op.allow_spinning', '0')
+        so.add_session_config_entry('session.inter_op.allow_spinning', '0')
+    return so
+
+
+def ruta_cuantizada(ruta):
+    # ~/.insightface/models/buffalo_l/det_10g.onnx -> ~/.insightface/cuantizados/buffalo_l/det_10g.onnx
+    return os.path.join(DIRECTORIO_CUANTIZADOS, os.path.basename(os.path.dirname(ruta)), os.path.basename(ruta))
+
+
+def aplicar(app, perfil, providers):
+    # Rearma las sesiones de los sub-modelos de FaceAnalysis; va antes de app.prepare().
+    # Los modelos cuantizados tienen las mismas entradas y salidas que los FP32.
+    opciones = resolver(perfil)
+    if not opciones:
+        return
+    import onnxruntime as ort
+    if opciones.get('nucleos') and hasattr(os, 'sched_setaffinity'):
+        # Todo el proceso (ORT, OpenCV, captura) queda dentro del presupuesto
+        os.sched_setaffinity(0, opciones['nucleos'])
+    so = opciones_sesion(opciones)
+    for tarea, modelo in app.models.items():
+        ruta = modelo.model_file
+        if opciones.get('int8'):
+            if os.path.exists(ruta_cuantizada(ruta)):
+                ruta = ruta_cuantizada(ruta)
+            else:
+                print(f"Perfil: no hay versión INT8 de {os.path.basename(ruta)}, se usa FP32 "
+                      "(python perfiles.py cuantizar)")
+        modelo.session = ort.InferenceSession(ruta, sess_options=so, providers=providers)
+
+
+class LectorCalibracion:
+    # Interfaz de CalibrationDataReader de onnxruntime.quantization
+    def __init__(self, nombre_entrada, blobs):
+        self.entradas = iter([{nombre_entrada: blob} for blob in blobs])
+
+    def get_next(self):
+        return next(self.entradas, None)
+
+
+def datos_calibracion(app, rutas, maximo=MAX_CALIBRACION):
+    # Entradas reales para cada modelo: frames preparados como en SCRFD y caras alineadas
+    from inferencia import caras_y_recortes, preparar_deteccion
+    det, rec = app.det_model, app.models['recognition']
+    tam = rec.input_size[0]
+    blobs_det, blobs_rec = [], []
+    for ruta in rutas[:maximo]:
+        frame = cv2.imread(ruta)
+        if frame is None:
+            continue
+        det_img, _ = preparar_deteccion(det, frame)
+        blobs_det.append(cv2.dnn.blobFromImage(det_img, 1.0 / det.input_std, det.input_size,
+                                               (det.input_mean,) * 3, swapRB=True))
+        bboxes, kpss = det.detect(frame, max_num=0, metric='default')
+        _, recortes = caras_y_recortes(frame, bboxes, kpss, tam)
+        blobs_rec += [cv2.dnn.blobFromImages([r], 1.0 / rec.input_std, (tam, tam),
+                                             (rec.input_mean,) * 3, swapRB=True) for r in recortes]
+    return {'detection': (det, blobs_det), 'recognition': (rec, blobs_rec[:maximo])}
+
+
+def cuantizar(rutas_calibracion=None, paquete=PAQUETE):
+    # Con imágenes de calibración: cuantización estática QDQ por canal (pesos y
+    # activaciones en INT8, lo mejor para redes convolucionales). Sin imágenes:
+    # dinámica, solo los pesos.
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+    from modelo import obtener_modelo
+    app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640))
+    app.cargar()
+    datos = datos_calibracion(app, rutas_calibracion) if rutas_calibracion else None
+    salidas = []
+    for tarea, modelo in app.models.items():
+        salida = ruta_cuantizada(modelo.model_file)
+        os.makedirs(os.path.dirname(salida), exist_ok=True)
+        if datos and datos[tarea][1]:
+            lector = LectorCalibracion(modelo.input_name, datos[tarea][1])
+            quantize_static(modelo.model_file, salida, lector, quant_format=QuantFormat.QDQ,
+                            per_channel=True, weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8)
+            modo = f"estática, {len(datos[tarea][1])} entradas de calibración"
+        else:
+            quantize_dynamic(modelo.model_file, salida, weight_type=QuantType.QInt8)
+            modo = "dinámica"
+        print(f"✓ {tarea}: {salida} ({modo})")
+        salidas.append(salida)
+    return salidas
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 2 and sys.argv[1] == "cuantizar":
+        rutas = None
+        if len(sys.argv) > 2:
+            from registro import personas_de
+            rutas = [r for fotos in personas_de(sys.argv[2]).values() for r in fotos]
+        cuantizar(rutas)
+    elif len(sys.argv) == 2 and sys.argv[1] == "ver":
+        carpeta = os.path.join(DIRECTORIO_MODELOS, PAQUETE)
+        modelos = sorted(f for f in os.listdir(carpeta) if f.endswith('.onnx')) if os.path.isdir(carpeta) else []
+        for nombre in modelos:
+            hay = os.path.exists(ruta_cuantizada(os.path.join(carpeta, nombre)))
+            print(f"{nombre:24s} INT8: {'sí' if hay else 'no'}")
+        for nombre, opciones in PERFILES.items():
+            print(f"{nombre:16s} {opciones or 'opciones por defecto'}")
+    else:
+        print("Uso:")
+        print("  python perfiles.py cuantizar [fotos/]   (con fotos: calibración estática)")
+        print("  python perfiles.py ver")
@@ -0,0 +1,290 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from bus import abrir_captura, es_bus
+import metricas
+
+# Pipeline por etapas para los monitores en vivo:
+#   captura (hilo) -> cola -> inferencia (N hilos) -> cola -> render/log (hilo que llama a ejecutar())
+# Con la política DESCARTAR_ANTIGUO las colas nunca frenan a la etapa anterior:
+# si están llenas se tira el elemento más viejo y la inferencia siempre
+# recibe el frame más reciente de la cámara.
+# Con una compuerta (movimiento.CompuertaMovimiento) los frames que no pasan
+# van directo a render con el resultado 'vacio', sin ocupar la inferencia.
+# Llegan antes que los que sí se están infiriendo (p. ej. el de refresco en
+# reposo), así que no los vuelven obsoletos: un resultado inferido solo se
+# descarta si ya se entregó otro inferido más nuevo.
+DESCARTAR_ANTIGUO = 'descartar_antiguo'
+BLOQUEAR = 'bloquear'  # Para archivos de video: no se pierde ningún frame
+
+
+def politica_para(fuente):
+    # Un archivo de video se procesa completo; cámaras, streams y el bus sirven
+    # siempre el frame más nuevo
+    return BLOQUEAR if isinstance(fuente, str) and os.path.exists(fuente) else DESCARTAR_ANTIGUO
+
+
+class ColaCerrada(Exception):
+    pass
+
+
+class ColaAcotada:
+    def __init__(self, maxsize, politica=DESCARTAR_ANTIGUO):
+        self.maxsize = maxsize
+        self.politica = politica
+        self.items = deque()
+        self.cond = threading.Condition()
+        self.cerrada = False
+        self.descartados = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def put(self, item):
+        with self.cond:
+            while len(self.items) >= self.maxsize and not self.cerrada:
+                if self.politica == DESCARTAR_ANTIGUO:
+                    self.items.popleft()
+                    self.descartados += 1
+                else:
+                    self.cond.wait(0.1)
+            if self.cerrada:
+                return
+            self.items.append(item)
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        # Devuelve None si vence el timeout; ColaCerrada si se cerró y está vacía
+        with self.cond:
+            if not self.items and not self.cerrada:
+                self.cond.wait(timeout)
+            if self.items:
+                item = self.items.popleft()
+                self.cond.notify_all()
+                return item
+            if self.cerrada:
+                raise ColaCerrada()
+            return None
+
+    def cerrar(self):
+        with self.cond:
+            self.cerrada = True
+            self.cond.notify_all()
+
+
+class EstadisticaEtapa:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cuenta = 0
+        self.tiempo = 0.0
+        self.inicio = time.monotonic()
+
+    def registrar(self, segundos):
+        with self.lock:
+            self.cuenta += 1
+            self.tiempo += segundos
+
+    def resumen(self):
+        transcurrido = max(time.monotonic() - self.inicio, 1e-6)
+        return {
+            'frames': self.cuenta,
+            'fps': self.cuenta / transcurrido,
+            'ms_por_frame': 1000 * self.tiempo / self.cuenta if self.cuenta else 0.0,
+        }
+
+
+class Pipeline:
+    # procesar(frame) -> resultado            corre en los hilos de inferencia
+    # consumir(seq, frame, resultado) -> bool corre en el hilo de ejecutar(); False detiene
+    # ocupado(resultado) -> bool              True si el resultado tiene caras (para la compuerta)
+    # politica None: según la fuente (politica_para)
+    def __init__(self, fuente, procesar, consumir, workers=2, tam_cola=2,
+                 politica=None, ancho=640, alto=480,
+                 compuerta=None, vacio=None, ocupado=bool):
+        self.fuente = fuente
+        self.procesar = procesar
+        self.consumir = consumir
+        self.workers = workers
+        self.compuerta = compuerta
+        self.vacio = [] if vacio is None else vacio
+        self.ocupado = ocupado
+        self.ancho, self.alto = ancho, alto
+        politica = politica_para(fuente) if politica is None else politica
+        self.cola_frames = ColaAcotada(tam_cola, politica)
+        self.cola_resultados = ColaAcotada(tam_cola, politica)
+        self.detenido = threading.Event()
+        self.stats = {'captura': EstadisticaEtapa(), 'inferencia': EstadisticaEtapa(),
+                      'render': EstadisticaEtapa()}
+        self.obsoletos = 0  # Resultados que llegaron después de uno más nuevo
+        # Sin descartes la secuencia no tiene huecos y se puede entregar en orden
+        self.ordenado = politica == BLOQUEAR
+        self.hilos = []
+        # Se leen al exportar las métricas
+        metricas.medidor('frames_descartados', lambda: self.cola_frames.descartados, 'counter',
+                         cola='frames')
+        metricas.medidor('frames_descartados', lambda: self.cola_resultados.descartados, 'counter',
+                         cola='resultados')
+        metricas.medidor('frames_obsoletos', lambda: self.obsoletos, 'counter')
+        metricas.medidor('cola_frames', lambda: len(self.cola_frames))
+        metricas.medidor('cola_resultados', lambda: len(self.cola_resultados))
+        if compuerta is not None:
+            metricas.medidor('en_reposo', lambda: int(self.compuerta.estado == 'reposo'))
+
+    def abrir_captura(self):
+        # Cámara, video o bus:<nombre> (frames de otro proceso, ver bus.py)
+        return abrir_captura(self.fuente, self.ancho, self.alto)
+
+    def capturar(self, cap):
+        seq = 0
+        es_archivo = not isinstance(self.fuente, int) and not es_bus(self.fuente)
+        try:
+            while not self.detenido.is_set():
+                t0 = time.monotonic()
+                ret, frame = cap.read()
+                if not ret:
+                    if es_archivo or not cap.isOpened():
+                        break  # Fin del video o bus cerrado
+                    continue
+                dt = time.monotonic() - t0
+                self.stats['captura'].registrar(dt)
+                metricas.observar('captura', dt)
+                if self.compuerta is not None and not self.compuerta.evaluar(frame):
+                    self.cola_resultados.put((seq, frame, self.vacio, False))
+                else:
+                    self.cola_frames.put((seq, frame))
+                seq += 1
+        finally:
+            cap.release()
+            self.cola_frames.cerrar()
+
+    def inferir(self):
+        while not self.detenido.is_set():
+            try:
+                item = self.cola_frames.get(timeout=0.1)
+            except ColaCerrada:
+                break
+            if item is None:
+                continue
+            seq, frame = item
+            t0 = time.monotonic()
+            resultado = self.procesar(frame)
+            dt = time.monotonic() - t0
+            self.stats['inferencia'].registrar(dt)
+            metricas.observar('inferencia', dt)
+            if self.compuerta is not None:
+                self.compuerta.ocupado = self.ocupado(resultado)
+            self.cola_resultados.put((seq, frame, resultado, True))
+
+    def estadisticas(self):
+        datos = {etapa: est.resumen() for etapa, est in self.stats.items()}
+        datos['captura']['cola'] = len(self.cola_frames)
+        datos['captura']['descartados'] = self.cola_frames.descartados
+        datos['inferencia']['cola'] = len(self.cola_resultados)
+        datos['inferencia']['descartados'] = self.cola_resultados.descartados
+        datos['render']['obsoletos'] = self.obsoletos
+        if self.compuerta is not None:
+            datos['inferencia']['salteados'] = self.compuerta.estadisticas()['salteados']
+        return datos
+
+    def detener(self):
+        self.detenido.set()
+        self.cola_frames.cerrar()
+        self.cola_resultados.cerrar()
+
+    def ejecutar(self):
+        cap = self.abrir_captura()
+        if not cap.isOpened():
+            print(f"Error: No se puede abrir la fuente {self.fuente}")
+            return False
+
+        self.hilos = [threading.Thread(target=self.capturar, args=(cap,), daemon=True)]
+        self.hilos += [threading.Thread(target=self.inferir, daemon=True) for _ in range(self.workers)]
+        for hilo in self.hilos:
+            hilo.start()
+
+        def cerrar_resultados():
+            for hilo in self.hilos[1:]:
+                hilo.join()
+            self.cola_resultados.cerrar()
+        threading.Thread(target=cerrar_resultados, daemon=True).start()
+
+        ultimo = -1
+        ultimo_inferido = -1  # Sin compuerta es siempre igual a ultimo
+        pendientes = {}
+        try:
+            while True:
+                try:
+                    item = self.cola_resultados.get(timeout=0.1)
+                except ColaCerrada:
+                    break
+                if item is None:
+                    continue
+                listos = []
+                if self.ordenado:
+                    pendientes[item[0]] = item
+                    while ultimo + 1 in pendientes:
+                        ultimo += 1
+                        listos.append(pendientes.pop(ultimo))
+                elif item[0] < (ultimo_inferido if item[3] else ultimo):
+                    # Con varios workers un frame viejo puede terminar después de uno nuevo
+                    self.obsoletos += 1
+                else:
+                    ultimo = max(ultimo, item[0])
+                    if item[3]:
+                        ultimo_inferido = item[0]
+                    listos.append(item)
+                seguir = True
+                for seq, frame, resultado, _ in listos:
+                    t0 = time.monotonic()
+                    seguir = self.consumir(seq, frame, resultado)
+                    dt = time.monotonic() - t0
+                    self.stats['render'].registrar(dt)
+                    metricas.observar('render', dt)
+                    if seguir is False:
+                        break
+                if seguir is False:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.detener()
+            for hilo in self.hilos:
+                hilo.join()
+        return True
+
+
+def formatear_estadisticas(datos):
+    partes = []
+    for etapa, d in datos.items():
+        texto = f"{etapa}: {d['fps']:.1f} fps {d['ms_por_frame']:.1f} ms"
+        if 'cola' in d:
+            texto += f" cola={d['cola']} desc={d['descartados']}"
+        partes.append(texto)
+    return ' | '.join(partes)
+
+
+if __name__ == "__main__":
+    # Prueba sin cámara: python pipeline.py video.mp4 [workers]
+    if len(sys.argv) < 2:
+        print("Uso:")
+        print("  python pipeline.py video.mp4 [workers]")
+        sys.exit(1)
+
+    from modelo import obtener_modelo
+    app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640))
+    app.precalentar()
+
+    caras = [0]
+
+    def consumir(seq, frame, faces):
+        caras[0] += len(faces)
+        return True
+
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    pipeline = Pipeline(sys.argv[1], app.get, consumir, workers=workers, politica=BLOQUEAR)
+    pipeline.ejecutar()
+    print(f"Caras detectadas: {caras[0]}")
+    print(formatear_estadisticas(pipeline.estadisticas()))
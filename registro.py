@@ -0,0 +1,274 @@
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+
+import cv2
+import numpy as np
+
+import almacen
+from galeria import Galeria, centroide, normalizar
+from modelo import obtener_modelo
+
+# Registro con varias muestras por persona: una ráfaga de la cámara, una
+# carpeta de fotos, o un directorio completo en paralelo:
+#   python registro.py camara "Nombre" [--muestras N]
+#   python registro.py imagenes "Nombre" carpeta/
+#   python registro.py carpeta personas/ [--procesos P]
+# personas/ tiene una subcarpeta por persona (personas/Ana/*.jpg) o fotos
+# sueltas con el nombre de la persona (personas/Ana.jpg).
+# Las caras de mala calidad se descartan antes de llegar a la galería.
+
+# Configuración
+DB_FILE = '/app/empleados.gal'
+THRESHOLD = 0.4
+PROVIDERS = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+CTX_ID = 0
+DET_SIZE = (640, 640)
+MUESTRAS = 5            # Muestras buenas por ráfaga
+INTERVALO = 0.15        # Segundos mínimos entre muestras de una ráfaga (que no sean el mismo frame)
+TIEMPO_MAX = 10.0       # Segundos para completar una ráfaga desde la cámara
+DET_SCORE_MIN = 0.6     # Confianza mínima del detector
+TAM_MIN = 80            # Ancho mínimo de la cara en píxeles
+NITIDEZ_MIN = 60.0      # Varianza del laplaciano del recorte (menos = movida o desenfocada)
+CONSISTENCIA_MIN = 0.5  # Similitud mínima de cada muestra con el centroide de las demás
+REPETIDA = 0.995        # Similitud con la muestra anterior a partir de la cual es el mismo embedding
+PROCESOS = 4            # Procesos para el registro masivo
+EXTENSIONES = ('.jpg', '.jpeg', '.png', '.bmp')
+
+_worker = {}
+
+
+def nitidez(frame, bbox):
+    alto, ancho = frame.shape[:2]
+    x1, y1, x2, y2 = np.clip(np.asarray(bbox[:4]).astype(int), 0, [ancho, alto, ancho, alto])
+    recorte = frame[y1:y2, x1:x2]
+    if recorte.size == 0:
+        return 0.0
+    return cv2.Laplacian(cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var()
+
+
+def evaluar(frame, bbox, det_score=None):
+    # Motivo de rechazo de una cara, o None si sirve para registrar
+    if det_score is not None and det_score < DET_SCORE_MIN:
+        return 'confianza'
+    if bbox[2] - bbox[0] < TAM_MIN:
+        return 'pequeña'
+    if nitidez(frame, bbox) < NITIDEZ_MIN:
+        return 'borrosa'
+    return None
+
+
+def caras_de(faces):
+    # Caras de FaceAnalysis.get() (Face es un dict) o resultados de los monitores
+    # como (bbox, det_score, embedding)
+    return [(face['bbox'], face.get('det_score'), face.get('embedding')) for face in faces]
+
+
+def muestra(frame, caras, rechazos):
+    # Embedding de la única cara del frame si pasa el control de calidad
+    if len(caras) != 1:
+        rechazos['sin cara' if not caras else 'varias caras'] += 1
+        return None
+    bbox, det_score, embedding = caras[0]
+    motivo = evaluar(frame, bbox, det_score)
+    if motivo:
+        rechazos[motivo] += 1
+        return None
+    if embedding is None:
+        rechazos['calidad'] += 1  # La descartó el control de calidad del monitor
+        return None
+    return embedding
+
+
+def repetida(emb, anterior, umbral=REPETIDA):
+    m = normalizar([emb, anterior])
+    return float(m[0] @ m[1]) >= umbral
+
+
+def consistentes(embeddings, minimo=CONSISTENCIA_MIN):
+    # Descarta muestras que no se parecen al resto (otra persona que se cruzó, mala alineación)
+    if len(embeddings) < 3:
+        return list(embeddings), 0
+    m = normalizar(embeddings)
+    sims = np.array([m[i] @ centroide(np.delete(m, i, axis=0)) for i in range(len(m))])
+    buenas = [emb for emb, s in zip(embeddings, sims) if s >= minimo]
+    return buenas, len(embeddings) - len(buenas)
+
+
+def registrar_muestras(galeria, nombre, embeddings, guardar):
+    # guardar(galeria, nombre, embedding) es el guardar_empleado() de cada script
+    buenas, descartadas = consistentes(embeddings)
+    for emb in buenas:
+        guardar(galeria, nombre, emb)
+    return len(buenas), descartadas
+
+
+def formatear_rechazos(rechazos):
+    return ", ".join(f"{motivo}: {n}" for motivo, n in rechazos.most_common() if n) or "ninguno"
+
+
+# Junta muestras de frames sucesivos (cámara en vivo o el hilo de render de un pipeline)
+class Rafaga:
+    def __init__(self, nombre, muestras=MUESTRAS, intervalo=INTERVALO):
+        self.nombre = nombre
+        self.muestras = muestras
+        self.intervalo = intervalo
+        self.embeddings = []
+        self.rechazos = Counter()
+        self.ultima = None
+        self.inicio = time.monotonic()
+
+    def completa(self):
+        return len(self.embeddings) >= self.muestras
+
+    def vencida(self, tiempo_max=TIEMPO_MAX):
+        # Para las ráfagas alimentadas desde un pipeline: nadie se paró frente a la cámara
+        return not self.completa() and time.monotonic() - self.inicio > tiempo_max
+
+    def ofrecer(self, frame, caras):
+        # caras: [(bbox, det_score, embedding)]; devuelve True cuando la ráfaga se completó
+        ahora = time.monotonic()
+        if self.ultima is not None and ahora - self.ultima < self.intervalo:
+            return self.completa()
+        emb = muestra(frame, caras, self.rechazos)
+        if emb is not None and self.embeddings and repetida(emb, self.embeddings[-1]):
+            self.rechazos['repetida'] += 1  # Embedding guardado de un track, no de este frame
+            emb = None
+        if emb is not None:
+            self.embeddings.append(emb)
+            self.ultima = ahora
+        return self.completa()
+
+
+def capturar_rafaga(app, cap, nombre, muestras=MUESTRAS, tiempo_max=TIEMPO_MAX):
+    rafaga = Rafaga(nombre, muestras)
+    limite = time.monotonic() + tiempo_max
+    while time.monotonic() < limite and not rafaga.completa():
+        ret, frame = cap.read()
+        if not ret:
+            break
+        rafaga.ofrecer(frame, caras_de(app.get(frame)))
+    return rafaga
+
+
+def imagenes_de(carpeta):
+    return sorted(os.path.join(carpeta, f) for f in os.listdir(carpeta)
+                  if f.lower().endswith(EXTENSIONES))
+
+
+def muestras_de_imagenes(app, rutas):
+    embeddings, rechazos = [], Counter()
+    for ruta in rutas:
+        frame = cv2.imread(ruta)
+        if frame is None:
+            rechazos['ilegible'] += 1
+            continue
+        emb = muestra(frame, caras_de(app.get(frame)), rechazos)
+        if emb is not None:
+            embeddings.append(emb)
+    return embeddings, rechazos
+
+
+def personas_de(raiz):
+    # {nombre: [rutas]} con una subcarpeta por persona o fotos sueltas nombre.jpg
+    personas = {}
+    for entrada in sorted(os.listdir(raiz)):
+        ruta = os.path.join(raiz, entrada)
+        if os.path.isdir(ruta):
+            rutas = imagenes_de(ruta)
+            if rutas:
+                personas.setdefault(entrada, []).extend(rutas)
+        elif entrada.lower().endswith(EXTENSIONES):
+            personas.setdefault(os.path.splitext(entrada)[0], []).append(ruta)
+    return personas
+
+
+def iniciar_worker(providers, ctx_id, det_size):
+    _worker['app'] = obtener_modelo(providers, ctx_id=ctx_id, det_size=det_size)
+
+
+def procesar_persona(nombre, rutas):
+    embeddings, rechazos = muestras_de_imagenes(_worker['app'], rutas)
+    return nombre, embeddings, rechazos
+
+
+def registrar_carpeta(raiz, galeria, guardar, procesos=PROCESOS):
+    # Extrae embeddings en paralelo (un modelo por proceso); la galería se escribe solo desde acá
+    personas = personas_de(raiz)
+    if not personas:
+        return 0
+    registradas = 0
+    with ProcessPoolExecutor(max_workers=min(procesos, len(personas)), mp_context=mp.get_context('spawn'),
+                             initializer=iniciar_worker,
+                             initargs=(PROVIDERS, CTX_ID, DET_SIZE)) as pool:
+        futuros = [pool.submit(procesar_persona, nombre, rutas) for nombre, rutas in personas.items()]
+        for futuro in as_completed(futuros):
+            nombre, embeddings, rechazos = futuro.result()
+            n, descartadas = registrar_muestras(galeria, nombre, embeddings, guardar)
+            rechazos['inconsistente'] += descartadas
+            if n:
+                registradas += 1
+                print(f"✓ {nombre}: {n} muestras | rechazos: {formatear_rechazos(rechazos)}")
+            else:
+                print(f"✗ {nombre}: sin muestras válidas | rechazos: {formatear_rechazos(rechazos)}")
+    return registradas
+
+
+def guardar_empleado(galeria, nombre, embedding):
+    # Solo agrega el registro nuevo, no reescribe la galería
+    almacen.agregar(DB_FILE, nombre, embedding)
+    galeria.agregar(nombre, embedding)
+
+
+def cargar_db():
+    if not os.path.exists(DB_FILE):
+        almacen.crear(DB_FILE)
+    return Galeria.desde_almacen(DB_FILE, THRESHOLD)
+
+
+def opcion(args, nombre, defecto):
+    if nombre in args:
+        i = args.index(nombre)
+        valor = args[i + 1]
+        del args[i:i + 2]
+        return int(valor)
+    return defecto
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    muestras_rafaga = opcion(args, '--muestras', MUESTRAS)
+    procesos = opcion(args, '--procesos', PROCESOS)
+    if len(args) == 2 and args[0] == 'camara':
+        app = obtener_modelo(PROVIDERS, ctx_id=CTX_ID, det_size=DET_SIZE)
+        app.precalentar()
+        galeria = cargar_db()
+        cap = cv2.VideoCapture(0)
+        print(f"Registrando a {args[1]}... Mira a la cámara y mové un poco la cabeza.")
+        rafaga = capturar_rafaga(app, cap, args[1], muestras_rafaga)
+        cap.release()
+        n, descartadas = registrar_muestras(galeria, args[1], rafaga.embeddings, guardar_empleado)
+        rafaga.rechazos['inconsistente'] += descartadas
+        print(f"{'✓' if n else '✗'} {args[1]}: {n} muestras | "
+              f"rechazos: {formatear_rechazos(rafaga.rechazos)}")
+    elif len(args) == 3 and args[0] == 'imagenes':
+        app = obtener_modelo(PROVIDERS, ctx_id=CTX_ID, det_size=DET_SIZE)
+        galeria = cargar_db()
+        embeddings, rechazos = muestras_de_imagenes(app, imagenes_de(args[2]))
+        n, descartadas = registrar_muestras(galeria, args[1], embeddings, guardar_empleado)
+        rechazos['inconsistente'] += descartadas
+        print(f"{'✓' if n else '✗'} {args[1]}: {n} muestras | rechazos: {formatear_rechazos(rechazos)}")
+    elif len(args) == 2 and args[0] == 'carpeta':
+        galeria = cargar_db()
+        t0 = time.perf_counter()
+        n = registrar_carpeta(args[1], galeria, guardar_empleado, procesos)
+        print(f"{n} personas registradas en {time.perf_counter() - t0:.1f} s | "
+              f"Empleados: {len(galeria)} ({galeria.muestras} muestras)")
+    else:
+        print("Uso:")
+        print("  python registro.py camara 'Nombre' [--muestras N]")
+        print("  python registro.py imagenes 'Nombre' carpeta/")
+        print("  python registro.py carpeta personas/ [--procesos P]")
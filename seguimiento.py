@@ -0,0 +1,287 @@
+import time
+
+import cv2
+import numpy as np
+
+from calidad import reconocer_validas
+from galeria import normalizar
+from inferencia import analizar, caras_y_recortes, reconocer_lote
+import metricas
+
+DETECTAR_CADA = 5  # Frames entre detecciones completas
+IOU_MIN = 0.3      # Solapamiento mínimo para asociar una detección a un track
+SIM_MIN = 0.5      # Similitud de embedding que permite asociar aunque no se solapen
+PESO_IOU = 0.5     # Peso del IoU frente a la similitud de embedding en la afinidad
+TTL_TRACK = 2.0    # Segundos sin ver un track antes de descartarlo
+MAX_TRACKS = 64    # Cota de memoria: se descartan los más viejos
+NO_ASIGNABLE = 1e6
+
+
+def iou_matriz(a, b):
+    # IoU entre todas las cajas de a (n, 4) y b (m, 4) -> (n, m)
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return inter / np.maximum(union, 1e-6)
+
+
+def asignacion_hungara(costo):
+    # Asignación de costo mínimo (Kuhn-Munkres con potenciales, O(n^2 m)).
+    # Devuelve pares (fila, columna); con matrices rectangulares sobran filas o columnas.
+    costo = np.asarray(costo, dtype=np.float64)
+    n, m = costo.shape
+    if n == 0 or m == 0:
+        return []
+    transpuesta = n > m
+    if transpuesta:
+        costo = costo.T
+        n, m = m, n
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)       # p[j] = fila asignada a la columna j (1-indexado)
+    camino = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        usado = np.zeros(m + 1, dtype=bool)
+        while True:
+            usado[j0] = True
+            i0 = p[j0]
+            libres = np.nonzero(~usado[1:])[0] + 1
+            cur = costo[i0 - 1, libres - 1] - u[i0] - v[libres]
+            mejora = cur < minv[libres]
+            minv[libres[mejora]] = cur[mejora]
+            camino[libres[mejora]] = j0
+            j1 = libres[np.argmin(minv[libres])]
+            delta = minv[j1]
+            u[p[usado]] += delta
+            v[usado] -= delta
+            minv[~usado] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = camino[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    pares = [(p[j] - 1, j - 1) for j in range(1, m + 1) if p[j]]
+    if transpuesta:
+        pares = [(c, f) for f, c in pares]
+    return sorted(pares)
+
+
+def propagar_caja(gris_ant, gris, bbox):
+    # Desplaza la caja con la mediana del flujo óptico (Lucas-Kanade) de sus puntos
+    alto, ancho = gris.shape
+    x1, y1, x2, y2 = bbox.astype(int)
+    x1, y1 = max(x1, 0), max(y1, 0)
+    x2, y2 = min(x2, ancho), min(y2, alto)
+    if x2 - x1 < 8 or y2 - y1 < 8:
+        return None
+    pts = cv2.goodFeaturesToTrack(gris_ant[y1:y2, x1:x2], maxCorners=30,
+                                  qualityLevel=0.01, minDistance=3)
+    if pts is None or len(pts) < 4:
+        return None
+    pts = pts + np.array([x1, y1], dtype=np.float32)
+    nuevos, st, _ = cv2.calcOpticalFlowPyrLK(gris_ant, gris, pts, None,
+                                             winSize=(15, 15), maxLevel=2)
+    ok = st.ravel() == 1
+    if ok.sum() < 4:
+        return None
+    dx, dy = np.median((nuevos - pts)[ok].reshape(-1, 2), axis=0)
+    caja = bbox + np.array([dx, dy, dx, dy], dtype=np.float32)
+    cx, cy = (caja[0] + caja[2]) / 2, (caja[1] + caja[3]) / 2
+    if not (0 <= cx < ancho and 0 <= cy < alto):
+        return None  # Salió del cuadro
+    return caja
+
+
+def deteccion_completa(app, galeria, frame, control=None):
+    # Modo original: detección y reconocimiento completos en cada frame
+    faces = analizar(app, frame, control)
+    resultados = reconocer_validas(galeria, [face.embedding for face in faces])
+    # 'nuevo': el embedding se calculó en este frame (sirve de muestra para una ráfaga)
+    return [{'id': None, 'bbox': face.bbox, 'nombre': nombre, 'score': score,
+             'embedding': face.embedding, 'det_score': face.det_score, 'nuevo': True}
+            for face, (nombre, score) in zip(faces, resultados)]
+
+
+# Corre el detector solo cada N frames (o cuando se pierde un track) y en los
+# frames intermedios propaga las cajas con flujo óptico. El embedding de
+# reconocimiento se calcula una vez por track, no una vez por frame; con un
+# ControlCalidad, recién en la primera detección buena del track.
+# Guarda estado entre frames: usar con un solo hilo de inferencia.
+class DeteccionEspaciada:
+    def __init__(self, app, galeria, cada=DETECTAR_CADA, iou_min=IOU_MIN, control=None):
+        self.det_model = app.det_model
+        self.rec_model = app.models['recognition']
+        self.galeria = galeria
+        self.cada = cada
+        self.iou_min = iou_min
+        self.control = control
+        self.tracks = []
+        self.next_id = 0
+        self.gris_ant = None
+        self.desde_deteccion = cada  # El primer frame siempre detecta
+        self.detecciones = 0
+        self.embeddings = 0
+
+    def detectar(self, frame):
+        with metricas.medir('deteccion'):
+            bboxes, kpss = self.det_model.detect(frame, max_num=0, metric='default')
+        metricas.caras(len(bboxes))
+        return bboxes, kpss
+
+    def reconocer_tracks(self, frame, tracks):
+        # Solo para tracks nuevos o aún sin identificar
+        if not tracks:
+            return
+        bboxes = np.array([list(t['bbox']) + [t['det_score']] for t in tracks], dtype=np.float32)
+        kpss = None
+        if all(t['kps'] is not None for t in tracks):
+            kpss = np.stack([t['kps'] for t in tracks])
+        t0 = time.perf_counter()
+        faces, recortes = caras_y_recortes(frame, bboxes, kpss, self.rec_model.input_size[0], self.control)
+        t1 = time.perf_counter()
+        embeddings = iter(reconocer_lote(self.rec_model, recortes))
+        t2 = time.perf_counter()
+        metricas.observar('reconocimiento', t2 - t0)
+        if self.control is not None and recortes:
+            self.control.anotar_embeddings(len(recortes), t2 - t1)
+        self.embeddings += len(recortes)
+        for t, face in zip(tracks, faces):
+            # El que no pasó el control se vuelve a intentar en la próxima detección
+            t['embedding'] = None if face.calidad else next(embeddings)
+            t['nuevo'] = t['embedding'] is not None
+        for t, (nombre, score) in zip(tracks, reconocer_validas(self.galeria, [t['embedding'] for t in tracks])):
+            t['nombre'], t['score'] = nombre, score
+
+    def asociar(self, frame, bboxes, kpss):
+        # Asociación por IoU (Hungarian) entre tracks propagados y detecciones nuevas
+        nuevos = []
+        asignados = {}
+        if self.tracks and len(bboxes):
+            ious = iou_matriz([t['bbox'] for t in self.tracks], bboxes[:, :4])
+            for i, j in asignacion_hungara(1 - ious):
+                if ious[i, j] >= self.iou_min:
+                    asignados[j] = self.tracks[i]
+        for j, det in enumerate(bboxes):
+            track = asignados.get(j)
+            if track is None:
+                track = {'id': self.next_id, 'nombre': None, 'score': 0, 'embedding': None}
+                self.next_id += 1
+            track['bbox'] = det[:4].astype(np.float32)
+            track['det_score'] = float(det[4])
+            track['kps'] = kpss[j] if kpss is not None else None
+            nuevos.append(track)
+        self.tracks = nuevos
+        self.reconocer_tracks(frame, [t for t in nuevos if t['nombre'] is None])
+
+    def procesar(self, frame):
+        gris = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        perdido = False
+        if self.gris_ant is not None:
+            for t in self.tracks:
+                caja = propagar_caja(self.gris_ant, gris, t['bbox'])
+                if caja is None:
+                    perdido = True
+                else:
+                    t['bbox'] = caja
+        self.gris_ant = gris
+        self.desde_deteccion += 1
+        for t in self.tracks:
+            t['nuevo'] = False  # En los frames propagados el embedding es el guardado del track
+
+        # Con la escena vacía también se detecta cada N frames: alguien puede entrar
+        if perdido or self.desde_deteccion >= self.cada:
+            bboxes, kpss = self.detectar(frame)
+            self.asociar(frame, bboxes, kpss)
+            self.desde_deteccion = 0
+            self.detecciones += 1
+
+        return [{'id': t['id'], 'bbox': t['bbox'].copy(), 'nombre': t['nombre'],
+                 'score': t['score'], 'embedding': t['embedding'], 'nuevo': t['nuevo']} for t in self.tracks]
+
+
+# Rastreador multi-objeto: asocia las caras de cada frame con los tracks
+# activos por IoU + afinidad de embedding (Hungarian). Los ids son estables,
+# dos caras desconocidas tienen tracks distintos y los tracks que no se ven
+# durante ttl segundos se descartan.
+class Rastreador:
+    def __init__(self, ttl=TTL_TRACK, iou_min=IOU_MIN, sim_min=SIM_MIN,
+                 peso_iou=PESO_IOU, max_tracks=MAX_TRACKS):
+        self.ttl = ttl
+        self.iou_min = iou_min
+        self.sim_min = sim_min
+        self.peso_iou = peso_iou
+        self.max_tracks = max_tracks
+        self.tracks = {}
+        self.next_id = 0
+
+    def expirar(self, ahora):
+        for tid in [tid for tid, t in self.tracks.items() if ahora - t['visto'] > self.ttl]:
+            del self.tracks[tid]
+
+    def acotar(self, ahora):
+        # Después de crear los tracks del frame: se van los no vistos más viejos.
+        # Los del frame quedan siempre (sus ids se devuelven); solo un frame con
+        # más de max_tracks caras deja el conjunto por encima de la cota.
+        if len(self.tracks) <= self.max_tracks:
+            return
+        viejos = sorted((tid for tid, t in self.tracks.items() if t['visto'] != ahora),
+                        key=lambda tid: self.tracks[tid]['visto'])
+        for tid in viejos[:len(self.tracks) - self.max_tracks]:
+            del self.tracks[tid]
+
+    def afinidad(self, activos, detecciones):
+        ious = iou_matriz([t['bbox'] for t in activos], [d['bbox'] for d in detecciones])
+        sims = np.zeros_like(ious)
+        ti = [i for i, t in enumerate(activos) if t['embedding'] is not None]
+        dj = [j for j, d in enumerate(detecciones) if d.get('embedding') is not None]
+        if ti and dj:
+            sims[np.ix_(ti, dj)] = np.stack([activos[i]['embedding'] for i in ti]) @ \
+                normalizar([detecciones[j]['embedding'] for j in dj]).T
+        con_emb = np.zeros_like(ious, dtype=bool)
+        con_emb[np.ix_(ti, dj)] = True
+        afinidad = np.where(con_emb, self.peso_iou * ious + (1 - self.peso_iou) * sims, ious)
+        valido = (ious >= self.iou_min) | (con_emb & (sims >= self.sim_min))
+        return afinidad, valido
+
+    def actualizar(self, detecciones, ahora=None):
+        # detecciones: dicts con 'bbox' y opcionalmente 'embedding', 'nombre', 'score'.
+        # Devuelve el id de track de cada detección.
+        t0 = time.perf_counter()
+        ahora = time.monotonic() if ahora is None else ahora
+        self.expirar(ahora)
+        activos = list(self.tracks.values())
+        ids = [None] * len(detecciones)
+        if activos and detecciones:
+            afinidad, valido = self.afinidad(activos, detecciones)
+            costo = np.where(valido, 1 - afinidad, NO_ASIGNABLE)
+            for i, j in asignacion_hungara(costo):
+                if valido[i, j]:
+                    ids[j] = activos[i]['id']
+        for j, det in enumerate(detecciones):
+            if ids[j] is None:
+                ids[j] = self.next_id
+                self.tracks[self.next_id] = {'id': self.next_id, 'nombre': None, 'score': 0,
+                                             'embedding': None}
+                self.next_id += 1
+            track = self.tracks[ids[j]]
+            track['bbox'] = np.asarray(det['bbox'], dtype=np.float32)
+            track['visto'] = ahora
+            if det.get('embedding') is not None:
+                track['embedding'] = normalizar(det['embedding'])[0]
+            if det.get('nombre'):
+                track['nombre'], track['score'] = det['nombre'], det['score']
+        self.acotar(ahora)
+        metricas.observar('seguimiento', time.perf_counter() - t0)
+        return ids
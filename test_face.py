@@ -1,11 +1,11 @@
 import cv2
-from insightface.app import FaceAnalysis
+from modelo import obtener_modelo
 
-# Inicializar detector
-print("Cargando modelo...")
-app = FaceAnalysis(providers=['CPUExecutionProvider'])
-app.prepare(ctx_id=-1, det_size=(640, 640))
-print("Modelo cargado!")
+PERFIL = 'cpu'  # Perfil de inferencia (perfiles.py): 'cpu', 'cpu_int8', 'cpu_compartido'
+
+# Inicializar detector (carga y calienta en segundo plano mientras abre la cámara)
+app = obtener_modelo(['CPUExecutionProvider'], ctx_id=-1, det_size=(640, 640), perfil=PERFIL)
+app.precalentar()
 
 # Abrir cámara
 cap = cv2.VideoCapture(0)
@@ -0,0 +1,240 @@
+import json
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import cv2
+
+# Salida de video de los monitores, separada del procesamiento:
+#   'ventana'  cv2.imshow, a lo sumo FPS cuadros por segundo, en el hilo que
+#              llama a teclas() (el principal: HighGUI no admite otros hilos
+#              en todas las plataformas)
+#   'mjpeg'    http://127.0.0.1:PUERTO/video para mirar desde un navegador
+#   'ninguna'  servidor sin pantalla: no se dibuja nada
+# El monitor solo dibuja los frames que la vista va a mostrar (quiere_frame):
+# con 'mjpeg', solo mientras alguien mira.
+# En todos los modos las teclas llegan también por HTTP local:
+#   python vista.py tecla r 'Nombre'    (alta con la cámara del monitor)
+#   python vista.py tecla 1             (mover línea, como en la ventana)
+MODO = 'ventana'
+FPS = 10            # Cuadros por segundo de la vista (el procesamiento no se limita)
+PUERTO = 9111
+HOST = '127.0.0.1'  # Solo local, como las métricas y las altas
+CALIDAD_JPEG = 70
+TECLAS = 'qr1234'
+MODOS = ('ventana', 'mjpeg', 'ninguna')
+
+
+class Vista:
+    def __init__(self, modo=MODO, fps=FPS, titulo='Asistencia'):
+        if modo not in MODOS:
+            raise ValueError(f"Vista desconocida: {modo} (hay {', '.join(MODOS)})")
+        self.modo = modo
+        self.intervalo = 1.0 / fps if fps else 0.0
+        self.titulo = titulo
+        self.proximo = 0.0
+        self.pendiente = None  # Último frame dibujado, lo toma teclas() o el hilo del mjpeg
+        self.hay_frame = threading.Condition()
+        self.jpeg = None
+        self.secuencia = 0     # Sube con cada jpeg nuevo
+        self.hay_jpeg = threading.Condition()
+        self.comandos = queue.Queue()  # (tecla, parámetros) de la ventana o de HTTP
+        self.detenido = threading.Event()
+        self.hilo = None
+        self.servidor = None
+        self.sondeo = 0.0      # Próximo waitKey sin frame nuevo ('ventana')
+        self.abierta = False
+        self.mostrados = 0
+        self.clientes = 0      # Navegadores mirando /video
+
+    def quiere_frame(self, ahora=None):
+        # Solo el hilo de render: True si este frame se va a ver (y hay que dibujarlo)
+        if self.modo == 'ninguna' or (self.modo == 'mjpeg' and not self.clientes):
+            return False
+        ahora = time.monotonic() if ahora is None else ahora
+        if ahora < self.proximo:
+            return False
+        self.proximo = ahora + self.intervalo
+        return True
+
+    def mostrar(self, frame):
+        # No espera: si la vista está atrasada, el frame anterior se pierde
+        with self.hay_frame:
+            self.pendiente = frame
+            self.hay_frame.notify()
+
+    def ventana(self, ahora=None):
+        # Muestra el último frame y lee el teclado; sin frame nuevo (monitor en
+        # reposo) igual atiende la ventana, a lo sumo FPS veces por segundo
+        with self.hay_frame:
+            frame, self.pendiente = self.pendiente, None
+        ahora = time.monotonic() if ahora is None else ahora
+        if frame is None and ahora < self.sondeo:
+            return
+        self.sondeo = ahora + self.intervalo
+        if frame is not None:
+            cv2.imshow(self.titulo, frame)
+            self.abierta = True
+            self.mostrados += 1
+        if not self.abierta:
+            return
+        tecla = cv2.waitKey(1) & 0xFF
+        if tecla != 0xFF and chr(tecla) in TECLAS:
+            self.enviar(chr(tecla))
+
+    def teclas(self):
+        # Comandos pendientes, en orden de llegada. En 'ventana' se llama desde
+        # el hilo principal: ahí mismo se muestra el frame y se lee el teclado
+        if self.modo == 'ventana':
+            self.ventana()
+        comandos = []
+        while True:
+            try:
+                comandos.append(self.comandos.get_nowait())
+            except queue.Empty:
+                return comandos
+
+    def enviar(self, tecla, **parametros):
+        self.comandos.put((tecla, parametros))
+
+    def codificar(self):
+        # Hilo del mjpeg: comprime el último frame para los navegadores
+        while not self.detenido.is_set():
+            with self.hay_frame:
+                self.hay_frame.wait_for(lambda: self.pendiente is not None or self.detenido.is_set(), 0.1)
+                frame, self.pendiente = self.pendiente, None
+            if frame is not None:
+                ok, buf = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, CALIDAD_JPEG])
+                if ok:
+                    with self.hay_jpeg:
+                        self.jpeg = buf.tobytes()
+                        self.secuencia += 1
+                        self.hay_jpeg.notify_all()
+                    self.mostrados += 1
+
+    # HTTP: control y video
+
+    def servir(self, puerto=PUERTO, host=HOST):
+        vista = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def responder(self, codigo, datos):
+                cuerpo = json.dumps(datos, ensure_ascii=False).encode()
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def do_GET(self):
+                ruta = urlparse(self.path).path
+                if ruta == '/video' and vista.modo == 'mjpeg':
+                    self.transmitir()
+                elif ruta == '/frame.jpg' and vista.jpeg is not None:
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'image/jpeg')
+                    self.send_header('Content-Length', str(len(vista.jpeg)))
+                    self.end_headers()
+                    self.wfile.write(vista.jpeg)
+                else:
+                    self.send_error(404)
+
+            def transmitir(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=frame')
+                self.end_headers()
+                visto = 0
+                with vista.hay_jpeg:
+                    vista.clientes += 1
+                try:
+                    while not vista.detenido.is_set():
+                        with vista.hay_jpeg:
+                            if not vista.hay_jpeg.wait_for(lambda: vista.secuencia != visto, 1.0):
+                                continue
+                            jpeg, visto = vista.jpeg, vista.secuencia
+                        self.wfile.write(b'--frame\r\nContent-Type: image/jpeg\r\n'
+                                         b'Content-Length: %d\r\n\r\n' % len(jpeg) + jpeg + b'\r\n')
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # El navegador cerró
+                finally:
+                    with vista.hay_jpeg:
+                        vista.clientes -= 1
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                tecla = params.pop('k', '')
+                if url.path != '/tecla' or len(tecla) != 1 or tecla not in TECLAS:
+                    self.responder(400, {'error': f"POST /tecla?k=<{'|'.join(TECLAS)}>[&nombre=...]"})
+                    return
+                vista.enviar(tecla, **params)
+                self.responder(202, {'tecla': tecla, **params})
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self.servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        except OSError as e:
+            print(f"Vista: no se pudo abrir {host}:{puerto} ({e}); sin control por HTTP")
+            return None
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        if self.modo == 'mjpeg':
+            print(f"Vista en http://{host}:{puerto}/video")
+        print(f"Teclas por HTTP: python vista.py tecla <{'|'.join(TECLAS)}> [--puerto {puerto}]")
+        return self.servidor
+
+    def iniciar(self, puerto=PUERTO):
+        # puerto None = sin control por HTTP (solo la ventana, si hay)
+        if self.modo == 'mjpeg':
+            self.hilo = threading.Thread(target=self.codificar, daemon=True)
+            self.hilo.start()
+        if puerto:
+            self.servir(puerto)
+        return self
+
+    def detener(self):
+        self.detenido.set()
+        if self.hilo is not None:
+            self.hilo.join(timeout=2)
+        if self.abierta:
+            cv2.destroyAllWindows()  # Desde el mismo hilo que la abrió
+        if self.servidor is not None:
+            self.servidor.shutdown()
+
+
+def vista_de_args(args, defecto):
+    # Saca --vista MODO de args
+    if '--vista' in args:
+        i = args.index('--vista')
+        defecto = args[i + 1]
+        del args[i:i + 2]
+    return defecto
+
+
+if __name__ == "__main__":
+    from urllib.parse import urlencode
+    from urllib.request import Request, urlopen
+    args = sys.argv[1:]
+    puerto = PUERTO
+    if '--puerto' in args:
+        i = args.index('--puerto')
+        puerto = int(args[i + 1])
+        del args[i:i + 2]
+    if len(args) in (2, 3) and args[0] == "tecla" and args[1] in TECLAS:
+        consulta = {'k': args[1], **({'nombre': args[2]} if len(args) == 3 else {})}
+        try:
+            with urlopen(Request(f"http://{HOST}:{puerto}/tecla?{urlencode(consulta)}", data=b''), timeout=5) as r:
+                print(f"✓ Tecla {json.load(r)['tecla']} enviada")
+        except OSError as e:
+            print(f"No hay monitor escuchando en {HOST}:{puerto} ({e})")
+            sys.exit(1)
+    else:
+        print("Uso:")
+        print(f"  python vista.py tecla <{'|'.join(TECLAS)}> ['Nombre'] [--puerto P]")
+        print("  (r con nombre: alta con la cámara del monitor; sin nombre se pregunta en su consola)")
+        sys.exit(1)
@@ -0,0 +1,272 @@
+import json
+import os
+
+import cv2
+import numpy as np
+
+# Zonas por defecto de una cámara: dos líneas verticales separan las oficinas
+# (a los lados) de la puerta (al centro).
+ZONA_IZQUIERDA = 150   # X menor a esto = zona izquierda (oficinas)
+ZONA_DERECHA = 490     # X mayor a esto = zona derecha (oficinas)
+MARGEN = 12            # Píxeles que hay que alejarse de un borde para cambiar de zona o de lado
+CONFIRMAR = 3          # Frames seguidos del otro lado antes de aceptar el cambio
+PENDIENTES_MAX = 8     # Cruces guardados por track mientras no tiene nombre (los más viejos se descartan)
+LEJOS = 1e5            # Extremo de las zonas armadas con líneas verticales (fuera de cualquier frame)
+PUERTA = 'puerta'
+OFICINA = 'oficina'
+
+# Zonas por cámara en un archivo JSON (ZONAS_CONFIG de cada monitor):
+#   {
+#     "principal": {"verticales": [150, 490]},
+#     "pasillo": {
+#       "zonas": [{"nombre": "puerta", "tipo": "puerta", "poligono": [[200, 0], [440, 0], [440, 480], [200, 480]]},
+#                 {"nombre": "oficinas", "tipo": "oficina", "poligono": [[0, 0], [200, 0], [200, 480], [0, 480]]}],
+#       "lineas": [{"nombre": "molinete", "desde": [320, 100], "hasta": [320, 400], "adentro": [500, 250]}],
+#       "margen": 12, "confirmar": 3
+#     }
+#   }
+# Zonas: de una zona 'puerta' a una 'oficina' es ENTRADA y al revés SALIDA,
+# una vez por track (como transicion()). Líneas: pasar hacia el lado del
+# punto 'adentro' es ENTRADA y volver es SALIDA, cada vez. En los dos casos
+# un cambio cuenta recién a MARGEN píxeles del borde y tras CONFIRMAR frames:
+# el temblor de la caja sobre una línea no genera cruces. El cruce de un
+# track que todavía no tiene nombre espera en el track (por_registrar()).
+
+
+def get_zona(x, izquierda=ZONA_IZQUIERDA, derecha=ZONA_DERECHA):
+    if x < izquierda:
+        return 'izquierda'
+    elif x > derecha:
+        return 'derecha'
+    else:
+        return 'centro'
+
+
+def transicion(track, zona_actual):
+    # Actualiza el estado de cruce de un track; devuelve 'ENTRADA', 'SALIDA' o None
+    if track.get('cruzado'):
+        return None
+    
+    # Primera vez que vemos a esta persona
+    if track.get('zona_inicial') is None:
+        track['zona_inicial'] = zona_actual
+        track['zona_actual'] = zona_actual
+        return None
+    
+    track['zona_actual'] = zona_actual
+    
+    # Verificar transición
+    zona_inicial = track['zona_inicial']
+    
+    # ENTRADA: viene del centro (puerta) y va a izquierda o derecha (oficinas)
+    if zona_inicial == 'centro' and zona_actual in ['izquierda', 'derecha']:
+        track['cruzado'] = True
+        return 'ENTRADA'
+    
+    # SALIDA: viene de izquierda o derecha (oficinas) y va al centro (puerta)
+    if zona_inicial in ['izquierda', 'derecha'] and zona_actual == 'centro':
+        track['cruzado'] = True
+        return 'SALIDA'
+    
+    return None
+
+
+def por_registrar(tracks, eventos, marca=None):
+    # Cruces listos para registrar: [(track, evento, marca), ...]. El cruce de
+    # un track todavía sin nombre queda guardado en el track, con la marca del
+    # momento en que cruzó, y sale en el primer frame en que ya tiene nombre: el
+    # reconocimiento puede llegar varios frames después (detección espaciada,
+    # caras que no pasan el control de calidad). Si el track vence sin
+    # identificarse, sus cruces se pierden con él.
+    listos = []
+    for track, evento in zip(tracks, eventos):
+        if evento:
+            pendientes = track.setdefault('sin_registrar', [])
+            pendientes.append((evento, marca))
+            del pendientes[:-PENDIENTES_MAX]
+        if track.get('nombre') and track.get('sin_registrar'):
+            listos += [(track, e, m) for e, m in track.pop('sin_registrar')]
+    return listos
+
+
+def rectangulo(x1, y1, x2, y2):
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+# Todas las caras de un frame se clasifican juntas: pertenencia a cada
+# polígono (ray casting) y distancia a su borde como matrices (caras x aristas)
+# de NumPy; lo único por track es actualizar su estado. El estado de cruce
+# vive en el dict del track, así que vence con él.
+class MotorZonas:
+    def __init__(self, zonas=(), lineas=(), margen=MARGEN, confirmar=CONFIRMAR, verticales=None):
+        self.zonas = [dict(z) for z in zonas]
+        self.lineas = [dict(l) for l in lineas]
+        self.margen = margen
+        self.confirmar = confirmar
+        self.verticales = verticales  # (izquierda, derecha) si se armó con verticales()
+        self.tipos = [z.get('tipo', OFICINA) for z in self.zonas]
+        # Aristas de todos los polígonos, contiguas por polígono
+        poligonos = [np.asarray(z['poligono'], dtype=np.float64).reshape(-1, 2) for z in self.zonas]
+        if poligonos:
+            self.a = np.concatenate(poligonos)
+            self.b = np.concatenate([np.roll(p, -1, axis=0) for p in poligonos])
+            de = np.repeat(np.arange(len(poligonos)), [len(p) for p in poligonos])
+            self.pertenece = (de[:, None] == np.arange(len(poligonos))[None, :]).astype(np.int32)
+            self.inicios = np.cumsum([0] + [len(p) for p in poligonos[:-1]])
+        # Líneas: extremos y de qué lado queda 'adentro'
+        if self.lineas:
+            self.la = np.array([l['desde'] for l in self.lineas], dtype=np.float64)
+            self.lb = np.array([l['hasta'] for l in self.lineas], dtype=np.float64)
+            adentro = np.array([l['adentro'] for l in self.lineas], dtype=np.float64)
+            self.signo = np.sign(self.lados(adentro)[0].diagonal())
+
+    def clasificar(self, puntos):
+        # -> (si cada punto está dentro de cada zona, distancia de cada punto al borde de cada zona)
+        puntos = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+        if not self.zonas or not len(puntos):
+            vacio = np.zeros((len(puntos), len(self.zonas)))
+            return vacio.astype(bool), vacio
+        px, py = puntos[:, :1], puntos[:, 1:]
+        ax, ay, bx, by = self.a[:, 0], self.a[:, 1], self.b[:, 0], self.b[:, 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corte = ax + (py - ay) * (bx - ax) / (by - ay)
+        cruza = ((ay > py) != (by > py)) & (px < corte)
+        dentro = (cruza.astype(np.int32) @ self.pertenece) % 2 == 1
+        # Distancia a cada arista (segmento) y la mínima por polígono
+        dx, dy = bx - ax, by - ay
+        t = np.clip(((px - ax) * dx + (py - ay) * dy) / np.maximum(dx * dx + dy * dy, 1e-12), 0, 1)
+        dist2 = (px - ax - t * dx) ** 2 + (py - ay - t * dy) ** 2
+        return dentro, np.sqrt(np.minimum.reduceat(dist2, self.inicios, axis=1))
+
+    def lados(self, puntos):
+        # -> (distancia con signo a cada línea, posición a lo largo del segmento: 0..1 dentro)
+        puntos = np.asarray(puntos, dtype=np.float64).reshape(-1, 2)
+        d = self.lb - self.la
+        largo = np.maximum(np.hypot(d[:, 0], d[:, 1]), 1e-12)
+        rel = puntos[:, None, :] - self.la[None, :, :]
+        distancia = (d[:, 0] * rel[..., 1] - d[:, 1] * rel[..., 0]) / largo
+        t = (rel[..., 0] * d[:, 0] + rel[..., 1] * d[:, 1]) / largo ** 2
+        return distancia, t
+
+    def paso_zona(self, track, dentro, distancias):
+        actual = track.get('zona')
+        if actual is not None and (dentro[actual] or distancias[actual] < self.margen):
+            track['candidata'] = None  # Sigue en su zona, o todavía pegado a su borde
+            return None
+        if True not in dentro:
+            return None  # Fuera de toda zona: no cambia nada
+        zona = dentro.index(True)  # Con zonas superpuestas gana la primera del archivo
+        if actual is None:
+            track['zona'] = track['zona_inicial'] = zona
+            return None
+        if track.get('candidata') != zona:
+            track['candidata'], track['cuenta'] = zona, 0
+        track['cuenta'] += 1
+        if track['cuenta'] < self.confirmar:
+            return None
+        track['zona'], track['candidata'] = zona, None
+        if track.get('cruzado'):
+            return None
+        inicial, ahora = self.tipos[track['zona_inicial']], self.tipos[zona]
+        if inicial == PUERTA and ahora == OFICINA:
+            track['cruzado'] = True
+            return 'ENTRADA'
+        if inicial == OFICINA and ahora == PUERTA:
+            track['cruzado'] = True
+            return 'SALIDA'
+        return None
+
+    def paso_lineas(self, track, vistos):
+        # vistos: por línea +1 adentro, -1 afuera, 0 sobre la línea o fuera del largo del segmento
+        lados = track.setdefault('lados', {})         # línea -> +1 adentro, -1 afuera
+        pendientes = track.setdefault('pendientes', {})  # línea -> frames del otro lado
+        evento = None
+        for l, lado in enumerate(vistos):
+            if not lado:
+                continue
+            if lados.get(l, lado) == lado:
+                lados[l], pendientes[l] = lado, 0
+                continue
+            pendientes[l] = pendientes.get(l, 0) + 1
+            if pendientes[l] >= self.confirmar:
+                lados[l], pendientes[l] = lado, 0
+                evento = 'ENTRADA' if lado > 0 else 'SALIDA'
+        return evento
+
+    def cruces(self, tracks, puntos):
+        # Un evento ('ENTRADA', 'SALIDA' o None) por track; puntos = centro de cada uno
+        eventos = [None] * len(tracks)
+        if not tracks:
+            return eventos
+        if self.zonas:
+            # Listas de Python: lo que queda por track son comparaciones simples
+            dentro, distancias = self.clasificar(puntos)
+            for n, (track, d, dist) in enumerate(zip(tracks, dentro.tolist(), distancias.tolist())):
+                eventos[n] = self.paso_zona(track, d, dist)
+        if self.lineas:
+            distancias, posiciones = self.lados(puntos)
+            distancias = distancias * self.signo
+            valido = (np.abs(distancias) >= self.margen) & (posiciones >= 0) & (posiciones <= 1)
+            vistos = np.where(valido, np.sign(distancias), 0).astype(int).tolist()
+            for n, (track, v) in enumerate(zip(tracks, vistos)):
+                eventos[n] = self.paso_lineas(track, v) or eventos[n]
+        return eventos
+
+    def rois(self, margen):
+        # Rectángulo de las zonas 'puerta' y las líneas, con margen (se recorta al frame al usarlo)
+        puntos = [z['poligono'] for z in self.zonas if z.get('tipo') == PUERTA]
+        puntos += [[l['desde'], l['hasta']] for l in self.lineas]
+        if not puntos:
+            return None
+        puntos = np.concatenate([np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in puntos])
+        x1, y1 = np.maximum(puntos.min(axis=0) - margen, 0)
+        x2, y2 = puntos.max(axis=0) + margen
+        return [(int(x1), int(y1), int(x2), int(min(y2, LEJOS)))]
+
+    def dibujar(self, frame):
+        for z in self.zonas:
+            color = (0, 255, 255) if z.get('tipo') == PUERTA else (0, 255, 0)
+            poligono = np.clip(np.asarray(z['poligono']), -10000, 10000).astype(np.int32)
+            cv2.polylines(frame, [poligono], True, color, 2)
+            x, y = np.clip(poligono.min(axis=0), 0, None) + (10, 25)
+            cv2.putText(frame, z.get('nombre', ''), (int(x), int(y)), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+        for l in self.lineas:
+            desde, hasta = tuple(map(int, l['desde'])), tuple(map(int, l['hasta']))
+            cv2.line(frame, desde, hasta, (255, 255, 0), 2)
+            cv2.circle(frame, tuple(map(int, l['adentro'])), 5, (255, 255, 0), -1)
+
+
+def verticales(izquierda=ZONA_IZQUIERDA, derecha=ZONA_DERECHA, margen=MARGEN, confirmar=CONFIRMAR):
+    # Las dos líneas de siempre como zonas: oficinas a los lados, puerta al centro
+    zonas = [{'nombre': 'izquierda', 'tipo': OFICINA, 'poligono': rectangulo(-LEJOS, -LEJOS, izquierda, LEJOS)},
+             {'nombre': 'centro', 'tipo': PUERTA, 'poligono': rectangulo(izquierda, -LEJOS, derecha, LEJOS)},
+             {'nombre': 'derecha', 'tipo': OFICINA, 'poligono': rectangulo(derecha, -LEJOS, LEJOS, LEJOS)}]
+    return MotorZonas(zonas, margen=margen, confirmar=confirmar, verticales=(izquierda, derecha))
+
+
+def leer_config(ruta):
+    if not ruta or not os.path.exists(ruta):
+        return {}
+    with open(ruta, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def cargar(ruta, camara, izquierda=ZONA_IZQUIERDA, derecha=ZONA_DERECHA):
+    # Zonas de la cámara en el archivo; sin archivo o sin la cámara, las dos líneas dadas
+    config = leer_config(ruta).get(camara)
+    if config is None:
+        return verticales(izquierda, derecha)
+    margen, confirmar = config.get('margen', MARGEN), config.get('confirmar', CONFIRMAR)
+    if 'verticales' in config:
+        return verticales(*config['verticales'], margen=margen, confirmar=confirmar)
+    return MotorZonas(config.get('zonas', ()), config.get('lineas', ()), margen, confirmar)
+
+
+def guardar_verticales(ruta, camara, izquierda, derecha):
+    # Las teclas 1-4 mueven las líneas: quedan guardadas para el próximo arranque
+    config = leer_config(ruta)
+    config[camara] = dict(config.get(camara, {}), verticales=[izquierda, derecha])
+    tmp = ruta + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, ruta)